@@ -0,0 +1,55 @@
+"""Cold vs warm latency of short %%bash cells
+
+Usage: PYTHONPATH=src python benchmarks/bench_bash_session.py [--cells 200]
+
+Cold runs spawn a new bash per cell through FileSystem.system, warm runs go
+through a `--session` bash which is started once.
+"""
+import argparse
+import statistics
+import time
+
+from jupyterMagicCommands.filesystem.filesystem import FileSystem, session_manager
+from jupyterMagicCommands.outputters import AbstractOutputterFactory, DummyOutputter
+
+
+class _Shell:
+    user_ns: dict = {}
+
+
+class _DummyOutputterFactory(AbstractOutputterFactory):
+
+    def create_outputter(self, interactive, outFile=None, outVar=None):
+        return DummyOutputter()
+
+
+def _measure(fs: FileSystem, cells: int, **kwargs):
+    latencies = []
+    for _ in range(cells):
+        start = time.perf_counter()
+        fs.system("echo hello", **kwargs)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _report(name, latencies):
+    ms = [x * 1000 for x in latencies]
+    print(f"{name:<25}: median {statistics.median(ms):.2f} ms, "
+          f"p95 {sorted(ms)[int(len(ms) * 0.95) - 1]:.2f} ms, total {sum(ms) / 1000:.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cells", type=int, default=200)
+    args = parser.parse_args()
+
+    fs = FileSystem(_DummyOutputterFactory(), shell=_Shell())  # type: ignore
+    _report("cold (new bash per cell)", _measure(fs, args.cells))
+    first = _measure(fs, 1, session="bench")
+    _report("session start", first)
+    _report("warm (--session)", _measure(fs, args.cells, session="bench"))
+    session_manager.removeSession("bench").close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Throughput and scratch disk of copying a file out of a container
+
+Usage: PYTHONPATH=src python benchmarks/bench_copy_from_container.py [--size 512M]
+
+Uses a stand-in for the container whose get_archive streams a tar holding one
+file of --size bytes in 2 MiB chunks, like docker-py does. The previous
+implementation saved the archive to a temp file and extracted it afterwards.
+"""
+import argparse
+import os
+import tarfile
+import tempfile
+import time
+
+from jupyterMagicCommands.utils.docker import copy_from_container, tar_stream
+from jupyterMagicCommands.utils.parser import parse_size
+
+
+class _FakeContainer:
+
+    def __init__(self, src):
+        self.src = src
+
+    def get_archive(self, path):
+        return tar_stream(self.src, os.path.basename(path), 2 * 1024 * 1024), {}
+
+
+def previous_copy_from_container(container, src, dst):
+    targetFolder = os.path.dirname(dst)
+    bits, stat = container.get_archive(src)
+    with tempfile.NamedTemporaryFile('wb+', delete=False) as f:
+        for chunk in bits:
+            f.write(chunk)
+    with tarfile.open(f.name) as tar:
+        for member in tar.getmembers():
+            member.name = os.path.basename(dst)
+        tar.extractall(path=targetFolder)
+    scratch = os.path.getsize(f.name)
+    os.remove(f.name)
+    return scratch
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=parse_size, default=parse_size("512M"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        src = os.path.join(d, "artifact.bin")
+        with open(src, "wb") as f:
+            for _ in range(args.size // (1024 * 1024)):
+                f.write(os.urandom(1024 * 1024))
+        mb = os.path.getsize(src) / 1024 / 1024
+        container = _FakeContainer(src)
+        for name, fn in [("temp tar", previous_copy_from_container), ("streaming", copy_from_container)]:
+            dst = os.path.join(d, "out", name.replace(" ", "_"), "artifact.bin")
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            start = time.perf_counter()
+            scratch = fn(container, "/artifact.bin", dst) or 0
+            elapsed = time.perf_counter() - start
+            assert os.path.getsize(dst) == os.path.getsize(src)
+            print(f"{name:<10} {mb / elapsed:8.1f} MB/s  scratch disk {scratch / 1024 / 1024:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Throughput of copying a file into a container
+
+Usage: PYTHONPATH=src python benchmarks/bench_copy_to_container.py [--size 256M] [--previous-limit 4M]
+
+Uses a stand-in for the container whose put_archive extracts the streamed tar
+into a local folder, and whose exec_run only records the size of the command.
+The previous implementation (hex escaped bytes passed to `echo -e`) is run for
+sizes up to --previous-limit, since it builds a list of one string per byte.
+Peak memory is traced with tracemalloc.
+"""
+import argparse
+import os
+import tarfile
+import tempfile
+import time
+import tracemalloc
+
+from jupyterMagicCommands.utils.docker import copy_to_container
+from jupyterMagicCommands.utils.parser import parse_size
+
+
+class _FakeContainer:
+
+    def __init__(self, root):
+        self.root = root
+        self.execs = 0
+        self.command_bytes = 0
+
+    def put_archive(self, path, data):
+        with tarfile.open(fileobj=_GeneratorReader(data), mode="r|") as tar:
+            tar.extractall(os.path.join(self.root, path.lstrip("/")))
+        return True
+
+    def exec_run(self, cmd, **kwargs):
+        self.execs += 1
+        self.command_bytes += sum(len(c) for c in cmd) if isinstance(cmd, list) else len(cmd)
+
+
+class _GeneratorReader:
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+
+    def read(self, n):
+        while len(self._buffer) < n:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:n], self._buffer[n:]
+        return data
+
+
+def previous_copy_to_container(container, src, dst):
+    with open(src, 'rb') as f:
+        data = f.read()
+    hexString = "".join(map(lambda x: "\\x" + x, data.hex(" ").split(" ")))
+    cmd = ["/bin/sh", "-c", f"/bin/echo -n -e '{hexString}' > {dst}"]
+    container.exec_run(f"mkdir -p '{os.path.dirname(dst)}'")
+    container.exec_run(cmd)
+
+
+def measure(fn, container, src, dst):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(container, src, dst)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=parse_size, default=parse_size("256M"))
+    parser.add_argument("--previous-limit", type=parse_size, default=parse_size("4M"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        src = os.path.join(d, "data.bin")
+        with open(src, "wb") as f:
+            f.write(os.urandom(args.size))
+        root = os.path.join(d, "container")
+        mb = args.size / 1024 / 1024
+        cases = [("put_archive stream", copy_to_container)]
+        if args.size <= args.previous_limit:
+            cases.insert(0, ("hex + echo -e", previous_copy_to_container))
+        for name, fn in cases:
+            container = _FakeContainer(root)
+            elapsed, peak = measure(fn, container, src, "/tmp/copy/data.bin")
+            print(f"{name:<20} {mb / elapsed:8.1f} MB/s  peak memory {peak / 1024 / 1024:8.1f} MB  "
+                  f"execs {container.execs}  command {container.command_bytes / 1024 / 1024:.1f} MB")
+        with open(os.path.join(root, "tmp/copy/data.bin"), "rb") as f, open(src, "rb") as g:
+            assert f.read() == g.read()
+
+
+if __name__ == "__main__":
+    main()
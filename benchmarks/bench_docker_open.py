@@ -0,0 +1,100 @@
+"""Throughput and memory of streaming DockerFileSystem.open
+
+Usage: PYTHONPATH=src python benchmarks/bench_docker_open.py [--size 1G] [--block 1M]
+
+Uses a stand-in for the docker api which runs the `cat` execs on the host and
+sends their output through a socketpair in docker's multiplexed frames. The
+file is written with mode "wb" and read back with mode "rb" in --block sized
+calls. Peak memory of the kernel process is traced with tracemalloc.
+"""
+import argparse
+import os
+import socket
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+from unittest.mock import MagicMock
+
+from jupyterMagicCommands.filesystem.docker import DockerFileSystem
+from jupyterMagicCommands.utils.parser import parse_size
+
+
+class _LocalExecApi:
+
+    def __init__(self):
+        self._execs = {}
+
+    def exec_create(self, container, cmd, workdir="/", **kwargs):
+        exec_id = str(len(self._execs))
+        self._execs[exec_id] = (cmd, workdir)
+        return {"Id": exec_id}
+
+    def exec_start(self, exec_id, **kwargs):
+        cmd, workdir = self._execs[exec_id]
+        ours, theirs = socket.socketpair()
+        p = subprocess.Popen(cmd, cwd=workdir, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._execs[exec_id] = p
+
+        def pump_stdin():
+            for data in iter(lambda: ours.recv(1024 * 1024), b""):
+                p.stdin.write(data)
+            p.stdin.close()
+
+        def pump_stdout():
+            for data in iter(lambda: p.stdout.read1(1024 * 1024), b""):
+                ours.sendall(struct.pack(">BxxxL", 1, len(data)) + data)
+            p.wait()
+            ours.shutdown(socket.SHUT_RDWR)
+            ours.close()
+
+        threading.Thread(target=pump_stdin, daemon=True).start()
+        threading.Thread(target=pump_stdout, daemon=True).start()
+        return MagicMock(_sock=theirs)
+
+    def exec_inspect(self, exec_id):
+        p = self._execs[exec_id]
+        p.wait()
+        return {"Running": False, "ExitCode": p.returncode}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=parse_size, default=parse_size("1G"))
+    parser.add_argument("--block", type=parse_size, default=parse_size("1M"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        container = MagicMock()
+        container.client.api = _LocalExecApi()
+        fs = DockerFileSystem(container, MagicMock(), workdir=d)
+        block = os.urandom(args.block)
+        mb = args.size / 1024 / 1024
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        with fs.open("data.bin", "wb") as f:
+            for _ in range(args.size // args.block):
+                f.write(block)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"write {mb / elapsed:8.1f} MB/s  peak memory {peak / 1024 / 1024:6.1f} MB")
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        n = 0
+        with fs.open("data.bin", "rb") as f:
+            for data in iter(lambda: f.read(args.block), b""):
+                n += len(data)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert n == args.size // args.block * args.block
+        print(f"read  {mb / elapsed:8.1f} MB/s  peak memory {peak / 1024 / 1024:6.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
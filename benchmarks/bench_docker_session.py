@@ -0,0 +1,106 @@
+"""Per cell cost of a docker session compared with one exec per cell
+
+Usage: PYTHONPATH=src python benchmarks/bench_docker_session.py [--cells 200] [--exec-latency 0.01]
+
+Uses a stand-in for the docker api which runs the execs on the host and sends
+their output through a socketpair in docker's multiplexed frames. Every
+exec_create and exec_start sleeps --exec-latency seconds to stand in for the
+round trips to the docker daemon. Runs `echo hi` --cells times with
+DockerFileSystem.system, without and with a session, and reports the
+milliseconds per cell and the number of execs.
+"""
+import argparse
+import socket
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+from unittest.mock import MagicMock
+
+from jupyterMagicCommands.filesystem.docker import DockerFileSystem, docker_session_manager
+
+
+class _LocalExecApi:
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.execs = 0
+        self._execs = {}
+
+    def exec_create(self, container, cmd, workdir="/", **kwargs):
+        time.sleep(self.latency)
+        self.execs += 1
+        exec_id = str(self.execs)
+        self._execs[exec_id] = (cmd, workdir)
+        return {"Id": exec_id}
+
+    def exec_start(self, exec_id, **kwargs):
+        time.sleep(self.latency)
+        cmd, workdir = self._execs[exec_id]
+        ours, theirs = socket.socketpair()
+        p = subprocess.Popen(cmd, cwd=workdir, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._execs[exec_id] = p
+        lock = threading.Lock()
+
+        def pump_stdin():
+            try:
+                for data in iter(lambda: ours.recv(65536), b""):
+                    p.stdin.write(data)
+                    p.stdin.flush()
+                p.stdin.close()
+            except OSError:
+                pass
+
+        def pump(pipe, stream):
+            for data in iter(lambda: pipe.read1(65536), b""):
+                with lock:
+                    ours.sendall(struct.pack(">BxxxL", stream, len(data)) + data)
+
+        def run():
+            threads = [threading.Thread(target=pump, args=(p.stdout, 1)), threading.Thread(target=pump, args=(p.stderr, 2))]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            p.wait()
+            ours.shutdown(socket.SHUT_RDWR)
+            ours.close()
+
+        threading.Thread(target=pump_stdin, daemon=True).start()
+        threading.Thread(target=run, daemon=True).start()
+        return MagicMock(_sock=theirs)
+
+    def exec_inspect(self, exec_id):
+        time.sleep(self.latency)
+        p = self._execs[exec_id]
+        p.wait()
+        return {"Running": False, "ExitCode": p.returncode}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cells", type=int, default=200)
+    parser.add_argument("--exec-latency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        for name, session in [("exec per cell", None), ("session", "bench")]:
+            container = MagicMock()
+            container.id = "bench"
+            container.attrs = {"State": {"StartedAt": "now"}}
+            container.client.api = api = _LocalExecApi(args.exec_latency)
+            fs = DockerFileSystem(container, MagicMock(), workdir=d)
+            fs._default_shell, fs._default_shell_checked = "bash", True
+            start = time.perf_counter()
+            for _ in range(args.cells):
+                fs.system("echo hi", session=session)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<14} {elapsed / args.cells * 1000:8.2f} ms/cell  execs {api.execs}")
+        for key, s in list(docker_session_manager.sessions.items()):
+            docker_session_manager.removeSession(key)
+            s.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Bytes sent and time of syncing a project tree into a container
+
+Usage: PYTHONPATH=src python benchmarks/bench_dsync.py [--files 2000] [--file-size 8K] [--changed 20]
+
+Uses a stand-in for the container which runs the manifest exec on the host
+and extracts the archive into a temporary directory. A tree of --files text
+files is synced once, again without changes, and again after --changed files
+were modified. Reports the files and bytes sent and the elapsed time.
+"""
+import argparse
+import io
+import os
+import subprocess
+import tarfile
+import tempfile
+
+from docker.models.containers import ExecResult
+
+from jupyterMagicCommands.utils.docker import sync_to_container
+from jupyterMagicCommands.utils.parser import parse_size
+
+
+class _HostContainer:
+
+    def exec_run(self, cmd, **kwargs):
+        p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        return ExecResult(p.returncode, p.stdout)
+
+    def put_archive(self, path, data):
+        with tarfile.open(fileobj=io.BytesIO(b"".join(data)), mode="r:gz") as tar:
+            tar.extractall(path)
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--file-size", type=parse_size, default=parse_size("8K"))
+    parser.add_argument("--changed", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        src, dst = os.path.join(d, "src"), os.path.join(d, "dst")
+        line = b"def f(x):\n    return x + 1\n"
+        for i in range(args.files):
+            folder = os.path.join(src, f"pkg{i % 20}")
+            os.makedirs(folder, exist_ok=True)
+            with open(os.path.join(folder, f"mod{i}.py"), "wb") as f:
+                f.write((line * (args.file_size // len(line) + 1))[:args.file_size])
+        container = _HostContainer()
+        for name in ["initial", "unchanged", "changed"]:
+            if name == "changed":
+                for i in range(args.changed):
+                    with open(os.path.join(src, f"pkg{i % 20}", f"mod{i}.py"), "ab") as f:
+                        f.write(b"# edit\n")
+            result = sync_to_container(container, src, dst)  # type: ignore
+            print(f"{name:<10} sent {len(result.uploaded):6d} files {result.bytes_sent:10d} bytes  {result.elapsed:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Wall time of one cell run on many containers
+
+Usage: PYTHONPATH=src python benchmarks/bench_fanout.py [--containers 40] [--latency 150] [--workers 1 8 16]
+
+Uses a stand-in for the exec of each container which prints a few lines and
+sleeps --latency milliseconds, like a health check paying the exec round
+trips. One worker is the previous behavior of a cell per container.
+"""
+import argparse
+import time
+
+from jupyterMagicCommands.filesystem.fanout import FANOUT_QUIET, run_fanout
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--containers", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=150.0, help="milliseconds per exec")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8, 16])
+    args = parser.parse_args()
+
+    def execute(target, outputter, preparation):
+        time.sleep(args.latency / 1000)
+        for i in range(10):
+            outputter.write(f"{target} check {i} ok\n")
+        return 0
+
+    targets = [f"container-{i}" for i in range(args.containers)]
+    for workers in args.workers:
+        start = time.perf_counter()
+        results = run_fanout(targets, execute, workers=workers, mode=FANOUT_QUIET)
+        elapsed = time.perf_counter() - start
+        assert all(result.exit_code == 0 for result in results)
+        print(f"workers {workers:>3}  {elapsed:6.2f} s  {args.containers / elapsed:7.1f} containers/s")
+
+
+if __name__ == "__main__":
+    main()
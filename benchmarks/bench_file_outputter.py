@@ -0,0 +1,46 @@
+"""Cost of writing command output into a file with --outfile
+
+Usage: PYTHONPATH=src python benchmarks/bench_file_outputter.py [--lines 200000] [--dir /tmp]
+
+Writes the same lines through FileOutputter flushing every write, which is
+how it used to behave, with the default buffer, and with gzip. Point --dir at
+a network filesystem to see the difference grow.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from jupyterMagicCommands.outputters import FileOutputter
+
+LINE = "2024-01-01 00:00:00 INFO processed item 123456 in 0.42 ms\n"
+
+
+def run(path, n, **kwargs):
+    outputter = FileOutputter(path, **kwargs)
+    start = time.perf_counter()
+    for _ in range(n):
+        outputter.write(LINE)
+    outputter.close()
+    return time.perf_counter() - start, os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=200000)
+    parser.add_argument("--dir", default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as d:
+        cases = [
+            ("flush every write", os.path.join(d, "a.log"), {"flush_interval": 0}),
+            ("buffered", os.path.join(d, "b.log"), {}),
+            ("buffered + gzip", os.path.join(d, "c.log.gz"), {}),
+        ]
+        for name, path, kwargs in cases:
+            elapsed, size = run(path, args.lines, **kwargs)
+            print(f"{name:<18} {elapsed:7.3f}s {args.lines / elapsed:12,.0f} lines/s {size / 1024 / 1024:8.1f} MB on disk")
+
+
+if __name__ == "__main__":
+    main()
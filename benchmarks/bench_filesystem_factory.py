@@ -0,0 +1,87 @@
+"""Set up cost of 100 sequential cells against the same container
+
+Usage: PYTHONPATH=src python benchmarks/bench_filesystem_factory.py [--cells 100] [--latency 2]
+
+Uses a stand-in for the docker client where each request to the daemon
+(version negotiation, container inspect, exec) sleeps --latency milliseconds.
+A cell gets its file system from FileSystemFactory, detects the default shell
+and probes its working directory, like `%%bash -c` before running the script.
+The previous behavior, a new client and DockerFileSystem per cell, is measured
+with a new pool per cell.
+"""
+import argparse
+import time
+from unittest.mock import MagicMock
+
+from jupyterMagicCommands.filesystem.filesystem_factory import FileSystemFactory
+from jupyterMagicCommands.filesystem.filesystem_pool import FileSystemPool
+
+
+class _Daemon:
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.requests = 0
+
+    def request(self):
+        self.requests += 1
+        time.sleep(self.latency)
+
+
+class _FakeContainer:
+
+    def __init__(self, daemon):
+        self.daemon = daemon
+        self.id = "0123456789ab"
+        self.status = "running"
+        self.attrs = {"State": {"Running": True, "StartedAt": "2024-01-01T00:00:00Z"}}
+
+    def reload(self):
+        self.daemon.request()
+
+    def exec_run(self, cmd, **kwargs):
+        self.daemon.request()
+        return MagicMock(exit_code=0, output=b"d\n")
+
+
+class _FakeClient:
+
+    def __init__(self, daemon):
+        # docker.from_env asks the daemon for its api version
+        daemon.request()
+        self.daemon = daemon
+        self.containers = self
+
+    def get(self, name):
+        self.daemon.request()
+        return _FakeContainer(self.daemon)
+
+
+def run_cells(cells, daemon, pooled):
+    pool = FileSystemPool(lambda: _FakeClient(daemon))
+    shell = MagicMock()
+    start = time.perf_counter()
+    for _ in range(cells):
+        if not pooled:
+            pool = FileSystemPool(lambda: _FakeClient(daemon))
+        fs = FileSystemFactory.get_filesystem("web", shell, pool=pool)
+        fs.default_shell
+        fs.exists(".")
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cells", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=2.0, help="milliseconds per daemon request")
+    args = parser.parse_args()
+
+    for name, pooled in [("client per cell", False), ("pooled", True)]:
+        daemon = _Daemon(args.latency / 1000)
+        elapsed = run_cells(args.cells, daemon, pooled)
+        print(f"{name:<16} {elapsed * 1000:8.1f} ms  {elapsed * 1000 / args.cells:6.2f} ms/cell  "
+              f"requests {daemon.requests}  ({daemon.requests / args.cells:.2f}/cell)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Echo round trip of the interactive (-i) mode
+
+Usage: PYTHONPATH=src python benchmarks/bench_interactive_echo.py [--rounds 50] [--iteration-cost 5e-6]
+
+Runs `cat` in a PTY through FileSystem._run_command with an InteractiveOutputter
+whose UI poll is simulated: every kernel iteration costs --iteration-cost
+seconds and a pending keystroke is delivered by the iteration that sees it.
+Each round types a line and waits until cat prints it back. The previous
+poll of 10000 iterations per loop is compared with the bounded batch, with
+and without pexpect's default 50ms sleep before every send.
+"""
+import argparse
+import statistics
+import time
+from collections import deque
+
+import pexpect
+
+from jupyterMagicCommands.filesystem.filesystem import FileSystem
+from jupyterMagicCommands.outputters import InteractiveOutputter
+
+
+class _Shell:
+    user_ns: dict = {}
+
+
+class _FakeUIEvents:
+
+    def __init__(self, iteration_cost):
+        self.iteration_cost = iteration_cost
+        self.events = deque()
+
+    def __enter__(self):
+        return self.poll
+
+    def __exit__(self, *args):
+        pass
+
+    def poll(self, n):
+        for _ in range(n):
+            deadline = time.perf_counter() + self.iteration_cost
+            while time.perf_counter() < deadline:
+                pass
+            if self.events:
+                self.events.popleft()()
+
+
+class _EchoOutputter(InteractiveOutputter):
+
+    def __init__(self, rounds, ui, poll_batch):
+        super().__init__(poll_batch=poll_batch, ui_events=lambda: ui)
+        self.ui_events = ui
+        self.rounds = rounds
+        self.latencies = []
+        self._received = ""
+        self._sent_at = 0.0
+
+    def type_line(self):
+        self._sent_at = time.perf_counter()
+        self.read_cb("ping\n")
+
+    def write(self, s):
+        self._received += s
+        if "ping" in self._received:
+            self._received = ""
+            self.latencies.append(time.perf_counter() - self._sent_at)
+            if len(self.latencies) < self.rounds:
+                self.ui_events.events.append(self.type_line)
+            else:
+                self.read_cb("\x04")
+
+
+def run(rounds, iteration_cost, poll_batch, delaybeforesend):
+    fs = FileSystem(None, shell=_Shell())  # type: ignore
+    ui = _FakeUIEvents(iteration_cost)
+    outputter = _EchoOutputter(rounds, ui, poll_batch)
+    child = pexpect.spawn("bash -c 'stty -echo; cat'")
+    child.delaybeforesend = delaybeforesend
+    outputter.register_read_callback(child.send)
+    ui.events.append(outputter.type_line)
+    fs._run_command(child, outputter)
+    return outputter.latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--iteration-cost", type=float, default=5e-6)
+    args = parser.parse_args()
+
+    cases = [
+        ("previous: poll(10000), 50ms delay before send", 10000, 0.05),
+        ("poll(8), 50ms delay before send", 8, 0.05),
+        ("poll(8), no delay before send", 8, None),
+    ]
+    for name, batch, delaybeforesend in cases:
+        latencies = run(args.rounds, args.iteration_cost, batch, delaybeforesend)
+        ms = sorted(t * 1000 for t in latencies)
+        print(f"{name:<46} median {statistics.median(ms):7.2f} ms  p95 {ms[int(len(ms) * 0.95) - 1]:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Throughput of FileSystem._run_command reading a PTY
+
+Usage: PYTHONPATH=src python benchmarks/bench_pty_reader.py [--size 500M]
+
+Streams `yes | head -c <size>` through the PTY read loop and reports MB/s and
+how much CPU the kernel process spent on it.
+"""
+import argparse
+import time
+
+import pexpect
+
+from jupyterMagicCommands.filesystem.filesystem import FileSystem
+from jupyterMagicCommands.outputters import DummyOutputter
+
+
+class _Shell:
+    user_ns: dict = {}
+
+
+class _CountingOutputter(DummyOutputter):
+
+    def __init__(self):
+        self.n = 0
+
+    def write(self, s):
+        self.n += len(s)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", default="500M", help="argument passed to `head -c`")
+    args = parser.parse_args()
+
+    fs = FileSystem(None, shell=_Shell())  # type: ignore
+    outputter = _CountingOutputter()
+    child = pexpect.spawn(f"bash -c 'yes | head -c {args.size}'")
+    wall, cpu = time.perf_counter(), time.process_time()
+    fs._run_command(child, outputter)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+    mb = outputter.n / 1024 / 1024
+    print(f"received:   {mb:.1f} MB (PTY translates \\n to \\r\\n)")
+    print(f"wall time:  {wall:.2f} s")
+    print(f"throughput: {mb / wall:.1f} MB/s")
+    print(f"kernel cpu: {cpu:.2f} s ({cpu / wall:.0%} of one core)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Lines per second of the %%_script output handling
+
+Usage: PYTHONPATH=src python benchmarks/bench_script_stream.py [--lines 1000000] [--line-size 16]
+
+Runs a subprocess printing --lines lines of --line-size bytes and handles its
+stdout like %%_script does, writing into a stream which discards the text.
+The previous handling (one readuntil, decode, action detection, write and
+flush per line) is compared with the chunked reads of MyScriptMagics.
+"""
+import argparse
+import asyncio
+import io
+import sys
+import time
+from types import SimpleNamespace
+
+from jupyterMagicCommands.extensions._script_ext import MyScriptMagics
+
+
+class _NullWriter(io.TextIOBase):
+
+    def write(self, s):
+        return len(s)
+
+
+async def previous_handle_stream(magics, stream, file_object):
+    async def readchunk():
+        try:
+            s = await stream.readuntil(b"\n")
+            magics.actionDetector.detect_action_by_line(s.decode("utf8", errors="replace"))
+            return s
+        except asyncio.IncompleteReadError as e:
+            return e.partial
+        except asyncio.LimitOverrunError as e:
+            return await stream.read(e.consumed)
+
+    while True:
+        chunk = (await readchunk()).decode("utf8", errors="replace")
+        if not chunk:
+            break
+        file_object.write(chunk)
+        file_object.flush()
+
+
+async def measure(handle, lines, line_size):
+    code = (
+        "import sys\n"
+        f"line = b'x' * {line_size - 1} + b'\\n'\n"
+        f"block = line * 1000\n"
+        f"for _ in range({lines // 1000}):\n"
+        "    sys.stdout.buffer.write(block)\n"
+    )
+    p = await asyncio.create_subprocess_exec(sys.executable, "-c", code, stdout=asyncio.subprocess.PIPE)
+    start = time.perf_counter()
+    await handle(p.stdout, _NullWriter())
+    elapsed = time.perf_counter() - start
+    await p.wait()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=1000000)
+    parser.add_argument("--line-size", type=int, default=16)
+    args = parser.parse_args()
+
+    magics = MyScriptMagics(shell=None)
+    magics.shell = magics.actionDetector.shell = SimpleNamespace(user_ns={})
+    for name, handle in [
+        ("line per read", lambda stream, out: previous_handle_stream(magics, stream, out)),
+        ("chunked reads", lambda stream, out: magics._handle_stream(stream, None, out)),
+    ]:
+        elapsed = asyncio.run(measure(handle, args.lines, args.line_size))
+        print(f"{name:<14} {args.lines / elapsed:12.0f} lines/s")
+
+
+if __name__ == "__main__":
+    main()
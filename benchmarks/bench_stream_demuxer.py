@@ -0,0 +1,109 @@
+"""Throughput of demultiplexing the output socket of a docker exec
+
+Usage: PYTHONPATH=src python benchmarks/bench_stream_demuxer.py [--size 64M] [--frame-size 4K]
+
+A thread writes --size bytes of frames of --frame-size payload bytes into one
+end of a socketpair, like the docker daemon does for an exec without a TTY,
+and the other end is read until EOF. Every 64th frame is on stderr. The
+previous implementation (two recv calls per frame, bytes concatenation, one
+decode and callback per frame) is compared with StreamDemuxer. Reports
+frames/s, MB/s and callbacks.
+"""
+import argparse
+import selectors
+import socket
+import struct
+import threading
+import time
+
+from jupyterMagicCommands.utils.parser import parse_size
+from jupyterMagicCommands.utils.stream import StreamDemuxer
+
+
+class _Counter:
+
+    def __init__(self):
+        self.chars = 0
+        self.calls = 0
+
+    def __call__(self, s):
+        self.chars += len(s)
+        self.calls += 1
+
+
+def previous_demux(sock, out, err):
+    sel = selectors.DefaultSelector()
+    sel.register(sock, selectors.EVENT_READ)
+    frames = 0
+    while True:
+        sel.select()
+        import struct as _struct
+        header = b""
+        while len(header) < 8:
+            chunk = sock.recv(8 - len(header))
+            if not chunk:
+                return frames
+            header += chunk
+        _stream, payload_len = _struct.unpack(">BxxxL", header)
+        payload = b""
+        while len(payload) < payload_len:
+            chunk = sock.recv(payload_len - len(payload))
+            if not chunk:
+                return frames
+            payload += chunk
+        frames += 1
+        text = payload.decode("utf8", errors="replace")
+        if _stream == 2:
+            err(text)
+        else:
+            out(text)
+
+
+def demux(sock, out, err):
+    sel = selectors.DefaultSelector()
+    sel.register(sock, selectors.EVENT_READ)
+    demuxer = StreamDemuxer(out, err)
+    while True:
+        sel.select()
+        if not demuxer.recv(sock):
+            return demuxer.frames
+
+
+def write_frames(sock, size, frame_size):
+    payload = (b"x" * (frame_size - 1) + b"\n")
+    frames = b"".join(struct.pack(">BxxxL", 2 if i == 63 else 1, len(payload)) + payload for i in range(64))
+    sent = 0
+    while sent < size:
+        sock.sendall(frames)
+        sent += 64 * frame_size
+    sock.close()
+
+
+def measure(fn, size, frame_size):
+    reader, writer = socket.socketpair()
+    thread = threading.Thread(target=write_frames, args=(writer, size, frame_size))
+    out, err = _Counter(), _Counter()
+    start = time.perf_counter()
+    thread.start()
+    frames = fn(reader, out, err)
+    elapsed = time.perf_counter() - start
+    thread.join()
+    reader.close()
+    assert out.chars + err.chars >= size
+    return elapsed, frames, out.calls + err.calls
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=parse_size, default=parse_size("64M"))
+    parser.add_argument("--frame-size", type=parse_size, default=parse_size("4K"))
+    args = parser.parse_args()
+
+    mb = args.size / 1024 / 1024
+    for name, fn in [("recv per frame", previous_demux), ("StreamDemuxer", demux)]:
+        elapsed, frames, calls = measure(fn, args.size, args.frame_size)
+        print(f"{name:<16} {frames / elapsed:12.0f} frames/s  {mb / elapsed:8.1f} MB/s  callbacks {calls}")
+
+
+if __name__ == "__main__":
+    main()
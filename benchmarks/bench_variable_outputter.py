@@ -0,0 +1,65 @@
+"""Cost of capturing output into a variable with --outvar
+
+Usage: PYTHONPATH=src python benchmarks/bench_variable_outputter.py [--sizes 1M,10M,100M]
+
+Compares the previous approach of appending every chunk to the variable in the
+user namespace with VariableOutputter, which joins the chunks once on close.
+Chunks are 4 KiB, about what a pipe read returns for a chatty command. The
+quadratic approach is skipped above --concat-limit since it takes minutes.
+"""
+import argparse
+import time
+
+from jupyterMagicCommands.outputters.variable_outputter import VariableOutputter
+from jupyterMagicCommands.utils.parser import parse_size
+
+CHUNK = "x" * 4095 + "\n"
+
+
+class _Shell:
+
+    def __init__(self):
+        self.user_ns = {}
+
+
+def concat(shell, n):
+    shell.user_ns["out"] = ""
+    for _ in range(n):
+        # a second reference to the string like a notebook's history would keep
+        # prevents CPython from resizing it in place
+        prev = shell.user_ns["out"]
+        shell.user_ns["out"] = prev + CHUNK
+
+
+def outputter(shell, n):
+    o = VariableOutputter("out", shell=shell)  # type: ignore
+    for _ in range(n):
+        o.write(CHUNK)
+    o.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1M,10M,100M")
+    parser.add_argument("--concat-limit", type=parse_size, default=parse_size("20M"))
+    args = parser.parse_args()
+
+    print(f"{'size':>8} {'str +=':>10} {'outputter':>10}")
+    for size in args.sizes.split(","):
+        n = parse_size(size) // len(CHUNK)
+        times = []
+        for fn in (concat, outputter):
+            if fn is concat and n * len(CHUNK) > args.concat_limit:
+                times.append(None)
+                continue
+            shell = _Shell()
+            start = time.perf_counter()
+            fn(shell, n)
+            times.append(time.perf_counter() - start)
+            assert len(shell.user_ns["out"]) == n * len(CHUNK)
+        cells = [f"{t:.3f}s" if t is not None else "skipped" for t in times]
+        print(f"{size:>8} {cells[0]:>10} {cells[1]:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Size of what the xterm backend sends to the browser and leaves in the notebook
+
+Usage: PYTHONPATH=src python benchmarks/bench_xterm_transport.py [--lines 100000]
+
+Feeds the output of a chatty command, in 4 KiB reads every 10 ms, to the
+previous transport (a JS array of code points per 0.2 s tick) and to
+XtermTerminal, and reports the bytes of the display updates, the bytes kept
+in the saved notebook and the number of updates.
+"""
+import argparse
+
+from jupyterMagicCommands.utils.xterm import XtermTerminal
+
+
+class _Display:
+
+    def __init__(self):
+        self.sent = 0
+        self.updates = 0
+        self.last = ""
+
+    def __call__(self, data, raw=False, display_id=None):
+        return self
+
+    def update(self, data, raw=False):
+        self.sent += len(data["text/html"])
+        self.updates += 1
+        self.last = data["text/html"]
+
+
+def previous_transport(reads, tick):
+    display = _Display()
+    since_tick = 0.0
+    pending = ""
+    for read in reads:
+        pending += read
+        since_tick += 0.01
+        if since_tick >= tick:
+            display.update({"text/html": f"<script>window.term.write({[ord(ch) for ch in pending]});</script>"})
+            pending, since_tick = "", 0.0
+    display.update({"text/html": f"<script>window.term.write({[ord(ch) for ch in pending]});</script>"})
+    return display
+
+
+def xterm_transport(reads):
+    display = _Display()
+    now = [0.0]
+    terminal = XtermTerminal(display=display, clock=lambda: now[0])
+    terminal.open()
+    for read in reads:
+        terminal.write(read)
+        now[0] += 0.01
+        terminal.handle_tick()
+    terminal.close()
+    return display
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=100000)
+    args = parser.parse_args()
+
+    output = "".join(f"step {i}: loss=0.{i % 997:04d} ✓\r\n" for i in range(args.lines))
+    reads = [output[i:i + 4096] for i in range(0, len(output), 4096)]
+    print(f"output: {len(output.encode()) / 1024 / 1024:.1f} MB in {len(reads)} reads")
+    for name, display in [("previous", previous_transport(reads, 0.2)), ("XtermTerminal", xterm_transport(reads))]:
+        print(f"{name:<14} sent {display.sent / 1024 / 1024:7.1f} MB in {display.updates:5} updates, "
+              f"notebook keeps {len(display.last)} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,8 @@ if IS_IN_JUPYTER:
     from .extensions import drawio_ext
     from .extensions import _script_ext
     from .extensions import html_ext
+    from .extensions import jobs_ext
+    from .extensions import dsync_ext
     from .version import version
 
     def load_ipython_extension(ipython):
@@ -25,6 +27,8 @@ if IS_IN_JUPYTER:
             cs_ext,
             ai_ext,
             drawio_ext,
-            html_ext
+            html_ext,
+            jobs_ext,
+            dsync_ext
         ]:
             module.load_ipython_extension(ipython)
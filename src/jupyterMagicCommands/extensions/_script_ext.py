@@ -1,8 +1,8 @@
 # this is a modified version from https://github.com/ipython/ipython/blob/f22a925d565fa018d41d6720de8bf4df85e797c7/IPython/core/magics/script.py
 # because the original %%script can't meet our requirements
 import asyncio
-import asyncio.exceptions
 import atexit
+import codecs
 import errno
 import os
 import signal
@@ -18,8 +18,13 @@ from IPython.core.magic import Magics, cell_magic, line_magic, magics_class
 from IPython.utils.process import arg_split
 from traitlets import Any, Dict, List, default
 
+from jupyterMagicCommands.jobs import JOB_REGISTRY
+from jupyterMagicCommands.outputters import FileOutputter
 from jupyterMagicCommands.utils.action_detector import ActionDetector
 
+# bytes read from the output of a script at a time
+READ_CHUNK_SIZE = 64 * 1024
+
 #-----------------------------------------------------------------------------
 # Magic implementation classes
 #-----------------------------------------------------------------------------
@@ -72,6 +77,26 @@ def script_args(f):
             help="""Output file
             """,
         ),
+        magic_arguments.argument(
+            '--outfile-buffer-size', type=int, dest='outFileBufferSize', default=64 * 1024,
+            help="""Bytes buffered before they are written to the output file
+            """,
+        ),
+        magic_arguments.argument(
+            '--outfile-gzip', action="store_true", dest='outFileCompress',
+            help="""Compress the output file with gzip, also enabled by a .gz suffix
+            """,
+        ),
+        magic_arguments.argument(
+            '--outfile-max-size', type=int, dest='outFileMaxSize', default=None,
+            help="""Rotate the output file once it reaches this number of bytes
+            """,
+        ),
+        magic_arguments.argument(
+            '--outfile-keep', type=int, dest='outFileKeep', default=1,
+            help="""Number of rotated output files to keep
+            """,
+        ),
     ]
     for arg in args:
         f = arg(f)
@@ -177,27 +202,34 @@ class MyScriptMagics(Magics):
         
         return named_script_magic
 
-    async def _handle_stream(self, stream, stream_arg, file_object):
+    async def _handle_stream(self, stream, stream_arg, file_object, flush=True):
+        # the output is read in large chunks and written as it comes, only
+        # the action detection splits it into lines
+        decoder = codecs.getincrementaldecoder("utf8")(errors="replace")
+        actionDetector = self.actionDetector.fork()
+        chunks = []
         while True:
-            chunk = (await self._readchunk(stream)).decode("utf8", errors="replace")
-            if not chunk:
+            data = await stream.read(READ_CHUNK_SIZE)
+            chunk = decoder.decode(data, final=not data)
+            if chunk:
+                actionDetector.feed(chunk)
+                if stream_arg:
+                    chunks.append(chunk)
+                else:
+                    file_object.write(chunk)
+                    if flush:
+                        file_object.flush()
+            if not data:
                 break
-            if stream_arg:
-                self.shell.user_ns[stream_arg] = chunk
-            else:
-                file_object.write(chunk)
-                file_object.flush()
+        if stream_arg:
+            self.shell.user_ns[stream_arg] = "".join(chunks)
+
+    async def _flush_periodically(self, outputter):
+        """flushes the buffered output of a background script which went quiet"""
+        while True:
+            await asyncio.sleep(outputter.flush_interval)
+            outputter.handle_read()
 
-    async def _readchunk(self, stream):
-        try:
-            s = await stream.readuntil(b"\n")
-            self.actionDetector.detect_action_by_line(s.decode("utf8", errors="replace"))
-            return s
-        except asyncio.exceptions.IncompleteReadError as e:
-            return e.partial
-        except asyncio.exceptions.LimitOverrunError as e:
-            return await stream.read(e.consumed)
-    
     @magic_arguments.magic_arguments()
     @script_args
     @cell_magic("_script")
@@ -277,9 +309,12 @@ class MyScriptMagics(Magics):
 
         if not cell.endswith('\n'):
             cell += '\n'
+        command = cell
         cell = cell.encode('utf8', 'replace')
         if args.bg:
             self.bg_processes.append(p)
+            # FileOutputter also compresses by the .gz suffix when the flag isn't set
+            JOB_REGISTRY.register(p.pid, command.strip(), args.outFile, compressed=args.outFileCompress or None)
             self._gc_bg_processes()
             to_close = []
             if args.outFile is None:
@@ -292,7 +327,7 @@ class MyScriptMagics(Magics):
                 else:
                     to_close.append(p.stderr)
             event_loop.call_soon_threadsafe(
-                lambda: asyncio.Task(self._run_script(p, cell, to_close, args.delay, args.outFile))
+                lambda: asyncio.Task(self._run_script(p, cell, to_close, args.delay, args.outFile, args))
             )
             if args.proc:
                 proc_proxy = _AsyncIOProxy(p, event_loop)
@@ -332,7 +367,7 @@ class MyScriptMagics(Magics):
 
     shebang.__skip_doctest__ = os.name != "posix"
 
-    async def _run_script(self, p, cell: str, to_close: list, delay: int, outFile: Optional[str]=None):
+    async def _run_script(self, p, cell: str, to_close: list, delay: int, outFile: Optional[str]=None, args=None):
         """callback for running the script in the background"""
         p.stdin.write(cell)
         await p.stdin.drain()
@@ -341,21 +376,33 @@ class MyScriptMagics(Magics):
         if delay > 0:
             await asyncio.sleep(delay)
         if outFile is not None:
-            with open(outFile, 'w') as f:
+            f = FileOutputter(
+                outFile,
+                buffer_size=args.outFileBufferSize,
+                compress=args.outFileCompress or None,
+                max_size=args.outFileMaxSize,
+                keep=args.outFileKeep,
+            )
+            flush_task = asyncio.create_task(self._flush_periodically(f))
+            try:
                 stdout_task = asyncio.create_task(
-                    self._handle_stream(p.stdout, None, f)
+                    self._handle_stream(p.stdout, None, f, flush=False)
                 )
                 stderr_task = asyncio.create_task(
-                    self._handle_stream(p.stderr, None, f)
+                    self._handle_stream(p.stderr, None, f, flush=False)
                 )
                 await asyncio.wait([stdout_task, stderr_task])
                 await p.wait()
+            finally:
+                flush_task.cancel()
+                f.close()
         else:
             await p.wait()
             # asyncio read pipes have no close
             # but we should drain the data anyway
             for s in to_close:
                 await s.read()
+        JOB_REGISTRY.mark_exited(p.pid, p.returncode)
         self._gc_bg_processes()
 
     @line_magic("_killbgscripts")
@@ -1,14 +1,14 @@
 import argparse
 import os
 import shlex
-import tempfile
-import time
 from dataclasses import dataclass
 from logging import ERROR, Logger
 from operator import itemgetter
 from typing import Optional
 
+import pandas as pd
 import pexpect
+from docker.errors import APIError
 from IPython import get_ipython
 from IPython.core.magic import Magics, cell_magic, magics_class
 from IPython.display import display
@@ -20,32 +20,26 @@ from jupyterMagicCommands.extensions.constants import (
 from IPython.core.interactiveshell import InteractiveShell
 
 # The class MUST call this class decorator at creation time
+from jupyterMagicCommands.filesystem.fanout import (FANOUT_COLUMNS, FANOUT_GROUPED,
+                                                   FANOUT_PREFIX, FANOUT_QUIET,
+                                                   run_fanout)
 from jupyterMagicCommands.filesystem.filesystem_factory import FileSystemFactory
+from jupyterMagicCommands.filesystem.filesystem_pool import (FILESYSTEM_POOL,
+                                                             FileSystemPool,
+                                                             is_multi_selector)
 from jupyterMagicCommands.filesystem.Ifilesystem import IFileSystem
+from jupyterMagicCommands.filesystem.workdir_preparation import WorkdirPreparation
 from jupyterMagicCommands.utils.functools import suppress
 from jupyterMagicCommands.utils.log import NULL_LOGGER, getLogger
-from jupyterMagicCommands.utils.parser import parse_logLevel
+from jupyterMagicCommands.outputters import DockerFileSystemOutputterFactory, OutputterOptions
+from jupyterMagicCommands.utils.parser import parse_logLevel, parse_size
+from jupyterMagicCommands.utils.script_store import SCRIPT_STORE
+from jupyterMagicCommands.utils.stream import StreamReader
+from jupyterMagicCommands.utils.types import nn
+from jupyterMagicCommands.utils.xterm import XtermTerminal
 
 global_logger = getLogger(__name__)
 
-template = """
-    <link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/xterm@4.5.0/css/xterm.css" />
-    <script src="https://cdn.jsdelivr.net/npm/xterm@4.5.0/lib/xterm.js"></script>
-    <div>
-    <div id="%(termName)s"></div>
-    <script>
-        // create an instance of terminal and attach it to window.
-        var %(termName)s = new Terminal(
-            {
-                rows: %(rows)s
-            }
-        );
-        window.%(termName)s.open(document.getElementById('%(termName)s'));
-    </script>
-    </div>
-"""
-
-
 class NotValidBackend(Exception):
     pass
 
@@ -67,40 +61,33 @@ class BashArgsNS:
     proc: Optional[str] = None
     expand: bool = False
     delay: int = -1
-
-
-def initTerminal(initialOptions):
-    termName = f"term_{time.strftime('%Y_%m_%d_%H_%M_%S')}"
-    display(
-        {
-            "text/html": template
-            % ({"termName": termName, "rows": initialOptions["rows"]})
-        },
-        raw=True,
+    session: Optional[str] = None
+    outVarBytes: bool = False
+    outVarMaxSize: Optional[int] = None
+    outFileBufferSize: int = 64 * 1024
+    outFileCompress: bool = False
+    outFileMaxSize: Optional[int] = None
+    outFileKeep: int = 1
+    workers: int = 8
+    fanoutOutput: str = FANOUT_PREFIX
+
+
+def get_outputter_options(args: BashArgsNS) -> OutputterOptions:
+    return OutputterOptions(
+        outVarBytes=args.outVarBytes,
+        outVarMaxSize=args.outVarMaxSize,
+        outFileBufferSize=args.outFileBufferSize,
+        outFileCompress=args.outFileCompress,
+        outFileMaxSize=args.outFileMaxSize,
+        outFileKeep=args.outFileKeep,
     )
-    displayHandler = display({"text/html": "<div></div>"}, raw=True, display_id=True)
-    return termName, displayHandler
-
-
-def sendToTerminal(termName, displayHandler, message, prevMessage=None):
-    currentMessage = message
-    if prevMessage is not None:
-        currentMessage = message[len(prevMessage) :]
-    unicodeArray = [ord(ch) for ch in currentMessage]
-    template = f"""
-<script>
-    // window.{termName}.clear();
-    window.{termName}.write({unicodeArray});
-</script>
-"""
-    displayHandler.update({"text/html": template}, raw=True)
 
 
 def plainExecuteCommand(command: str, args: BashArgsNS, **kwargs):
     logger: Logger = kwargs.get("logger", NULL_LOGGER)
 
-    verbose, background, interactive, outFile, outVar, proc, delay = itemgetter(
-        "verbose", "background", "interactive", "outFile", "outVar", "proc", "delay"
+    verbose, background, interactive, outFile, outVar, proc, delay, session = itemgetter(
+        "verbose", "background", "interactive", "outFile", "outVar", "proc", "delay", "session"
     )(vars(args))
     logger.debug("### Parameters starts ###")
     logger.debug(f"{command =}'")
@@ -110,6 +97,7 @@ def plainExecuteCommand(command: str, args: BashArgsNS, **kwargs):
     logger.debug(f"{outVar =}")
     logger.debug(f"{proc =}")
     logger.debug(f"{delay =}")
+    logger.debug(f"{session =}")
     logger.debug("### Parameters ends ###")
     if verbose:
         print(command)
@@ -122,6 +110,8 @@ def plainExecuteCommand(command: str, args: BashArgsNS, **kwargs):
             outVar=outVar,
             proc=proc,
             delay=delay,
+            session=session,
+            outputterOptions=get_outputter_options(args),
         )
     else:
         raise Exception("FileSystem is not initliazed for a container!")
@@ -132,28 +122,83 @@ def xtermExecuteCommand(command: str, args: BashArgsNS, **kwargs):
     verbose, height = itemgetter("verbose", "height")(vars(args))
     if verbose:
         print(command)
-    encoding = "utf8"
-    with tempfile.NamedTemporaryFile(encoding=encoding, mode="w") as fp:
-        fp.write(command)
-        fp.seek(0)
-        cmd = f"bash '{fp.name}'"
-        logger.debug(cmd)
-        child = pexpect.spawn(cmd)
-        initialOptions = {"rows": height}
-        termName, displayHandler = initTerminal(initialOptions)
-        prevMessage = ""
-        while True:
+    cmd = f"bash '{SCRIPT_STORE.path_for(command)}'"
+    logger.debug(cmd)
+    child = pexpect.spawn(cmd)
+    terminal = XtermTerminal(rows=height)
+    terminal.open()
+    reader = StreamReader()
+    reader.register(child.child_fd, terminal.write)
+    try:
+        while not reader.finished:
             try:
-                i = child.expect_list(
-                    [pexpect.TIMEOUT, pexpect.EOF], timeout=0.2
-                )  # fresh terminal per 0.2s
-                message = child.before.decode()
-                sendToTerminal(termName, displayHandler, message, prevMessage)
-                prevMessage = message
-                if i != 0:
-                    break
+                reader.poll(timeout=terminal.min_interval)
+                terminal.handle_tick()
             except KeyboardInterrupt:
                 child.sendintr()
+    finally:
+        reader.close()
+        terminal.close()
+        child.close()
+
+
+def fanoutExecuteCommand(
+    command: str,
+    args: BashArgsNS,
+    shell: Optional[InteractiveShell] = None,
+    logger: Logger = NULL_LOGGER,
+    pool: FileSystemPool = FILESYSTEM_POOL,
+) -> pd.DataFrame:
+    """Runs the command on every container of the selector in args.container
+
+    Returns a table of the exit code, duration, output and error per
+    container, which is saved into args.outVar if it's set and displayed
+    otherwise.
+    """
+    shell = shell or get_ipython()
+    unsupported = [
+        ("--bg", args.background),
+        ("-i", args.interactive),
+        ("--session", args.session),
+        ("--outfile", args.outFile),
+        ("--proc", args.proc),
+    ]
+    for flag, value in unsupported:
+        if value:
+            raise Exception(f"{flag} can't be used with more than one container")
+    if args.backend != "plain":
+        raise NotValidBackend(f"Backend {args.backend} can't run on more than one container")
+    targets = pool.select(nn(args.container))
+    if not targets:
+        raise Exception(f"No container matches {args.container}")
+    if args.expand:
+        command = os.linesep.join(shell.var_expand(line) for line in command.splitlines())
+    if args.verbose:
+        print(command)
+    outputterFactory = DockerFileSystemOutputterFactory(shell)
+
+    def execute(target, outputter, preparation):
+        fs = pool.get(target, outputterFactory, logger)
+        try:
+            return fs.execute(command, outputter, preparation=preparation)
+        except APIError:
+            pool.invalidate(target)
+            raise
+
+    results = run_fanout(
+        targets,
+        execute,
+        workers=args.workers,
+        preparation=WorkdirPreparation(args.cwd, args.create, args.init),
+        mode=FANOUT_QUIET if args.outVar is not None else args.fanoutOutput,
+        maxOutputSize=args.outVarMaxSize,
+    )
+    table = pd.DataFrame([vars(result) for result in results], columns=FANOUT_COLUMNS)
+    if args.outVar is not None:
+        shell.user_ns[args.outVar] = table
+    else:
+        display(table)
+    return table
 
 
 def executeCmd(command: str, args: BashArgsNS, **kwargs):
@@ -196,7 +241,8 @@ def get_args(line: str) -> BashArgsNS:
     parser.add_argument(
         "-c",
         "--container",
-        help="docker container name or id, if this is specified, the command would run in the specified container",
+        help="docker container name or id, if this is specified, the command would run in the specified container. "
+        "Several containers are selected with a comma separated list, label:KEY[=VALUE] or re:PATTERN on the names",
         nargs="?",
         const=os.environ.get(
             JUPYTER_MAGIC_COMMAND_BASH_CURRENT_CONTAINER, EMPTY_CONTAINER_NAME
@@ -227,6 +273,12 @@ def get_args(line: str) -> BashArgsNS:
     mg.add_argument(
         "--bg", "--background", dest="background", action="store_true", default=False
     )
+    mg.add_argument(
+        "--session",
+        type=str,
+        default=None,
+        help="Run the cell in a long-lived bash with the given name. Variables and the working directory are kept between cells",
+    )
     parser.add_argument("-proc", "--proc", type=str, help="Variable name which the process id will be saved into")
     outputMg = parser.add_mutually_exclusive_group()
     outputMg.add_argument(
@@ -242,6 +294,62 @@ def get_args(line: str) -> BashArgsNS:
         default=None,
         help="save output into a variable",
     )
+    parser.add_argument(
+        "--outvar-bytes",
+        dest="outVarBytes",
+        action="store_true",
+        default=False,
+        help="Save the output into the variable as bytes instead of str",
+    )
+    parser.add_argument(
+        "--outvar-max-size",
+        dest="outVarMaxSize",
+        type=parse_size,
+        default=None,
+        help="Keep only the last part of the output saved into the variable, e.g. 10M",
+    )
+    parser.add_argument(
+        "--outfile-buffer-size",
+        dest="outFileBufferSize",
+        type=parse_size,
+        default=64 * 1024,
+        help="Bytes buffered before they are written to the output file",
+    )
+    parser.add_argument(
+        "--outfile-gzip",
+        dest="outFileCompress",
+        action="store_true",
+        default=False,
+        help="Compress the output file with gzip. It's the default when the file name ends with .gz",
+    )
+    parser.add_argument(
+        "--outfile-max-size",
+        dest="outFileMaxSize",
+        type=parse_size,
+        default=None,
+        help="Rotate the output file once it reaches this size, e.g. 100M",
+    )
+    parser.add_argument(
+        "--outfile-keep",
+        dest="outFileKeep",
+        type=int,
+        default=1,
+        help="Number of rotated output files to keep",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Number of containers the cell runs on at the same time when several are selected",
+    )
+    parser.add_argument(
+        "--fanout-output",
+        dest="fanoutOutput",
+        choices=[FANOUT_PREFIX, FANOUT_GROUPED],
+        default=FANOUT_PREFIX,
+        help="Show the output of several containers line by line behind their names or in a block per container. "
+        "With --outvar a table of the results is saved instead",
+    )
     if line:
         args = parser.parse_args(shlex.split(line), namespace=BashArgsNS())
     else:
@@ -272,13 +380,29 @@ class BashExtension:
         self.logger.setLevel(self.args.logLevel)
         if self.fs is None:
             return
+        # the metadata is cached for this invocation only
+        self.fs.invalidate_cache()
+        preparation = WorkdirPreparation(self.args.cwd, self.args.create, self.args.init)
+        if self.args.session is None and self.fs.defer_workdir_preparation(preparation):
+            # the file system prepares the directory and runs the command in one go
+            # without changing its own working directory
+            try:
+                self.logger.debug("The argument are %s", self.args)
+                executeCmd(self._preprocessCommand(self.cell), self.args, fs=self.fs, logger=self.logger)
+            finally:
+                self.fs.defer_workdir_preparation(None)
+            return
+        self.fs.prefetch([self.args.cwd])
         olddir = self.fs.getcwd()
         try:
             self.logger.debug("Current dir: %s", self.fs.getcwd())
             self.logger.debug("The argument are %s", self.args)
 
             command = self._preprocessCommand(self.cell)
-            self._prepare(self.args, self.fs, self.logger)
+            preparation.apply(self.fs, self.logger)
+            if self.args.session is not None and self.args.cwd != ".":
+                # the session keeps its own working directory, follow --cwd explicitly
+                command = f"cd {shlex.quote(self.fs.getcwd())}{os.linesep}{command}"
             executeCmd(command, self.args, fs=self.fs, logger=self.logger)
         finally:
             self.fs.chdir(olddir)
@@ -297,30 +421,6 @@ class BashExtension:
         self.logger.info(f"Command after preprocessing: {modified_command=}")
         return modified_command
 
-    def _prepare(self, args: BashArgsNS, fs: IFileSystem, logger: Logger) -> None:
-        folderExists = fs.exists(args.cwd)
-        if args.create:
-            if folderExists:
-                if args.init:
-                    logger.debug(
-                        "Folder %r exists and we need to remove it because --init is specified",
-                        args.cwd,
-                    )
-                    fs.remove(args.cwd)
-                    fs.makedirs(args.cwd)
-                else:
-                    logger.debug(
-                        "Folder %r exists and we don't need to remove it", args.cwd
-                    )
-            else:
-                fs.makedirs(args.cwd)
-        else:
-            if not folderExists:
-                raise Exception(
-                    f"Accessing non existing working directory: {args.cwd}! You can specify --create flag to create an empty working directory"
-                )
-        fs.chdir(args.cwd)
-
 
 @magics_class
 class BashMagics(Magics):
@@ -333,6 +433,9 @@ class BashMagics(Magics):
     def bash(self, line: str, cell: str):
         args = get_args(line)
         shell = get_ipython()
+        if is_multi_selector(args.container):
+            fanoutExecuteCommand(cell, args, shell, global_logger)
+            return
         fs = FileSystemFactory.get_filesystem(
             args.container, shell, global_logger
         )
@@ -340,7 +443,12 @@ class BashMagics(Magics):
             global_logger.error("Initialize a None FileSystem")
             return
         bash = BashExtension(args, fs, cell, global_logger, shell)
-        bash.run()
+        try:
+            bash.run()
+        except APIError:
+            # the container may have been restarted or removed since it was pooled
+            FileSystemFactory.invalidate(args.container)
+            raise
 
 
 # load point
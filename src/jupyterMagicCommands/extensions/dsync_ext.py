@@ -0,0 +1,55 @@
+import argparse
+import os
+import posixpath
+import shlex
+
+from docker.errors import APIError
+
+from jupyterMagicCommands.filesystem.docker import DockerFileSystem
+from jupyterMagicCommands.filesystem.filesystem_factory import FileSystemFactory
+from jupyterMagicCommands.utils.docker import SyncResult, sync_to_container
+
+
+def get_args(line: str) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="%dsync")
+    parser.add_argument("src", help="local directory")
+    parser.add_argument("dst", help="CONTAINER:DIR, a relative DIR is below the container's working directory")
+    parser.add_argument("--checksum", action="store_true", default=False,
+                        help="compare the sha256 of files of the same size instead of their mtime")
+    parser.add_argument("--delete", action="store_true", default=False,
+                        help="remove the files in the container which don't exist locally")
+    parser.add_argument("-l", "--level", type=int, default=6, help="gzip compression level")
+    return parser.parse_args(shlex.split(line))
+
+
+def format_result(result: SyncResult) -> str:
+    message = f"Sent {len(result.uploaded)} files ({result.bytes_sent} bytes compressed)"
+    if result.deleted:
+        message += f", deleted {len(result.deleted)} files"
+    return message + f", {result.unchanged} unchanged in {result.elapsed:.2f}s"
+
+
+def dsync(line: str) -> None:
+    """%dsync SRC CONTAINER:DIR: copies the new and changed files of SRC into the container"""
+    args = get_args(line)
+    containerName, sep, path = args.dst.partition(":")
+    if not sep or not containerName:
+        raise Exception(f"The destination {args.dst} must be CONTAINER:DIR")
+    fs = FileSystemFactory.get_filesystem(containerName)
+    if not isinstance(fs, DockerFileSystem):
+        raise Exception(f"Can't find container {containerName}")
+    dst = posixpath.normpath(posixpath.join(fs.getcwd(), path or "."))
+    try:
+        result = sync_to_container(
+            fs.container, os.path.expanduser(args.src), dst, args.checksum, args.delete, args.level
+        )
+    except APIError:
+        FileSystemFactory.invalidate(containerName)
+        raise
+    finally:
+        fs.invalidate_cache()
+    print(format_result(result))
+
+
+def load_ipython_extension(ipython):
+    ipython.register_magic_function(dsync, 'line')
@@ -0,0 +1,106 @@
+import argparse
+import functools
+import shlex
+import signal
+import time
+from typing import Optional
+
+import pandas as pd
+from IPython.core.magic import Magics, line_magic, magics_class
+
+from jupyterMagicCommands.jobs import JOB_REGISTRY, JobRegistry
+from jupyterMagicCommands.utils.functools import suppress
+from jupyterMagicCommands.utils.general import removeprefix
+
+
+def _format_time(t: Optional[float]) -> str:
+    if t is None:
+        return ""
+    return time.strftime("%H:%M:%S", time.localtime(t))
+
+
+def list_jobs(registry: JobRegistry) -> pd.DataFrame:
+    registry.refresh()
+    rows = []
+    for job in registry.jobs.values():
+        cpu, rss = job.usage()
+        end = job.end_time if job.end_time is not None else time.time()
+        rows.append(
+            {
+                "id": job.id,
+                "pid": job.pid,
+                "state": job.state.value,
+                "exit_code": job.exit_code,
+                "start": _format_time(job.start_time),
+                "end": _format_time(job.end_time),
+                "duration": round(end - job.start_time, 1),
+                "cpu%": round(cpu, 1),
+                "rss_mb": round(rss / 1024 / 1024, 1),
+                "log": job.log_file,
+                "command": job.command.splitlines()[0] if job.command else "",
+            }
+        )
+    return pd.DataFrame(rows, columns=[
+        "id", "pid", "state", "exit_code", "start", "end", "duration", "cpu%", "rss_mb", "log", "command"
+    ])
+
+
+def get_job_args(line: str) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="%job")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    tail = subparsers.add_parser("tail", help="Print the last lines of the job's log")
+    tail.add_argument("id", type=int)
+    tail.add_argument("-n", "--lines", type=int, default=10)
+    follow = subparsers.add_parser("follow", help="Print the last lines of the job's log and what's appended until it exits")
+    follow.add_argument("id", type=int)
+    follow.add_argument("-n", "--lines", type=int, default=10)
+    kill = subparsers.add_parser("kill", help="Send a signal to the job's process group")
+    kill.add_argument("id", type=int)
+    kill.add_argument("-s", "--signal", type=str, default="TERM", help="Signal name, e.g. TERM, INT or KILL")
+    wait = subparsers.add_parser("wait", help="Wait until the job exits")
+    wait.add_argument("id", type=int)
+    wait.add_argument("-t", "--timeout", type=float, default=None)
+    return parser.parse_args(shlex.split(line))
+
+
+def run_job_command(line: str, registry: JobRegistry = JOB_REGISTRY) -> Optional[int]:
+    args = get_job_args(line)
+    target = registry.get(args.id)
+    if args.action == "tail":
+        print(target.tail(args.lines), end="")
+    elif args.action == "follow":
+        try:
+            target.follow(functools.partial(print, end="", flush=True), args.lines)
+        except KeyboardInterrupt:
+            pass
+    elif args.action == "kill":
+        name = "SIG" + removeprefix(args.signal.upper(), "SIG")
+        target.kill(getattr(signal, name))
+        print(f"Sent {name} to job {target.id} (pid {target.pid})")
+    elif args.action == "wait":
+        if not target.wait(args.timeout):
+            print(f"Job {target.id} is still running after {args.timeout}s")
+        else:
+            print(f"Job {target.id} exited with code {target.exit_code}")
+        return target.exit_code
+    return None
+
+
+@magics_class
+class JobsMagics(Magics):
+
+    @line_magic
+    def jobs(self, line: str = ""):
+        """List background jobs with their state and resource usage"""
+        return list_jobs(JOB_REGISTRY)
+
+    @line_magic("job")
+    @suppress(Exception)
+    def job(self, line: str):
+        """%job tail|follow|kill|wait ID: inspect or control a background job"""
+        return run_job_command(line)
+
+
+# load point
+def load_ipython_extension(ipython):
+    ipython.register_magics(JobsMagics)
@@ -6,6 +6,8 @@ from io import StringIO
 from logging import DEBUG, ERROR, INFO
 import shlex
 
+from docker.errors import APIError
+
 from jupyterMagicCommands.filesystem.filesystem_factory import \
     FileSystemFactory
 from jupyterMagicCommands.filesystem.Ifilesystem import IFileSystem
@@ -71,7 +73,11 @@ def writefile(line, cell):
     fs = FileSystemFactory.get_filesystem(args.container)
     if fs is None:
         return
-    _writefile(text, args, fs)
+    try:
+        _writefile(text, args, fs)
+    except APIError:
+        FileSystemFactory.invalidate(args.container)
+        raise
     return
 
 def load_ipython_extension(ipython):
@@ -1,6 +1,9 @@
-from typing import IO, Optional
+from typing import IO, Iterable, Optional
 from abc import abstractmethod, ABCMeta
 
+from jupyterMagicCommands.filesystem.workdir_preparation import WorkdirPreparation
+from jupyterMagicCommands.outputters.outputter_options import OutputterOptions
+
 
 class IFileSystem(metaclass=ABCMeta):
 
@@ -32,6 +35,22 @@ class IFileSystem(metaclass=ABCMeta):
     def is_dir(self, path: str) -> bool:
         pass
 
+    def prefetch(self, paths: Iterable[str]) -> None:
+        """Hints that the metadata of paths and the working directory is about to be queried"""
+        pass
+
+    def invalidate_cache(self) -> None:
+        """Forgets the cached metadata, e.g. after something else changed the file system"""
+        pass
+
+    def defer_workdir_preparation(self, preparation: Optional[WorkdirPreparation]) -> bool:
+        """Asks the next system() call to prepare the working directory as part of the command
+
+        Returns False when the file system can't, then the caller prepares it
+        with separate calls. None cancels a deferred preparation.
+        """
+        return False
+
     @abstractmethod
     def system(
         self,
@@ -41,5 +60,7 @@ class IFileSystem(metaclass=ABCMeta):
         outFile: Optional[str] = None,
         outVar: Optional[str] = None,
         proc: Optional[str] = None,
+        session: Optional[str] = None,
+        outputterOptions: Optional[OutputterOptions] = None,
     ) -> None:
         pass
@@ -1,26 +1,45 @@
 import functools
-import textwrap
+import io
 import logging
 import os
+import posixpath
 import selectors
+import shlex
+import shutil
+import socket
+import sys
 import tempfile
+import threading
 import time
 import types
+import uuid
 from pathlib import Path
-from typing import IO, List, Optional
+from typing import IO, Dict, Iterable, List, Optional, Set, Tuple, Union
 
 from docker.models.containers import Container, ExecResult
 
 from IPython.core.interactiveshell import InteractiveShell
 from jupyterMagicCommands.filesystem.Ifilesystem import IFileSystem
+from jupyterMagicCommands.filesystem.workdir_preparation import WorkdirPreparation
+from jupyterMagicCommands.jobs import CONTAINER_LOG_DIR, JOB_REGISTRY, ContainerJob, JobRegistry
 from jupyterMagicCommands.outputters import (AbstractOutputter,
-                                             InteractiveOutputter)
+                                             InteractiveOutputter,
+                                             OutputterOptions)
 from jupyterMagicCommands.outputters.abstract_outputter_factory import AbstractOutputterFactory
 from jupyterMagicCommands.outputters.basic_interactive_outputter import BasicInteractiveOutputter
 from jupyterMagicCommands.outputters.variable_outputter import VariableOutputter
-from jupyterMagicCommands.utils.docker import (copy_from_container,
-                                               copy_to_container)
+from jupyterMagicCommands.session import DockerSession, DockerSessionClosed, SessionManager
+from jupyterMagicCommands.utils.docker import (EXEC_WRITE_SCRIPT,
+                                               ExecFileReader,
+                                               ExecFileWriter,
+                                               can_half_close,
+                                               copy_from_container,
+                                               copy_to_container,
+                                               stream_file_from_container)
 from jupyterMagicCommands.utils.log import NULL_LOGGER
+from jupyterMagicCommands.utils.script_store import SCRIPT_STORE
+from jupyterMagicCommands.utils.shell_cache import SHELL_CACHE, ShellCache
+from jupyterMagicCommands.utils.stream import DEFAULT_CHUNK_SIZE, StreamDemuxer
 from jupyterMagicCommands.utils.types import nn
 
 
@@ -28,8 +47,65 @@ class DirectoryNotExist(Exception):
     pass
 
 
+# the sessions of all containers, keyed by container id and session name
+docker_session_manager = SessionManager()
+
+
+def close_idle_docker_sessions(manager: SessionManager = docker_session_manager) -> None:
+    """Closes the container sessions which weren't used for their idle timeout"""
+    for key, dockerSession in list(manager.sessions.items()):
+        if dockerSession.expired:
+            manager.removeSession(key)
+            dockerSession.close()
+
+
 SHELL_DETECT_LIST = ["bash", "sh"]
 
+# larger scripts of detached commands are copied into a file, a single
+# argument is limited to 128 KiB by Linux
+MAX_INLINE_SCRIPT_SIZE = 64 * 1024
+
+# prints the arguments which are commands available in the container
+SHELL_PROBE_SCRIPT = """\
+for s in "$@"; do
+    command -v "$s" >/dev/null 2>&1 && echo "$s"
+done
+exit 0
+"""
+
+# prints the pid file $1 once the background job wrote it, waits up to 5s
+PID_FILE_WAIT_SCRIPT = """\
+i=0
+while [ ! -s "$1" ] && [ "$i" -lt $((${2:-500} + 100)) ]; do
+    i=$((i + 1))
+    # the job creates its pid file with noclobber, once it's taken here the
+    # job exits without running
+    if [ "$i" -eq "${2:-500}" ] && mkdir -p -- "${1%/*}" && (set -C; : > "$1") 2>/dev/null; then
+        echo "its pid file didn't appear"
+        exit 1
+    fi
+    sleep 0.01
+done
+cat "$1" && rm -f "$1"
+"""
+
+STAT_DIR = "d"
+STAT_FILE = "f"
+STAT_MISSING = "-"
+
+# prints a line per argument: `d`, `f` or `-`
+PROBE_SCRIPT = """\
+for p in "$@"; do
+    if [ -d "$p" ]; then
+        echo d
+    elif [ -e "$p" ]; then
+        echo f
+    else
+        echo -
+    fi
+done
+"""
+
 
 class DockerFileSystem(IFileSystem):
     def __init__(
@@ -38,14 +114,43 @@ class DockerFileSystem(IFileSystem):
         outputterFactory: AbstractOutputterFactory,
         workdir: str = "/",
         logger: logging.Logger = NULL_LOGGER,
+        shell_cache: ShellCache = SHELL_CACHE,
+        job_registry: JobRegistry = JOB_REGISTRY,
     ) -> None:
         self.container = container
+        self.shell_cache = shell_cache
+        self.job_registry = job_registry
         self.outputterFactory = outputterFactory
+        self._initial_workdir = workdir
         self._workdir = workdir
         self._default_shell: Optional[str] = None
         self._default_shell_checked: bool = False
+        # whether the default shell came from the shell cache and wasn't run yet
+        self._shell_from_cache = False
+        self._scripts_in_container: Set[str] = set()
+        # results of the metadata probes, keyed by absolute path, until the
+        # next command which may change the file system
+        self._stat_cache: Dict[str, str] = {}
+        self.exec_count = 0
+        self._deferred_preparation: Optional[WorkdirPreparation] = None
+        self._execute_lock = threading.Lock()
         self.logger = logger
 
+    def reuse(
+        self,
+        outputterFactory: AbstractOutputterFactory,
+        logger: logging.Logger = NULL_LOGGER,
+    ) -> None:
+        """Prepares a pooled file system for another cell
+
+        The detected shell and the scripts copied into the container are kept,
+        the working directory and the cached metadata are not.
+        """
+        self.outputterFactory = outputterFactory
+        self.logger = logger
+        self._workdir = self._initial_workdir
+        self.invalidate_cache()
+
     @property
     def default_shell(self) -> Optional[str]:
         if self._default_shell is None and not self._default_shell_checked:
@@ -56,99 +161,288 @@ class DockerFileSystem(IFileSystem):
     def _detect_default_shells(
         self, detect_list: List[str] = SHELL_DETECT_LIST
     ) -> Optional[str]:
+        key = ShellCache.key(self.container.id, self.container.attrs.get("Image", ""))
+        shells = self.shell_cache.get(key)
+        self._shell_from_cache = shells is not None
+        if shells is None:
+            shells = self._probe_shells(detect_list)
+            # a shell may still be installed into the container
+            if shells:
+                self.shell_cache.set(key, shells)
         for shell in detect_list:
-            results = self.container.exec_run(shell, workdir=self._workdir)
-            if results.exit_code == 0:
+            if shell in shells:
                 return shell
         return None
 
-    def copy_to_container(self, src: str, dst: str):
-        copy_to_container(self.container, src, dst)
+    def _check_cached_shell(self, exec_id: str) -> Optional[int]:
+        """Returns the exit code of an exec of the default shell
+
+        When the shell came from the cache and couldn't be run, e.g. because
+        it was removed from the container, the cache entry is dropped and the
+        shells are detected again by the next command.
+        """
+        exit_code = self._exit_code(exec_id)
+        if self._shell_from_cache:
+            self._shell_from_cache = False
+            # the exit codes of a command which isn't found or can't be run
+            if exit_code in (126, 127):
+                self.logger.info(f"The cached shell {self._default_shell} failed, detecting the shells again")
+                self.shell_cache.invalidate(self.container.id)
+                self._default_shell, self._default_shell_checked = None, False
+        return exit_code
+
+    def _probe_shells(self, detect_list: List[str]) -> List[str]:
+        """Returns the shells of detect_list which exist in the container"""
+        results = self._exec_run(["sh", "-c", SHELL_PROBE_SCRIPT, "sh", *detect_list], user="root")
+        if results.exit_code == 0:
+            found = results.output.decode().split()
+            return [shell for shell in detect_list if shell in found]
+        # without sh, try to run every shell
+        return [shell for shell in detect_list if self._exec_run(shell, user="root").exit_code == 0]
+
+    def copy_to_container(self, src: str, dst: str, mode: Optional[int] = None):
+        copy_to_container(self.container, src, posixpath.join(self._workdir, dst), mode=mode)
+        self._mark_exists(dst, STAT_FILE)
 
     def copy_from_container(self, src: str, dst: str):
         copy_from_container(self.container, src, dst)
 
-    def _execute_cmd(
+    def _render_command(
         self,
         cmd: str,
         background: bool = False,
         outFile: Optional[str] = None,
-        **kwargs,
-    ) -> ExecResult:
-        with tempfile.NamedTemporaryFile(mode="w+") as fp:
-            fp.write(cmd)
-            fp.seek(0)
-            filename = fp.name
-            self.logger.debug("Commands to run into files: %s", filename)
-            self.logger.debug("Commands: %s", cmd)
-            self.logger.debug("Saved")
-            self.copy_to_container(filename, filename)
+        preamble: Optional[str] = None,
+        inline: bool = False,
+        pidFile: Optional[str] = None,
+    ) -> List[str]:
+        """Renders a shell command line running cmd
+
+        With inline a script of up to MAX_INLINE_SCRIPT_SIZE bytes is passed
+        as an argument, otherwise it's copied into a file in the container.
+        With pidFile the pid of the command line is written into it first,
+        unless the file exists already, then the command line exits.
+        """
+        self.logger.debug("Commands: %s", cmd)
+        program = f"{preamble}\n" if preamble else ""
+        if pidFile is not None:
+            pidDir = shlex.quote(posixpath.dirname(pidFile))
+            program += f"mkdir -p -- {pidDir} && (set -C; echo $$ > {shlex.quote(pidFile)}) || exit 1\n"
+        if inline and len(cmd.encode("utf8")) <= MAX_INLINE_SCRIPT_SIZE:
+            program += f"{self.default_shell} -c {shlex.quote(cmd)}"
+        else:
+            filename = self._copy_script(cmd)
+            disable_bracketed_paste = '/bin/echo "set enable-bracketed-paste off" > .inputrc && INPUTRC=$PWD/.inputrc'
+            program += f"{disable_bracketed_paste} {self.default_shell} {filename}"
+        if outFile is not None:
+            self.makedirs(str(Path(nn(outFile)).parent))
+            program += f" 1>{shlex.quote(outFile)} 2>&1"
+        if background:
+            program += " &"
+        actual_cmd_to_run = [nn(self.default_shell), "-c", program]
+        self.logger.info("actual command to run: %s", actual_cmd_to_run)
+        return actual_cmd_to_run
+
+    def _copy_script(self, cmd: str) -> str:
+        """Copies cmd into a script file in the container and returns its path"""
+        filename = SCRIPT_STORE.path_for(cmd)
+        self.logger.debug("Commands to run into files: %s", filename)
+        # the file name is the hash of its content, so a script copied before is still valid
+        if filename not in self._scripts_in_container:
+            # the store's files are private on the host, not in the container
+            self.copy_to_container(filename, filename, mode=0o644)
+            self._scripts_in_container.add(filename)
             self.logger.debug(
                 "Copying tmp files from %s into container file %s", filename, filename
             )
-            disable_bracketed_paste = '/bin/echo "set enable-bracketed-paste off" > .inputrc && INPUTRC=$PWD/.inputrc'
-            actual_cmd_to_run = (
-                f"{disable_bracketed_paste} {self.default_shell} {filename}"
-            )
-            if outFile is not None:
-                self.makedirs(str(Path(nn(outFile)).parent))
-                actual_cmd_to_run += f" 1>'{outFile}' 2>&1"
-            if background:
-                actual_cmd_to_run += " &"
-            actual_cmd_to_run = f"{self.default_shell} -c '{actual_cmd_to_run}'"
-            self.logger.info("actual command to run: %s", actual_cmd_to_run)
-            results = self.container.exec_run(
-                actual_cmd_to_run, workdir=self._workdir, user="root", **kwargs
-            )
-        return results
+        return filename
 
-    def exists(self, path: str) -> bool:
-        template = f"""\
-if [ -e '{path}' ]; then
-    echo "Exists"
-else
-    echo "Doesn't exist"
-fi
-"""
-        results = self._execute_cmd(template)
+    def _render_stdin_program(
+        self, cmd: str, preamble: Optional[str] = None, scriptFile: Optional[str] = None
+    ) -> bytes:
+        """Renders the program fed to `shell -s` to run cmd
+
+        With scriptFile the shell runs cmd from that file and reads no more of
+        its stdin, so the program doesn't need to be followed by EOF.
+        """
+        program = f"{preamble}\n" if preamble else ""
+        if scriptFile is not None:
+            program += f"exec {self.default_shell} {shlex.quote(scriptFile)} </dev/null\n"
+        else:
+            # the shell parses the whole group before running it, so a command
+            # reading stdin gets EOF instead of the rest of the script
+            program += f"{{\n{cmd}\n}}\n"
+        return program.encode("utf8")
+
+    def _start_command(
+        self, cmd: str, tty: bool = False, preamble: Optional[str] = None
+    ) -> Tuple[str, ExecResult]:
+        """Starts cmd attached to a socket, returns the exec id to query its exit code
+
+        The script is fed to the shell over stdin, so nothing is copied into
+        the container. With tty the user may type into stdin, so the script
+        is run from a file instead. The stdin of a TLS socket can't be closed
+        to end the script, then the shell is told to run it from a file too.
+        """
+        if tty:
+            return self._exec_socket(self._render_command(cmd, preamble=preamble), tty=True)
+        exec_id, results = self._exec_socket([nn(self.default_shell), "-s"], tty=False)
+        raw = results.output._sock  # pylint: disable=protected-access
+        if can_half_close(raw):
+            raw.sendall(self._render_stdin_program(cmd, preamble))
+            raw.shutdown(socket.SHUT_WR)
+        else:
+            raw.sendall(self._render_stdin_program(cmd, preamble, scriptFile=self._copy_script(cmd)))
+        return exec_id, results
+
+    def _execute_cmd(
+        self,
+        cmd: str,
+        background: bool = False,
+        outFile: Optional[str] = None,
+        **kwargs,
+    ) -> ExecResult:
+        return self._exec_run(
+            self._render_command(cmd, background, outFile, inline=True), workdir=self._workdir, user="root", **kwargs
+        )
+
+    def _exec_socket(self, cmd: List[str], tty: bool) -> Tuple[str, ExecResult]:
+        """Starts cmd attached to a socket, returns the exec id to query its exit code"""
+        self.exec_count += 1
+        api = self.container.client.api
+        exec_id = api.exec_create(
+            self.container.id, cmd, stdin=True, tty=tty, workdir=self._workdir, user="root"
+        )["Id"]
+        sock = api.exec_start(exec_id, tty=tty, socket=True)
+        return exec_id, ExecResult(None, sock)
+
+    def _exit_code(self, exec_id: str, timeout: float = 1.0) -> Optional[int]:
+        api = self.container.client.api
+        deadline = time.monotonic() + timeout
+        info = api.exec_inspect(exec_id)
+        # the socket may close a moment before the daemon records the exit
+        while info.get("Running") and time.monotonic() < deadline:
+            time.sleep(0.01)
+            info = api.exec_inspect(exec_id)
+        return info.get("ExitCode")
+
+    def _exec_run(self, cmd, **kwargs) -> ExecResult:
+        self.exec_count += 1
+        return self.container.exec_run(cmd, **kwargs)
+
+    def _abspath(self, path: str) -> str:
+        return posixpath.normpath(posixpath.join(self._workdir, path))
+
+    def defer_workdir_preparation(self, preparation: Optional[WorkdirPreparation]) -> bool:
+        self._deferred_preparation = preparation
+        return True
+
+    def invalidate_cache(self) -> None:
+        self._stat_cache.clear()
+
+    def prefetch(self, paths: Iterable[str]) -> None:
+        missing = [path for path in paths if self._abspath(path) not in self._stat_cache]
+        if missing:
+            self.probe(missing)
+
+    def probe(self, paths: Iterable[str]) -> None:
+        """Fills the stat cache for paths with one exec"""
+        paths = list(paths)
+        # the paths are passed as arguments, so they need no quoting
+        results = self._exec_run(["sh", "-c", PROBE_SCRIPT, "sh", *paths], workdir=self._workdir, user="root")
         output: str = results.output.decode()
         if results.exit_code != 0:
             raise Exception(output)
-        return not "Doesn't exist" in output
+        lines = output.splitlines()
+        if len(lines) != len(paths):
+            raise Exception(f"Unexpected output of the metadata probe: {output}")
+        for path, kind in zip(paths, lines):
+            self._stat_cache[self._abspath(path)] = kind
+
+    def _stat(self, path: str) -> str:
+        key = self._abspath(path)
+        if key not in self._stat_cache:
+            parent = key
+            while parent != "/":
+                parent = posixpath.dirname(parent)
+                if self._stat_cache.get(parent) in (STAT_MISSING, STAT_FILE):
+                    # nothing can exist below a missing path or a file
+                    return STAT_MISSING
+            self.probe([path])
+        return self._stat_cache[key]
+
+    def _mark_exists(self, path: str, kind: str) -> None:
+        key = self._abspath(path)
+        self._stat_cache[key] = kind
+        while key != "/":
+            key = posixpath.dirname(key)
+            self._stat_cache[key] = STAT_DIR
+
+    def _mark_removed(self, path: str) -> None:
+        key = self._abspath(path)
+        prefix = key.rstrip("/") + "/"
+        for k in [k for k in self._stat_cache if k.startswith(prefix)]:
+            del self._stat_cache[k]
+        self._stat_cache[key] = STAT_MISSING
+
+    def exists(self, path: str) -> bool:
+        return self._stat(path) != STAT_MISSING
 
     def makedirs(self, path: str) -> None:
-        template = f"""
-mkdir -p '{path}'
-"""
-        results = self._execute_cmd(template)
+        results = self._exec_run(["mkdir", "-p", "--", path], workdir=self._workdir, user="root")
         output: str = results.output.decode()
         if results.exit_code != 0:
             raise Exception(output)
+        self._mark_exists(path, STAT_DIR)
 
     def _is_mode_require_file_exists(self, mode: str) -> bool:
         return "r" in mode or "a" in mode
 
-    def _get_temp_file_path(self) -> str:
-        return f"/tmp/{time.time()}"
+    def _open_exec_file(self, path: str, mode: str) -> Union[ExecFileReader, ExecFileWriter]:
+        if "r" in mode:
+            cmd = ["cat", "--", path]
+        else:
+            # noclobber makes the redirection fail for an existing file in x mode
+            script = "set -C; " if "x" in mode else ""
+            script += EXEC_WRITE_SCRIPT.format(redirect=">>" if "a" in mode else ">")
+            cmd = ["sh", "-c", script, "sh", path]
+        exec_id, results = self._exec_socket(cmd, tty=False)
+        sock = results.output._sock  # pylint: disable=protected-access
+        exit_code = functools.partial(self._exit_code, exec_id)
+        if "r" in mode:
+            return ExecFileReader(sock, exit_code, path)
+        return ExecFileWriter(sock, exit_code, path)
 
     def open(
         self, filename: str, mode: str = "w+", encoding: str = "utf8", **kwargs
     ) -> IO:
-        f: IO
+        path = posixpath.join(self._workdir, filename)
+        if "b" in mode:
+            encoding = None  # type: ignore
+        if "+" not in mode:
+            # sequential access streams through a `cat` in the container, so
+            # nothing is staged on the host
+            raw = self._open_exec_file(path, mode)
+            if "r" in mode:
+                f: IO = io.BufferedReader(raw, DEFAULT_CHUNK_SIZE)
+            else:
+                f = io.BufferedWriter(raw, DEFAULT_CHUNK_SIZE)
+                self._mark_exists(filename, STAT_FILE)
+            if "b" in mode:
+                return f
+            return io.TextIOWrapper(f, encoding=encoding, **kwargs)  # type: ignore
+        f = tempfile.NamedTemporaryFile(mode=mode, encoding=encoding, **kwargs)
         if self._is_mode_require_file_exists(mode):
-            temp_file_path = self._get_temp_file_path()
-            self.copy_from_container(filename, temp_file_path)
-            f = open(temp_file_path, mode=mode, encoding=encoding, **kwargs)
-        else:
-            f = tempfile.NamedTemporaryFile(mode=mode, encoding=encoding, **kwargs)
+            with open(f.name, "wb") as raw:
+                stream_file_from_container(self.container, path, raw)
+            if "a" in mode:
+                # the temp file isn't opened with O_APPEND
+                f.seek(0, os.SEEK_END)
         return self.FileInContainerWrapper(self, f, filename)  # type: ignore
 
     def getcwd(self) -> str:
-        results = self._execute_cmd("pwd")
-        output = results.output.decode().strip()
-        if results.exit_code != 0:
-            raise Exception(output)
-        return output
+        # every exec runs in the tracked working directory, so it needs no round trip
+        return posixpath.normpath(self._workdir)
 
     def chdir(self, path: str) -> None:
         if not self.exists(path):
@@ -159,29 +453,17 @@ mkdir -p '{path}'
             self._workdir = os.path.join(self._workdir, path)
 
     def is_dir(self, path: str) -> bool:
-        if not self.exists(path):
+        stat = self._stat(path)
+        if stat == STAT_MISSING:
             raise Exception(f"Path '{path}' doesn't exist")
-        template = f"""
-        if [[ -d '{path}' ]]; then
-            echo "d"
-        else
-            echo "f"
-        fi
-        """
-        result = self._execute_cmd(textwrap.dedent(template))
-        output = result.output.decode()
-        if result.exit_code != 0:
-            raise Exception(output)
-        return output.strip() == "d"
+        return stat == STAT_DIR
 
     def remove(self, path: str) -> None:
-        template = f"""
-rm -rf '{path}'
-"""
-        results = self._execute_cmd(template)
+        results = self._exec_run(["rm", "-rf", "--", path], workdir=self._workdir, user="root")
         output: str = results.output.decode()
         if results.exit_code != 0:
             raise Exception(output)
+        self._mark_removed(path)
 
     def system(
         self,
@@ -192,7 +474,19 @@ rm -rf '{path}'
         outVar: Optional[str] = None,
         proc: Optional[str] = None,
         delay: int = -1,
+        session: Optional[str] = None,
+        outputterOptions: Optional[OutputterOptions] = None,
     ) -> None:
+        if session is not None:
+            if background or interactive or outFile is not None:
+                raise Exception("session cannot be used with background, interactive or outFile in a container")
+            outputter = self.outputterFactory.create_outputter(False, None, outVar, outputterOptions)
+            try:
+                self._system_session(cmd, session, outputter)
+            finally:
+                outputter.close()
+                self.invalidate_cache()
+            return
         if interactive and (outFile is not None or outVar is not None):
             raise Exception(
                 "interactive and outFile/outVar cannot be set at the same time"
@@ -201,28 +495,139 @@ rm -rf '{path}'
             raise Exception("outFile and outVar cannot be set at the same time")
 
         if background and outFile is None and outVar is None:
-            outFile = "/tmp/out.log"
+            outFile = posixpath.join(CONTAINER_LOG_DIR, f"job-{uuid.uuid4().hex[:8]}.log")
             print(f"WARNING: outFile is not set, the default output file is {outFile}")
-        if outFile is not None:
-            results = self._execute_cmd(cmd, background=background, outFile=outFile, detach=True)
-            if results.exit_code and results.exit_code != 0:
-                raise Exception(results.output.decode())
-        else:
-            # Allocate a PTY only when the user asked for interactive mode (`-i`).
-            # In batch mode, stdin-aware tools (psql, less, vim, shells) would
-            # otherwise see a TTY, enter their interactive REPL, and never exit —
-            # the socket loop in _handle_socket relies on EOF, which never arrives.
-            results = self._execute_cmd(cmd, stdin=True, tty=interactive, socket=True)
-            if results.exit_code is not None and results.exit_code != 0:
-                raise Exception(results)
-            outputter = self.outputterFactory.create_outputter(interactive, outFile, outVar)
-            self._handle_socket(results, outputter, tty=interactive)
-
-    def _handle_socket(self, results: ExecResult, outputter: AbstractOutputter, tty: bool = True) -> None:
+        preparation, self._deferred_preparation = self._deferred_preparation, None
+        workdir = self._workdir
+        try:
+            if background and outFile is not None:
+                # a detached exec reports no exit code, so the preparation can't be fused
+                if preparation is not None:
+                    preparation.apply(self, self.logger)
+                job = self._start_background_job(cmd, outFile)
+                print(f"Run job {job.id} in the container with pid: {job.pid}. Output to '{outFile}'")
+            elif outFile is not None:
+                # a detached exec reports no exit code, so the preparation can't be fused
+                if preparation is not None:
+                    preparation.apply(self, self.logger)
+                results = self._execute_cmd(cmd, background=background, outFile=outFile, detach=True)
+                if results.exit_code and results.exit_code != 0:
+                    raise Exception(results.output.decode())
+            else:
+                # Allocate a PTY only when the user asked for interactive mode (`-i`).
+                # In batch mode, stdin-aware tools (psql, less, vim, shells) would
+                # otherwise see a TTY, enter their interactive REPL, and never exit —
+                # the socket loop in _handle_socket relies on EOF, which never arrives.
+                preamble = preparation.render() if preparation is not None else None
+                exec_id, results = self._start_command(cmd, tty=interactive, preamble=preamble)
+                outputter = self.outputterFactory.create_outputter(interactive, outFile, outVar, outputterOptions)
+                try:
+                    failed = self._handle_socket(results, outputter, tty=interactive, preparation=preparation)
+                finally:
+                    outputter.close()
+                if self._shell_from_cache:
+                    self._check_cached_shell(exec_id)
+                if failed:
+                    raise Exception(nn(preparation).error_message)
+        finally:
+            self._workdir = workdir
+            # the command may have changed anything in the container
+            self.invalidate_cache()
+
+    def _start_background_job(self, cmd: str, outFile: str) -> ContainerJob:
+        """Starts cmd in a detached exec and registers it as a job
+
+        The exec runs until the command exits, so exec_inspect reports the
+        state and exit code of the job. Its pid is passed through a file in
+        CONTAINER_LOG_DIR. When the file doesn't appear in time the job is
+        kept from starting, see PID_FILE_WAIT_SCRIPT.
+        """
+        pidFile = posixpath.join(CONTAINER_LOG_DIR, f"job-{uuid.uuid4().hex}.pid")
+        self.exec_count += 1
+        api = self.container.client.api
+        exec_id = api.exec_create(
+            self.container.id,
+            self._render_command(cmd, outFile=outFile, inline=True, pidFile=pidFile),
+            workdir=self._workdir,
+            user="root",
+        )["Id"]
+        api.exec_start(exec_id, detach=True)
+        results = self._exec_run(["sh", "-c", PID_FILE_WAIT_SCRIPT, "sh", pidFile], user="root")
+        output: str = results.output.decode().strip()
+        if results.exit_code != 0 or not output.isdigit():
+            raise Exception(f"The background job didn't start: {output}")
+        return self.job_registry.register_container_job(self.container, exec_id, int(output), cmd.strip(), outFile)
+
+    def _system_session(self, cmd: str, name: str, outputter: AbstractOutputter) -> None:
+        close_idle_docker_sessions()
+        key = f"{self.container.id}:{name}"
+        dockerSession = docker_session_manager.getSession(key)
+        if dockerSession is not None and not (dockerSession.is_for(self.container) and dockerSession.alive):
+            # the container was restarted or the shell was killed
+            docker_session_manager.removeSession(key)
+            dockerSession.close()
+            dockerSession = None
+            print(f"Session '{name}' was lost and is started again", file=sys.stderr)
+        if dockerSession is None:
+            dockerSession = DockerSession(self.container, nn(self.default_shell))
+            docker_session_manager.sessions[key] = dockerSession
+        try:
+            returncode = dockerSession.invoke_command(cmd, outputter)
+        except DockerSessionClosed:
+            # the cell ended the shell, e.g. with `exit`, or was killed because it
+            # didn't stop on interrupts. The next cell starts a new one
+            docker_session_manager.removeSession(key)
+            raise
+        self.logger.info(f"Cell in session {name} exited with code {returncode}")
+        outputter.flush()
+        if returncode != 0:
+            print(f"Session '{name}': exit code {returncode}", file=sys.stderr)
+
+    def execute(
+        self, cmd: str, outputter: AbstractOutputter, preparation: Optional[WorkdirPreparation] = None
+    ) -> Optional[int]:
+        """Runs cmd without tty, writes its output into outputter and returns its exit code
+
+        Raises when the preparation fails. It may be called from several
+        threads, e.g. for a container selected twice.
+        """
+        with self._execute_lock:
+            preamble = preparation.render() if preparation is not None else None
+            exec_id, results = self._start_command(cmd, preamble=preamble)
+            try:
+                failed = self._handle_socket(results, outputter, tty=False, preparation=preparation)
+            finally:
+                outputter.close()
+            if failed:
+                raise Exception(nn(preparation).error_message)
+            return self._check_cached_shell(exec_id)
+
+    def _handle_socket(
+        self,
+        results: ExecResult,
+        outputter: AbstractOutputter,
+        tty: bool = True,
+        preparation: Optional[WorkdirPreparation] = None,
+    ) -> bool:
+        """Forwards the output of an exec into outputter until it exits
+
+        Returns whether the rendered preparation failed, its marker line isn't
+        forwarded.
+        """
         sock = results.output._sock  # pylint: disable=protected-access
 
         sock.setblocking(False)
         sel = selectors.DefaultSelector()
+        stdout, stderr = outputter.write, outputter.write_err
+        errorFilter = None
+        if preparation is not None:
+            # with a tty stderr is merged into stdout
+            if tty:
+                stdout = errorFilter = preparation.error_filter(stdout)
+            else:
+                stderr = errorFilter = preparation.error_filter(stderr)
+        # without a tty the docker daemon multiplexes stdout and stderr
+        demuxer = StreamDemuxer(stdout, stderr, multiplexed=not tty)
 
         def read(key, mask):
             conn = key.fileobj
@@ -234,40 +639,16 @@ rm -rf '{path}'
                 conn.close()
 
             if mask & selectors.EVENT_READ:
-                if tty:
-                    data = conn.recv(1024)
-                    if not data:
-                        close_sock()
-                        return
-                    outputter.write(data.decode("utf8", errors="replace"))
-                else:
-                    # tty=False -> docker daemon multiplexes stdout/stderr. Each
-                    # frame is 8-byte header (stream:1, reserved:3, len:4 BE) +
-                    # payload. We drain one frame per EVENT_READ wake-up. See
-                    # https://docs.docker.com/engine/api/v1.24/#attach-to-a-container
-                    import struct as _struct
-                    header = b""
-                    while len(header) < 8:
-                        chunk = conn.recv(8 - len(header))
-                        if not chunk:
-                            close_sock()
-                            return
-                        header += chunk
-                    _stream, payload_len = _struct.unpack(">BxxxL", header)
-                    payload = b""
-                    while len(payload) < payload_len:
-                        chunk = conn.recv(payload_len - len(payload))
-                        if not chunk:
-                            close_sock()
-                            return
-                        payload += chunk
-                    outputter.write(payload.decode("utf8", errors="replace"))
+                if not demuxer.recv(conn):
+                    close_sock()
+                    return
             if mask & selectors.EVENT_WRITE and dataToSend:
                 data = dataToSend.pop(0)
                 conn.send(data)  # Should be ready
 
         data = types.SimpleNamespace(callback=read, dataToSend=[])
-        sel.register(sock, selectors.EVENT_READ | selectors.EVENT_WRITE, data)
+        sel.register(sock, selectors.EVENT_READ, data)
+        writing = False
 
         def get_registered_socket_count():
             return len(sel.get_map())
@@ -279,6 +660,10 @@ rm -rf '{path}'
         while shouldContinue:
             try:
                 outputter.handle_read()
+                # the socket is almost always writable, only wait for it with input to send
+                if bool(data.dataToSend) != writing:
+                    writing = not writing
+                    sel.modify(sock, selectors.EVENT_READ | (selectors.EVENT_WRITE if writing else 0), data)
                 events = sel.select(timeout=0.01)
                 for key, mask in events:
                     callback = key.data.callback
@@ -286,6 +671,10 @@ rm -rf '{path}'
                 shouldContinue = get_registered_socket_count() != 0
             except KeyboardInterrupt:
                 data.dataToSend.append(b"\x03")
+        if errorFilter is None:
+            return False
+        errorFilter.flush()
+        return errorFilter.failed
 
     class FileInContainerWrapper:
         def __init__(self, docker: "DockerFileSystem", file: IO, path: str):
@@ -327,9 +716,15 @@ rm -rf '{path}'
         def close(self):
             """
             Copy the temporary file, and close it
+
+            The content goes through a `cat >` in the container, so an existing
+            file keeps its owner and mode and a new one gets them from the umask.
             """
-            self.file.seek(0)
-            self.docker.copy_to_container(self.file.name, self.path)
+            self.file.flush()
+            path = posixpath.join(self.docker._workdir, self.path)
+            with open(self.file.name, "rb") as src, self.docker._open_exec_file(path, "w") as dst:
+                shutil.copyfileobj(src, dst, DEFAULT_CHUNK_SIZE)
+            self.docker._mark_exists(self.path, STAT_FILE)
             self.file.close()
 
         # iter() doesn't use __getattr__ to find the __iter__ method
@@ -1,5 +1,6 @@
 from typing import IO, Optional
 from jupyterMagicCommands.filesystem.Ifilesystem import IFileSystem
+from jupyterMagicCommands.outputters.outputter_options import OutputterOptions
 
 class DummyFileSystem(IFileSystem):
     def exists(self, path: str) -> bool:
@@ -32,5 +33,7 @@ class DummyFileSystem(IFileSystem):
         outVar: Optional[str] = None,
         proc: Optional[str] = None,
         delay: int = -1,
+        session: Optional[str] = None,
+        outputterOptions: Optional[OutputterOptions] = None,
     ) -> None:
         pass
\ No newline at end of file
@@ -0,0 +1,96 @@
+import queue
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from jupyterMagicCommands.filesystem.workdir_preparation import WorkdirPreparation
+from jupyterMagicCommands.outputters import AbstractOutputter, PrefixOutputter
+
+# how the output of the targets is shown while they run
+FANOUT_PREFIX = "prefix"
+FANOUT_GROUPED = "grouped"
+FANOUT_QUIET = "quiet"
+
+FANOUT_COLUMNS = ["target", "exit_code", "duration", "output", "error"]
+
+# runs a command on a target after the preparation, writes the output into
+# the outputter and returns the exit code, raises when the preparation fails
+TargetExecutor = Callable[[str, AbstractOutputter, Optional[WorkdirPreparation]], Optional[int]]
+
+
+@dataclass
+class FanoutResult:
+    target: str
+    exit_code: Optional[int]
+    duration: float
+    output: str
+    error: Optional[str] = None
+
+
+def run_fanout(
+    targets: List[str],
+    execute: TargetExecutor,
+    workers: int = 8,
+    preparation: Optional[WorkdirPreparation] = None,
+    mode: str = FANOUT_PREFIX,
+    write: Callable[[str], None] = sys.stdout.write,
+    maxOutputSize: Optional[int] = None,
+    clock: Callable[[], float] = time.monotonic,
+) -> List[FanoutResult]:
+    """Runs a command on every target with at most workers at a time
+
+    With FANOUT_PREFIX every line is written as soon as it's complete, behind
+    the name of its target. With FANOUT_GROUPED the output of a target is
+    written in one block once it finished. Only the calling thread writes, so
+    the output ends up in the cell which runs the command. A target which
+    fails to run gets a result with its error and no exit code.
+    """
+    messages: "queue.Queue[str]" = queue.Queue()
+
+    def run(target: str) -> FanoutResult:
+        start = clock()
+        sink = messages.put if mode == FANOUT_PREFIX else None
+        outputter = PrefixOutputter(f"[{target}] ", sink, maxOutputSize)
+        exit_code: Optional[int] = None
+        error: Optional[str] = None
+        try:
+            exit_code = execute(target, outputter, preparation)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        result = FanoutResult(target, exit_code, round(clock() - start, 3), outputter.value, error)  # type: ignore
+        if mode == FANOUT_PREFIX and error is not None:
+            messages.put(f"[{target}] {error}\n")
+        elif mode == FANOUT_GROUPED:
+            status = error if error is not None else f"exit code {exit_code}"
+            block = result.output
+            if block and not block.endswith("\n"):
+                block += "\n"
+            messages.put(f"==> {target} ({status}, {result.duration}s) <==\n{block}")
+        return result
+
+    def drain() -> None:
+        while True:
+            try:
+                write(messages.get_nowait())
+            except queue.Empty:
+                return
+
+    results: Dict[str, FanoutResult] = {}
+    executor = ThreadPoolExecutor(max_workers=max(1, min(workers, len(targets))))
+    futures = {executor.submit(run, target): target for target in targets}
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=0.05)
+            drain()
+            for future in done:
+                results[futures[future]] = future.result()
+    finally:
+        # an interrupt stops waiting, the commands which already started keep running
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=not pending)
+        drain()
+    return [results[target] for target in targets]
@@ -1,21 +1,31 @@
 import logging
 import os
 import shutil
-import tempfile
-from typing import IO, Optional
+import signal
+import subprocess
+import sys
+from typing import IO, List, Optional
 
 import pexpect
-import psutil
 from IPython import get_ipython
 
 from jupyterMagicCommands.filesystem.Ifilesystem import IFileSystem
+from jupyterMagicCommands.jobs import JOB_REGISTRY
 from jupyterMagicCommands.outputters import (AbstractOutputter,
-                                             AbstractOutputterFactory)
+                                             AbstractOutputterFactory,
+                                             OutputterOptions)
+from jupyterMagicCommands.session import (BashSession, BashSessionClosed,
+                                          SessionManager)
 from jupyterMagicCommands.utils.action_detector import ActionDetector
 from jupyterMagicCommands.utils.log import NULL_LOGGER
+from jupyterMagicCommands.utils.script_store import SCRIPT_STORE
+from jupyterMagicCommands.utils.stream import StreamReader
+from jupyterMagicCommands.utils.types import nn
 
 logger = logging.getLogger(__name__)
 
+session_manager = SessionManager()
+
 class FileSystem(IFileSystem):
     def __init__(
         self,
@@ -55,21 +65,6 @@ class FileSystem(IFileSystem):
         else:
             raise Exception(f"Path '{path}' does not exist")
 
-    def _find_pid(self, cmd: str) -> Optional[int]:
-        # we use the true pid
-        processes = psutil.process_iter(attrs=["pid", "name", "cmdline"])
-        for p in processes:
-            try:
-                command = " ".join(p.cmdline())
-            except (psutil.NoSuchProcess, psutil.ZombieProcess, psutil.AccessDenied):
-                continue
-            self.logger.debug(f'The process {p} has the command {command}')
-            # the correctness is built on the assumption that the template file saving the cell content is only run by this class
-            if command and cmd == command:
-                self.logger.info(f"Find a process: {p.info}")
-                return p.pid
-        return None
-
     def _system_background(
             self,
             actual_cmd: str,
@@ -77,25 +72,33 @@ class FileSystem(IFileSystem):
             outVar: Optional[str] = None,
             proc: Optional[str] = None,
             delay: int = -1,
+            command: Optional[str] = None,
+            outputterOptions: Optional[OutputterOptions] = None,
         ) -> None:
         # for background script, we use the built-in `%%script` magic to help
-        if outFile is None and outVar is None:
-            outFile = "/tmp/out.log"
-            print(f"WARNING: outFile is not set, the default output file is {outFile}")
+        if outFile is None:
+            # every job gets its own log file so concurrent jobs don't overwrite each other
+            outFile = JOB_REGISTRY.new_log_file()
+            if outVar is None:
+                print(f"WARNING: outFile is not set, the default output file is {outFile}")
 
         # the process output is exported to the variable with name random_variable_name
         random_variable_name = "outVar" + str(hash(outFile))
         proc = proc or random_variable_name
-        self.shell.run_cell_magic("_script", f"bash --bg --outfile {outFile} --proc {proc} --wait-after {delay}", actual_cmd)
-        pid = self._find_pid(actual_cmd)
-        # if the true pic can't be obtained, use the parent pid
-        if pid is not None:
-            print(f"Run a subprocess with pid: {pid}. Output to '{outFile}'")
-        else:
-            self.logger.info(f'Not process with command {actual_cmd} is found. Use the the pid of the parent process')
-            child = self.shell.user_ns[proc]
-            pid = child.pid
-            print(f"Run a subprocess. Its parent process's pid is {pid}. Output to '{outFile}'")
+        # `exec` replaces the bash started by `%%_script` with the script itself, so the
+        # pid of the process it starts (also its process group id) is the real pid
+        fileArgs = " ".join((outputterOptions or OutputterOptions()).file_outputter_args())
+        self.shell.run_cell_magic(
+            "_script",
+            f"bash --bg --outfile {outFile} {fileArgs} --proc {proc} --wait-after {delay}",
+            f"exec {actual_cmd}",
+        )
+        pid = self.shell.user_ns[proc].pid
+        print(f"Run subprocess with pid: {pid}. Output to '{outFile}'")
+        job = JOB_REGISTRY.get_by_pid(pid)
+        if job is not None:
+            job.command = command or actual_cmd
+            print(f"Job id: {job.id}. Use %jobs and %job tail|kill|wait {job.id} to follow it")
         self.shell.user_ns[proc] = pid
 
     def system(
@@ -107,6 +110,8 @@ class FileSystem(IFileSystem):
         outVar: Optional[str] = None,
         proc: Optional[str] = None,
         delay: int = -1,
+        session: Optional[str] = None,
+        outputterOptions: Optional[OutputterOptions] = None,
     ) -> None:
         if outFile is not None and outVar is not None:
             raise Exception("outFile and outVar cannot be set at the same time")
@@ -114,43 +119,99 @@ class FileSystem(IFileSystem):
             raise Exception(
                 "interactive and outFile/outVar cannot be set at the same time"
             )
-        encoding = "utf8"
-        with tempfile.NamedTemporaryFile(
-            encoding=encoding, mode="w", delete=False
-        ) as fp:
-            fp.write(cmd)
-            # we know there is no spaces in fp.name so we don't quote it with ' or "
-            actual_cmd = f"bash {fp.name}"
-            self.logger.debug(f'Saved the content into {fp.name}, the actual command to run is {actual_cmd}')
+        if session is not None and (background or interactive):
+            raise Exception("session cannot be used with background or interactive")
+        script_path = SCRIPT_STORE.path_for(cmd)
+        # script_path has no spaces so we don't quote it with ' or "
+        actual_cmd = f"bash {script_path}"
+        self.logger.debug(f'Saved the content into {script_path}, the actual command to run is {actual_cmd}')
 
         if background: 
-            self._system_background(actual_cmd, outFile, outVar, proc, delay)
+            self._system_background(actual_cmd, outFile, outVar, proc, delay, command=cmd, outputterOptions=outputterOptions)
             return
 
-        child = pexpect.spawn(actual_cmd)
-        outputter = self.outputterFactory.create_outputter(interactive, outFile, outVar)
-
-        outputter.register_read_callback(child.send)
-        self._run_command(child, outputter)
-        outputter.close()
+        outputter = self.outputterFactory.create_outputter(interactive, outFile, outVar, outputterOptions)
+        try:
+            if session is not None:
+                self._system_session(script_path, session, outputter)
+            elif interactive:
+                # only interactive programs need a terminal, the PTY merges stdout
+                # and stderr and translates line endings
+                # pexpect sleeps 50ms before every send by default, which delays each keystroke
+                child = pexpect.spawn(actual_cmd)
+                child.delaybeforesend = None
+                outputter.register_read_callback(child.send)
+                self._run_command(child, outputter)
+            else:
+                self._run_piped_command(["bash", script_path], outputter)
+        finally:
+            # closing also writes out what an outputter still buffers
+            outputter.close()
+
+    def _system_session(self, script_path: str, name: str, outputter: AbstractOutputter) -> None:
+        bashSession = session_manager.getOrCreateSession(name, BashSession)
+        self._actionDetector.reset()
+        try:
+            returncode = bashSession.invoke_command(script_path, outputter, self._actionDetector)
+        except BashSessionClosed:
+            # the cell ended the shell, e.g. with `exit`. The next cell starts a new one
+            session_manager.removeSession(name)
+            raise
+        self.logger.info(f"Cell in session {name} exited with code {returncode}")
+        outputter.flush()
+        if returncode != 0:
+            print(f"Session '{name}': exit code {returncode}", file=sys.stderr)
 
     def _run_command(self, child, outputter: AbstractOutputter):
-        prevMessage = ""
-        i = 0
-        while True:
-            try:
-                returncode = child.expect_list(
-                    [pexpect.TIMEOUT, pexpect.EOF],
-                    timeout=0.01,
-                )  # fresh terminal per 0.2s
-                message = child.before.decode()
-                i = self._actionDetector.detect_action_by_chunk(message, i)
-                outputter.write(message[len(prevMessage) :])
-                outputter.handle_read()
-                prevMessage = message
-                if returncode != 0:
-                    break
-            except KeyboardInterrupt:
-                child.sendintr()
-            except Exception:
-                break
+        def on_output(message: str) -> None:
+            self._actionDetector.feed(message)
+            outputter.write(message)
+
+        self._actionDetector.reset()
+        reader = StreamReader()
+        reader.register(child.child_fd, on_output)
+        try:
+            while not reader.finished:
+                try:
+                    reader.poll(timeout=0.01)
+                    outputter.handle_read()
+                except KeyboardInterrupt:
+                    child.sendintr()
+        finally:
+            reader.close()
+
+    def _run_piped_command(self, args: List[str], outputter: AbstractOutputter):
+        # logging commands may be printed to either stream, each has its own partial line
+        self._actionDetector.reset()
+        errActionDetector = self._actionDetector.fork()
+
+        def on_output(message: str) -> None:
+            self._actionDetector.feed(message)
+            outputter.write(message)
+
+        def on_error(message: str) -> None:
+            errActionDetector.feed(message)
+            outputter.write_err(message)
+
+        process = subprocess.Popen(
+            args,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+        )
+        reader = StreamReader()
+        reader.register(nn(process.stdout).fileno(), on_output)
+        reader.register(nn(process.stderr).fileno(), on_error)
+        try:
+            while not reader.finished:
+                try:
+                    reader.poll(timeout=0.01)
+                    outputter.handle_read()
+                except KeyboardInterrupt:
+                    os.killpg(process.pid, signal.SIGINT)
+        finally:
+            reader.close()
+            nn(process.stdout).close()
+            nn(process.stderr).close()
+            process.wait()
@@ -2,14 +2,14 @@ import logging
 import os
 from typing import Optional
 
-import docker
 from IPython import get_ipython
 from IPython.core.interactiveshell import InteractiveShell
 
 from jupyterMagicCommands.extensions.constants import (
     EMPTY_CONTAINER_NAME, JUPYTER_MAGIC_COMMAND_BASH_CURRENT_CONTAINER)
-from jupyterMagicCommands.filesystem.docker import DockerFileSystem
 from jupyterMagicCommands.filesystem.filesystem import FileSystem
+from jupyterMagicCommands.filesystem.filesystem_pool import (FILESYSTEM_POOL,
+                                                             FileSystemPool)
 from jupyterMagicCommands.filesystem.Ifilesystem import IFileSystem
 from jupyterMagicCommands.outputters import (AbstractOutputterFactory,
                                              BasicFileSystemOutputterFactory,
@@ -26,6 +26,7 @@ class FileSystemFactory:
         containerName: Optional[str] = None,
         shell: Optional[InteractiveShell] = None,
         logger: logging.Logger = NULL_LOGGER,
+        pool: FileSystemPool = FILESYSTEM_POOL,
     ) -> Optional[IFileSystem]:
         if containerName == EMPTY_CONTAINER_NAME:
             logger.error(
@@ -39,12 +40,18 @@ class FileSystemFactory:
         fs: IFileSystem
         outputterFactory: AbstractOutputterFactory
         if containerName is not None:
-            client = docker.from_env()
             outputterFactory = DockerFileSystemOutputterFactory(shell)
-            container = client.containers.get(containerName)
-            fs = DockerFileSystem(container, outputterFactory, logger=logger)
+            fs = pool.get(containerName, outputterFactory, logger)
             os.environ[JUPYTER_MAGIC_COMMAND_BASH_CURRENT_CONTAINER] = containerName
         else:
             outputterFactory = BasicFileSystemOutputterFactory(shell)
             fs = FileSystem(outputterFactory, logger)
         return fs
+
+    @classmethod
+    def invalidate(
+        cls, containerName: Optional[str], pool: FileSystemPool = FILESYSTEM_POOL
+    ) -> None:
+        """Drops the pooled file system of a container which failed a request"""
+        if containerName is not None and containerName != EMPTY_CONTAINER_NAME:
+            pool.invalidate(containerName)
@@ -0,0 +1,167 @@
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import docker
+from docker.errors import NotFound
+from docker.models.containers import Container
+
+from jupyterMagicCommands.filesystem.docker import DockerFileSystem
+from jupyterMagicCommands.outputters import AbstractOutputterFactory
+from jupyterMagicCommands.utils.log import NULL_LOGGER
+
+# seconds a pooled container is trusted before its state is inspected again
+HEALTH_CHECK_INTERVAL = 30.0
+
+LABEL_SELECTOR = "label:"
+REGEX_SELECTOR = "re:"
+
+
+def is_multi_selector(selector: Optional[str]) -> bool:
+    """Whether a container selector may refer to more than one container"""
+    return selector is not None and (
+        "," in selector or selector.startswith((LABEL_SELECTOR, REGEX_SELECTOR))
+    )
+
+
+@dataclass
+class PoolEntry:
+    fs: DockerFileSystem
+    started_at: str
+    checked_at: float
+
+
+def _started_at(container: Container) -> str:
+    return container.attrs.get("State", {}).get("StartedAt", "")
+
+
+def _is_running(container: Container) -> bool:
+    return container.attrs.get("State", {}).get("Running", container.status == "running")
+
+
+class FileSystemPool:
+    """Docker file systems shared by the cells of the kernel
+
+    The docker client is created once and a DockerFileSystem is kept per
+    container id, so a cell running against a container used before makes no
+    request to set it up. A pooled container is inspected again once
+    health_check_interval seconds have passed since its last check, and its
+    file system is dropped when the container stopped, restarted or was
+    removed, since the scripts copied into it and its cached metadata may be
+    gone. A name which now refers to another container is resolved again.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], docker.DockerClient] = docker.from_env,
+        health_check_interval: float = HEALTH_CHECK_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.client_factory = client_factory
+        self.health_check_interval = health_check_interval
+        self.clock = clock
+        self._client: Optional[docker.DockerClient] = None
+        self._ids: Dict[str, str] = {}
+        self._entries: Dict[str, PoolEntry] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def client(self) -> docker.DockerClient:
+        with self._lock:
+            if self._client is None:
+                self._client = self.client_factory()
+            return self._client
+
+    def get(
+        self,
+        containerName: str,
+        outputterFactory: AbstractOutputterFactory,
+        logger: logging.Logger = NULL_LOGGER,
+    ) -> DockerFileSystem:
+        entry = self._lookup(containerName)
+        if entry is None:
+            # the lock isn't held during the request, so the containers of a
+            # fanout are inspected concurrently
+            container = self.client.containers.get(containerName)
+            with self._lock:
+                entry = self._entries.get(container.id)
+                if entry is None or entry.started_at != _started_at(container):
+                    entry = PoolEntry(
+                        DockerFileSystem(container, outputterFactory),
+                        _started_at(container),
+                        self.clock(),
+                    )
+                    self._entries[container.id] = entry
+                self._ids[containerName] = container.id
+        with self._lock:
+            entry.fs.reuse(outputterFactory, logger)
+        return entry.fs
+
+    def select(self, selector: str) -> List[str]:
+        """Returns the containers of a selector
+
+        A selector is a comma separated list of names or ids,
+        `label:KEY[=VALUE]` for the running containers with the label, or
+        `re:PATTERN` for the running containers whose name matches PATTERN.
+        """
+        if selector.startswith(LABEL_SELECTOR):
+            containers = self.client.containers.list(filters={"label": selector[len(LABEL_SELECTOR):]})
+            return sorted(container.name for container in containers)
+        if selector.startswith(REGEX_SELECTOR):
+            pattern = re.compile(selector[len(REGEX_SELECTOR):])
+            containers = self.client.containers.list()
+            return sorted(container.name for container in containers if pattern.search(container.name))
+        names = [name.strip() for name in selector.split(",")]
+        return list(dict.fromkeys(name for name in names if name))
+
+    def _lookup(self, containerName: str) -> Optional[PoolEntry]:
+        """Returns the pooled entry of the name if the container is still the same
+
+        The lock is only held while the entries are used, not while the
+        container is inspected.
+        """
+        with self._lock:
+            containerId = self._ids.get(containerName)
+            entry = self._entries.get(containerId) if containerId is not None else None
+            if entry is None:
+                return None
+            if self.clock() - entry.checked_at < self.health_check_interval:
+                return entry
+        container = entry.fs.container
+        try:
+            container.reload()
+            stale = not _is_running(container) or _started_at(container) != entry.started_at
+        except NotFound:
+            stale = True
+        with self._lock:
+            if stale:
+                # another cell may have pooled the container again meanwhile
+                if self._entries.get(containerId) is entry:
+                    self._drop(containerId)
+                return None
+            entry.checked_at = self.clock()
+        return entry
+
+    def _drop(self, containerId: Optional[str]) -> None:
+        self._entries.pop(containerId, None)  # type: ignore
+        for name in [name for name, i in self._ids.items() if i == containerId]:
+            del self._ids[name]
+
+    def invalidate(self, containerName: Optional[str] = None) -> None:
+        """Drops the file system of the container, or every pooled one"""
+        with self._lock:
+            if containerName is None:
+                self._ids.clear()
+                self._entries.clear()
+                return
+            containerId = self._ids.get(containerName, containerName)
+            self._drop(containerId)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+FILESYSTEM_POOL = FileSystemPool()
@@ -0,0 +1,117 @@
+import shlex
+import uuid
+from dataclasses import dataclass, field
+from logging import Logger
+from typing import Callable
+
+from jupyterMagicCommands.utils.log import NULL_LOGGER
+
+# exit code of a rendered preparation when the working directory doesn't exist,
+# the failure itself is reported by the marker line of the preparation
+WORKDIR_ERROR_EXIT_CODE = 97
+
+
+class WorkdirErrorFilter:
+    """Forwards a stream and strips the marker line of a failed preparation
+
+    The preparation runs before the script, so the marker can only be the
+    first line of the stream. With a tty it ends with \r\n.
+    """
+
+    def __init__(self, marker: str, write: Callable[[str], None]):
+        self.marker = marker
+        self.write = write
+        self.failed = False
+        self._held = ""
+        self._done = False
+
+    def __call__(self, s: str) -> None:
+        if self._done:
+            self.write(s)
+            return
+        held = self._held + s
+        n = len(self.marker)
+        if not self.marker.startswith(held[:n]):
+            self._forward(held)
+            return
+        rest = held[n:]
+        if not rest or rest == "\r":
+            # not clear yet whether the marker is a line of its own
+            self._held = held
+            return
+        for end in ("\r\n", "\n"):
+            if rest.startswith(end):
+                self.failed = True
+                self._forward(rest[len(end):])
+                return
+        self._forward(held)
+
+    def _forward(self, s: str) -> None:
+        self._done = True
+        self._held = ""
+        if s:
+            self.write(s)
+
+    def flush(self) -> None:
+        """Forwards what's held back, e.g. when the stream ended"""
+        if self._held:
+            self._forward(self._held)
+
+
+@dataclass
+class WorkdirPreparation:
+    """The --cwd, --create and --init options of a magic"""
+    cwd: str = "."
+    create: bool = False
+    init: bool = False
+    # printed to stderr when the working directory doesn't exist, unique so
+    # that no script prints it by accident
+    marker: str = field(default_factory=lambda: f"__jmc_workdir_error_{uuid.uuid4().hex}__", compare=False, repr=False)
+
+    @property
+    def error_message(self) -> str:
+        return f"Accessing non existing working directory: {self.cwd}! You can specify --create flag to create an empty working directory"
+
+    def apply(self, fs, logger: Logger = NULL_LOGGER) -> None:
+        """Prepares the working directory with separate calls to fs and changes into it"""
+        folderExists = fs.exists(self.cwd)
+        if self.create:
+            if folderExists:
+                if self.init:
+                    logger.debug(
+                        "Folder %r exists and we need to remove it because --init is specified",
+                        self.cwd,
+                    )
+                    fs.remove(self.cwd)
+                    fs.makedirs(self.cwd)
+                else:
+                    logger.debug(
+                        "Folder %r exists and we don't need to remove it", self.cwd
+                    )
+            else:
+                fs.makedirs(self.cwd)
+        else:
+            if not folderExists:
+                raise Exception(self.error_message)
+        fs.chdir(self.cwd)
+
+    def render(self) -> str:
+        """Renders the preparation as shell commands to run before a script
+
+        When the working directory doesn't exist and can't be created they
+        print the marker line to stderr and exit with WORKDIR_ERROR_EXIT_CODE.
+        The exit code alone can't tell the failure from a script exiting with
+        the same code, use error_filter to detect it.
+        """
+        cwd = shlex.quote(self.cwd)
+        lines = []
+        if self.create:
+            if self.init:
+                lines.append(f"rm -rf -- {cwd}")
+            lines.append(f"mkdir -p -- {cwd} || exit $?")
+        lines.append(f"cd -- {cwd} 2>/dev/null || {{ echo {self.marker} >&2; exit {WORKDIR_ERROR_EXIT_CODE}; }}")
+        return "\n".join(lines)
+
+    def error_filter(self, write: Callable[[str], None]) -> WorkdirErrorFilter:
+        """Wraps the writer of the stream the marker is printed to, see WorkdirErrorFilter"""
+        return WorkdirErrorFilter(self.marker, write)
@@ -0,0 +1,9 @@
+from jupyterMagicCommands.jobs.registry import (
+    CONTAINER_LOG_DIR,
+    JOB_REGISTRY,
+    ContainerJob,
+    Job,
+    JobNotFound,
+    JobRegistry,
+    JobState,
+)
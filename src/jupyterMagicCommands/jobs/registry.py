@@ -0,0 +1,384 @@
+import codecs
+import gzip
+import os
+import selectors
+import signal
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import psutil
+from docker.errors import NotFound
+
+from jupyterMagicCommands.utils.general import private_dir, user_temp_dir
+from jupyterMagicCommands.utils.stream import DEFAULT_CHUNK_SIZE, StreamDemuxer
+
+
+MISSING_PROCESS_GRACE_PERIOD = 1.0
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+# the directory of the logs of background jobs inside containers
+CONTAINER_LOG_DIR = "/tmp/jupyterMagicCommands/jobs"
+
+# sends the signal $1 to the process $2 and its descendants in a container
+CONTAINER_KILL_SCRIPT = """\
+descendants() {
+    for c in $(cat /proc/$1/task/*/children 2>/dev/null || pgrep -P "$1"); do
+        echo "$c"
+        descendants "$c"
+    done
+}
+kill -s "$1" "$2" $(descendants "$2") 2>/dev/null
+exit 0
+"""
+
+# prints its pid, the size of the log $1 and the size of its last $2 lines,
+# then the last lines, then follows the log from that size on
+CONTAINER_FOLLOW_SCRIPT = """\
+s=$(wc -c < "$1" 2>/dev/null | tr -d ' ')
+s=${s:-0}
+echo "$$ $s $(head -c "$s" -- "$1" 2>/dev/null | tail -n "$2" | wc -c | tr -d ' ')"
+head -c "$s" -- "$1" 2>/dev/null | tail -n "$2"
+exec tail -c "+$((s + 1))" -f -- "$1"
+"""
+
+
+class JobNotFound(Exception):
+    pass
+
+
+class JobState(Enum):
+    RUNNING = "running"
+    EXITED = "exited"
+
+
+@dataclass
+class Job:
+    id: int
+    pid: int
+    command: str
+    log_file: Optional[str] = None
+    start_time: float = field(default_factory=time.time)
+    end_time: Optional[float] = None
+    exit_code: Optional[int] = None
+    # whether the log is gzip compressed, None when it's unknown
+    compressed: Optional[bool] = None
+    _processes: Dict[int, psutil.Process] = field(default_factory=dict, repr=False)
+    _missing_since: Optional[float] = field(default=None, repr=False)
+
+    @property
+    def state(self) -> JobState:
+        if self.end_time is not None:
+            return JobState.EXITED
+        return JobState.RUNNING
+
+    def mark_exited(self, exit_code: Optional[int]) -> None:
+        if self.end_time is None:
+            self.exit_code = exit_code
+            self.end_time = time.time()
+
+    def refresh(self) -> None:
+        # normally the exit is reported by whoever waits for the process, this
+        # only catches processes which disappeared without being reported. The
+        # grace period leaves time for the report, which comes after the reaping
+        if self.state != JobState.RUNNING or psutil.pid_exists(self.pid):
+            self._missing_since = None
+        elif self._missing_since is None:
+            self._missing_since = time.time()
+        elif time.time() - self._missing_since > MISSING_PROCESS_GRACE_PERIOD:
+            self.mark_exited(None)
+
+    def _process_tree(self) -> List[psutil.Process]:
+        # psutil.Process objects are kept between calls because cpu_percent
+        # measures the time since the previous call on the same object
+        try:
+            root = self._processes.get(self.pid) or psutil.Process(self.pid)
+            tree = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return []
+        self._processes = {p.pid: self._processes.get(p.pid, p) for p in tree}
+        return list(self._processes.values())
+
+    def usage(self) -> Tuple[float, int]:
+        """Returns the cpu percent and rss in bytes of the job's process tree"""
+        cpu, rss = 0.0, 0
+        if self.state != JobState.RUNNING:
+            return cpu, rss
+        for p in self._process_tree():
+            try:
+                cpu += p.cpu_percent(None)
+                rss += p.memory_info().rss
+            except psutil.Error:
+                continue
+        return cpu, rss
+
+    def kill(self, sig: int = signal.SIGTERM) -> None:
+        if self.state != JobState.RUNNING:
+            return
+        try:
+            # jobs are started with start_new_session, their pid is the process group id
+            os.killpg(self.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            try:
+                os.kill(self.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def wait(self, timeout: Optional[float] = None, interval: float = 0.1) -> bool:
+        """Waits until the job exits, returns False on timeout"""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            self.refresh()
+            if self.state == JobState.EXITED:
+                return True
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(interval)
+
+    def tail(self, n: int = 10, block_size: int = 64 * 1024, end: Optional[int] = None) -> str:
+        """Returns the last n lines of the log file, up to byte end, without reading all of it"""
+        if self.log_file is None or not os.path.exists(self.log_file):
+            return ""
+        if self.is_log_compressed():
+            return self._tail_compressed(n)
+        with open(self.log_file, "rb") as f:
+            if end is None:
+                f.seek(0, os.SEEK_END)
+                end = f.tell()
+            data = b""
+            while end > 0 and data.count(b"\n") <= n:
+                start = max(0, end - block_size)
+                f.seek(start)
+                data = f.read(end - start) + data
+                end = start
+        lines = data.decode("utf8", errors="replace").splitlines(keepends=True)
+        return "".join(lines[-n:])
+
+    def is_log_compressed(self) -> bool:
+        """Whether the log is gzip compressed, by the flag, the suffix or the magic bytes"""
+        if self.compressed is not None:
+            return self.compressed
+        if self.log_file is None:
+            return False
+        if self.log_file.endswith(".gz"):
+            return True
+        try:
+            with open(self.log_file, "rb") as f:
+                return f.read(2) == GZIP_MAGIC
+        except OSError:
+            return False
+
+    def _tail_compressed(self, n: int) -> str:
+        # a gzip stream can't be read backwards, so it's decompressed once
+        lines: Deque[str] = deque(maxlen=n)
+        try:
+            with gzip.open(self.log_file, "rt", encoding="utf8", errors="replace") as f:  # type: ignore
+                for line in f:
+                    lines.append(line)
+        except EOFError:
+            # the job is still writing the stream
+            pass
+        return "".join(lines)
+
+    def follow(self, write: Callable[[str], None], n: int = 10, interval: float = 0.5) -> None:
+        """Writes the last n lines of the log file, then what's appended to it until the job exits
+
+        Only the bytes after the previous read are read.
+        """
+        if self.log_file is None:
+            raise Exception(f"Job {self.id} has no log file")
+        if self.is_log_compressed():
+            raise Exception("A compressed log can't be followed")
+        offset = os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0
+        write(self.tail(n, end=offset))
+        decoder = codecs.getincrementaldecoder("utf8")(errors="replace")
+        while True:
+            self.refresh()
+            # the last read after the exit gets what the job wrote before it
+            exited = self.state == JobState.EXITED
+            if os.path.exists(self.log_file):
+                with open(self.log_file, "rb") as f:
+                    f.seek(offset)
+                    for data in iter(lambda: f.read(DEFAULT_CHUNK_SIZE), b""):
+                        offset += len(data)
+                        write(decoder.decode(data))
+            if exited:
+                write(decoder.decode(b"", final=True))
+                return
+            time.sleep(interval)
+
+
+@dataclass
+class ContainerJob(Job):
+    """A background job started by a detached exec in a container
+
+    The exec runs the job itself, so its exit code is the one of the job. pid
+    is the pid of the job inside the container, read from the pid file the job
+    writes when it starts. The state is queried from the docker daemon with
+    one exec_inspect per refresh, until the job exited.
+    """
+
+    container: Any = None
+    exec_id: str = ""
+
+    @property
+    def _api(self):
+        return self.container.client.api
+
+    def refresh(self) -> None:
+        if self.state != JobState.RUNNING:
+            return
+        try:
+            info = self._api.exec_inspect(self.exec_id)
+        except NotFound:
+            # the container is gone
+            self.mark_exited(None)
+            return
+        if not info.get("Running"):
+            self.mark_exited(info.get("ExitCode"))
+
+    def usage(self) -> Tuple[float, int]:
+        # docker doesn't report the usage of an exec
+        return 0.0, 0
+
+    def kill(self, sig: int = signal.SIGTERM) -> None:
+        if self.state != JobState.RUNNING:
+            return
+        name = signal.Signals(sig).name[len("SIG"):]
+        self.container.exec_run(["sh", "-c", CONTAINER_KILL_SCRIPT, "sh", name, str(self.pid)], user="root")
+
+    def tail(self, n: int = 10, block_size: int = 64 * 1024, end: Optional[int] = None) -> str:
+        if self.log_file is None:
+            return ""
+        result = self.container.exec_run(["tail", "-n", str(n), "--", self.log_file], user="root")
+        if result.exit_code != 0:
+            return ""
+        return result.output.decode("utf8", errors="replace")
+
+    def follow(self, write: Callable[[str], None], n: int = 10, interval: float = 0.5) -> None:
+        """Writes the last n lines of the log file, then what's appended to it until the job exits
+
+        One `tail -f` exec in the container streams the appended bytes. Once
+        the job exited it's stopped, and the bytes it didn't send yet are read
+        from where it stopped.
+        """
+        if self.log_file is None:
+            raise Exception(f"Job {self.id} has no log file")
+        decoder = codecs.getincrementaldecoder("utf8")(errors="replace")
+        header = bytearray()
+        # pid of the tail, size of the log when it started, size of the last n lines
+        state: Dict[str, int] = {}
+
+        def on_stdout(data: bytes) -> None:
+            if not state:
+                header.extend(data)
+                if b"\n" not in header:
+                    return
+                line, _, data = bytes(header).partition(b"\n")
+                pid, size, initial = line.split()
+                state.update(pid=int(pid), offset=int(size) - int(initial))
+            state["offset"] += len(data)
+            write(decoder.decode(data))
+
+        exec_id = self._api.exec_create(
+            self.container.id, ["sh", "-c", CONTAINER_FOLLOW_SCRIPT, "sh", self.log_file, str(n)], user="root"
+        )["Id"]
+        sock = self._api.exec_start(exec_id, socket=True)._sock  # pylint: disable=protected-access
+        demuxer = StreamDemuxer(on_stdout, lambda data: None, encoding=None)
+        selector = selectors.DefaultSelector()
+        selector.register(sock, selectors.EVENT_READ)
+        try:
+            while True:
+                if selector.select(timeout=interval):
+                    if not demuxer.recv(sock):
+                        break
+                    continue
+                self.refresh()
+                if self.state == JobState.EXITED:
+                    break
+        finally:
+            selector.close()
+            sock.close()
+            if "pid" in state:
+                self.container.exec_run(["kill", str(state["pid"])], user="root")
+        if "offset" in state:
+            rest = self.container.exec_run(["tail", "-c", f"+{state['offset'] + 1}", "--", self.log_file], user="root")
+            if rest.exit_code == 0:
+                write(decoder.decode(rest.output))
+        write(decoder.decode(b"", final=True))
+
+
+class JobRegistry:
+    """Keeps track of the background jobs started in this kernel
+
+    The logs hold the output of the jobs, so they are written into a
+    directory only the current user can access.
+    """
+
+    def __init__(self, log_dir: Optional[str] = None):
+        # the directories which have to be private, from the outermost one
+        self._private_dirs = [log_dir] if log_dir else [user_temp_dir(), os.path.join(user_temp_dir(), "jobs")]
+        self.log_dir = self._private_dirs[-1]
+        self.jobs: Dict[int, Job] = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def new_log_file(self) -> str:
+        """Returns a log file path which is not used by any other job"""
+        for directory in self._private_dirs:
+            private_dir(directory)
+        return os.path.join(self.log_dir, f"job-{os.getpid()}-{uuid.uuid4().hex[:8]}.log")
+
+    def register(
+        self, pid: int, command: str, log_file: Optional[str] = None, compressed: Optional[bool] = None
+    ) -> Job:
+        with self._lock:
+            job = Job(self._next_id, pid, command, log_file, compressed=compressed)
+            self.jobs[job.id] = job
+            self._next_id += 1
+        return job
+
+    def register_container_job(
+        self,
+        container: Any,
+        execId: str,
+        pid: int,
+        command: str,
+        log_file: Optional[str] = None,
+    ) -> ContainerJob:
+        with self._lock:
+            job = ContainerJob(self._next_id, pid, command, log_file, container=container, exec_id=execId)
+            self.jobs[job.id] = job
+            self._next_id += 1
+        return job
+
+    def get(self, id: int) -> Job:
+        job = self.jobs.get(id)
+        if job is None:
+            raise JobNotFound(f"Job {id} doesn't exist")
+        return job
+
+    def get_by_pid(self, pid: int) -> Optional[Job]:
+        for job in reversed(list(self.jobs.values())):
+            # pids in containers are in another namespace
+            if job.pid == pid and not isinstance(job, ContainerJob):
+                return job
+        return None
+
+    def mark_exited(self, pid: int, exit_code: Optional[int]) -> None:
+        job = self.get_by_pid(pid)
+        if job is not None:
+            job.mark_exited(exit_code)
+
+    def refresh(self) -> None:
+        """Updates the state of the running jobs, jobs which exited aren't queried again"""
+        for job in list(self.jobs.values()):
+            job.refresh()
+
+
+JOB_REGISTRY = JobRegistry()
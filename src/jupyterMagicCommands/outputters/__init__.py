@@ -1,10 +1,13 @@
 from jupyterMagicCommands.outputters.basic_interactive_outputter import (
     BasicInteractiveOutputter,
 )
+from jupyterMagicCommands.outputters.coalescing_outputter import CoalescingOutputter
 from jupyterMagicCommands.outputters.file_outputter import FileOutputter
 from jupyterMagicCommands.outputters.interactive_outputter import InteractiveOutputter
 from jupyterMagicCommands.outputters.outputter_cb import AbstractOutputterReadCB
+from jupyterMagicCommands.outputters.outputter_options import OutputterOptions
 from jupyterMagicCommands.outputters.variable_outputter import VariableOutputter
+from jupyterMagicCommands.outputters.prefix_outputter import PrefixOutputter
 from jupyterMagicCommands.outputters.abstract_outputter import (
     AbstractOutputter,
 )
@@ -8,6 +8,10 @@ class AbstractOutputter(metaclass=ABCMeta):
     def write(self, s: str) -> None:
         pass
 
+    def write_err(self, s: str) -> None:
+        """Writes the output from stderr. It's merged into write by default"""
+        self.write(s)
+
     @abstractmethod
     def handle_read(self) -> None:
         pass
@@ -16,5 +20,8 @@ class AbstractOutputter(metaclass=ABCMeta):
     def register_read_callback(self, cb: AbstractOutputterReadCB) -> None:
         pass
 
+    def flush(self) -> None:
+        pass
+
     def close(self) -> None:
         pass
\ No newline at end of file
@@ -2,6 +2,7 @@ from abc import ABCMeta, abstractmethod
 from typing import Optional
 
 from jupyterMagicCommands.outputters.abstract_outputter import AbstractOutputter
+from jupyterMagicCommands.outputters.outputter_options import OutputterOptions
 
 
 class AbstractOutputterFactory(metaclass=ABCMeta):
@@ -11,5 +12,6 @@ class AbstractOutputterFactory(metaclass=ABCMeta):
         interactive: bool,
         outFile: Optional[str] = None,
         outVar: Optional[str] = None,
+        options: Optional[OutputterOptions] = None,
     ) -> AbstractOutputter:
         pass
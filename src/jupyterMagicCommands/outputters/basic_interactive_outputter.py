@@ -1,3 +1,5 @@
+import sys
+
 from jupyterMagicCommands.outputters.abstract_outputter import AbstractOutputter
 from overrides import override
 from jupyterMagicCommands.outputters.outputter_cb import AbstractOutputterReadCB
@@ -10,6 +12,10 @@ class BasicInteractiveOutputter(AbstractOutputter):
     def write(self, s: str):
         print(removeprefix(s, "\x1b[?1h\x1b="), end="")
 
+    @override
+    def write_err(self, s: str):
+        print(s, end="", file=sys.stderr)
+
     @override
     def handle_read(self):
         pass
@@ -0,0 +1,96 @@
+import logging
+import time
+from typing import Callable, List
+
+from overrides import override
+
+from jupyterMagicCommands.outputters.abstract_outputter import AbstractOutputter
+from jupyterMagicCommands.outputters.outputter_cb import AbstractOutputterReadCB
+
+logger = logging.getLogger(__name__)
+
+
+class CoalescingOutputter(AbstractOutputter):
+    """Buffers the writes to another outputter and forwards them in batches
+
+    Read loops hand over output in many tiny chunks and every print of the
+    wrapped outputter becomes its own IOPub message. The buffer is flushed when
+    it holds max_buffer_size characters, when flush_interval seconds passed
+    since the last flush, and on close. Output after a quiet period is
+    forwarded right away, so sporadic output isn't delayed.
+    """
+
+    def __init__(
+        self,
+        outputter: AbstractOutputter,
+        flush_interval: float = 0.1,
+        max_buffer_size: int = 64 * 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.outputter = outputter
+        self.flush_interval = flush_interval
+        self.max_buffer_size = max_buffer_size
+        self.writes = 0
+        self.flushes = 0
+        self._clock = clock
+        self._buffer: List[str] = []
+        self._buffered = 0
+        self._buffer_is_err = False
+        self._last_flush = clock()
+
+    @property
+    def saved_messages(self) -> int:
+        return self.writes - self.flushes
+
+    def _append(self, s: str, is_err: bool) -> None:
+        if not s:
+            return
+        if self._buffer and is_err != self._buffer_is_err:
+            # keep stdout and stderr in the order they were written
+            self.flush()
+        self._buffer_is_err = is_err
+        self._buffer.append(s)
+        self._buffered += len(s)
+        self.writes += 1
+        if self._buffered >= self.max_buffer_size or self._is_flush_due():
+            self.flush()
+
+    def _is_flush_due(self) -> bool:
+        return self._clock() - self._last_flush >= self.flush_interval
+
+    @override
+    def write(self, s: str) -> None:
+        self._append(s, False)
+
+    @override
+    def write_err(self, s: str) -> None:
+        self._append(s, True)
+
+    @override
+    def flush(self) -> None:
+        if self._buffer:
+            data = "".join(self._buffer)
+            self._buffer = []
+            self._buffered = 0
+            if self._buffer_is_err:
+                self.outputter.write_err(data)
+            else:
+                self.outputter.write(data)
+            self.flushes += 1
+        self._last_flush = self._clock()
+
+    @override
+    def handle_read(self) -> None:
+        if self._buffer and self._is_flush_due():
+            self.flush()
+        self.outputter.handle_read()
+
+    @override
+    def register_read_callback(self, cb: AbstractOutputterReadCB) -> None:
+        self.outputter.register_read_callback(cb)
+
+    @override
+    def close(self) -> None:
+        self.flush()
+        logger.debug(f"Coalesced {self.writes} writes into {self.flushes}, saved {self.saved_messages} messages")
+        self.outputter.close()
@@ -1,29 +1,136 @@
+import gzip
+import os
+import time
+from typing import IO, Callable, List, Optional
+
 from jupyterMagicCommands.outputters.abstract_outputter import AbstractOutputter
 from overrides import override
 
 
 class FileOutputter(AbstractOutputter):
+    """Writes the output into a file
+
+    Writes are buffered and reach the file once buffer_size bytes are pending
+    or flush_interval seconds have passed since the last flush, so a chatty
+    command doesn't cost a syscall per read. flush_interval=0 flushes every
+    write. The file is gzip compressed when compress is set or the path ends
+    with .gz. With max_size the file is rotated like logging's
+    RotatingFileHandler: out.log becomes out.log.1 (out.1.gz for out.gz) and
+    at most keep old files are kept. Files are cut between lines unless a line
+    is longer than max_size. For compressed files max_size counts the
+    uncompressed bytes.
+    """
 
-    def __init__(self, file_path: str, **kwargs) -> None:
+    def __init__(
+        self,
+        file_path: str,
+        buffer_size: int = 64 * 1024,
+        flush_interval: float = 1.0,
+        compress: Optional[bool] = None,
+        max_size: Optional[int] = None,
+        keep: int = 1,
+        encoding: str = "utf8",
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if max_size is not None and max_size <= 0:
+            raise Exception("max_size must be positive")
         self.file_path = file_path
-        self.file = open(file_path, "w", **kwargs)
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.compress = file_path.endswith(".gz") if compress is None else compress
+        self.max_size = max_size
+        self.keep = keep
+        self.encoding = encoding
+        self.clock = clock
+        self.rotations = 0
+        self._buffer: List[bytes] = []
+        self._buffered = 0
+        self._size = 0
+        self._last_flush = clock()
+        self.file = self._open()
+
+    def _open(self) -> IO[bytes]:
+        if self.compress:
+            return gzip.open(self.file_path, "wb")  # type: ignore
+        return open(self.file_path, "wb")
+
+    def _backup_path(self, i: int) -> str:
+        if self.compress and self.file_path.endswith(".gz"):
+            return f"{self.file_path[:-3]}.{i}.gz"
+        return f"{self.file_path}.{i}"
+
+    def rotate(self) -> None:
+        self.file.close()
+        if self.keep > 0:
+            for i in range(self.keep - 1, 0, -1):
+                src = self._backup_path(i)
+                if os.path.exists(src):
+                    os.replace(src, self._backup_path(i + 1))
+            os.replace(self.file_path, self._backup_path(1))
+        self.file = self._open()
+        self._size = 0
+        self.rotations += 1
 
     @override
     def write(self, s: str):
-        self.file.write(s)
+        data = s.encode(self.encoding)
+        if not data:
+            return
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.buffer_size or self.clock() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    @override
+    def flush(self) -> None:
+        self._last_flush = self.clock()
+        if not self._buffer:
+            return
+        data = b"".join(self._buffer)
+        self._buffer.clear()
+        self._buffered = 0
+        if self.max_size is None:
+            self.file.write(data)
+        else:
+            self._write_rotating(data)
         self.file.flush()
 
+    def _write_rotating(self, data: bytes) -> None:
+        max_size = self.max_size or 0
+        view = memoryview(data)
+        while view:
+            room = max_size - self._size
+            if len(view) <= room:
+                cut = len(view)
+            else:
+                # fill the file up to the last complete line which fits, lines
+                # longer than max_size are split
+                cut = data.rfind(b"\n", len(data) - len(view), len(data) - len(view) + room) + 1
+                if cut:
+                    cut -= len(data) - len(view)
+                elif self._size == 0:
+                    cut = room
+            if cut:
+                self.file.write(view[:cut])
+                self._size += cut
+                view = view[cut:]
+            if view:
+                self.rotate()
+
     @override
     def close(self) -> None:
         if not self.file.closed:
+            self.flush()
             self.file.close()
 
     def __del__(self):
-        self.close()
+        if hasattr(self, "file"):
+            self.close()
 
     @override
     def handle_read(self):
-        pass
+        if self._buffer and self.clock() - self._last_flush >= self.flush_interval:
+            self.flush()
 
     @override
     def register_read_callback(self, cb):
@@ -7,8 +7,16 @@ from IPython.display import display
 
 
 class InteractiveOutputter(AbstractOutputter):
+    """Shows the output in a widget with a text box whose input is sent to the process
 
-    def __init__(self):
+    The read loops call handle_read between two waits on the process output,
+    so each call processes at most poll_batch pending UI events and returns.
+    Keystrokes are forwarded on the next iteration and output keeps flowing
+    instead of waiting for a long UI poll to finish.
+    """
+
+    def __init__(self, poll_batch: int = 8, ui_events=ui_events):
+        self.poll_batch = poll_batch
         self.ui = ui_events()
         self.poll = self.ui.__enter__()
         self.out = widgets.Output()
@@ -19,6 +27,7 @@ class InteractiveOutputter(AbstractOutputter):
             disabled=False,
         )
         self.read_cb: AbstractOutputterReadCB = EmptyOutputterReadCB()
+        self._closed = False
         display(widgets.VBox([self.out, self.text, self.sendEnterWidget]))
 
     @override
@@ -35,6 +44,16 @@ class InteractiveOutputter(AbstractOutputter):
     def write(self, s):
         self.out.append_stdout(s)
 
+    @override
+    def write_err(self, s):
+        self.out.append_stderr(s)
+
     @override
     def handle_read(self):
-        self.poll(10000)
\ No newline at end of file
+        self.poll(self.poll_batch)
+
+    @override
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self.ui.__exit__(None, None, None)
@@ -4,50 +4,76 @@ from jupyterMagicCommands.outputters import (
     InteractiveOutputter,
     VariableOutputter,
     BasicInteractiveOutputter,
+    CoalescingOutputter,
     AbstractOutputterFactory,
     AbstractOutputter,
+    OutputterOptions,
 )
 from IPython.core.interactiveshell import InteractiveShell
 
 
 class BasicFileSystemOutputterFactory(AbstractOutputterFactory):
-    def __init__(self, shell: InteractiveShell):
+    def __init__(self, shell: InteractiveShell, flush_interval: float = 0.1, max_buffer_size: int = 64 * 1024):
         self.shell = shell
+        self.flush_interval = flush_interval
+        self.max_buffer_size = max_buffer_size
 
     def create_outputter(
         self,
         interactive: bool,
         outFile: Optional[str] = None,
         outVar: Optional[str] = None,
+        options: Optional[OutputterOptions] = None,
     ) -> AbstractOutputter:
+        options = options or OutputterOptions()
         outputter: AbstractOutputter
         if interactive:
+            # not coalesced, the echo of what the user types must show up right away
             outputter = InteractiveOutputter()
         else:
             if outFile is not None:
-                outputter = FileOutputter(outFile)
+                outputter = FileOutputter(
+                    outFile,
+                    buffer_size=options.outFileBufferSize,
+                    compress=options.outFileCompress or None,
+                    max_size=options.outFileMaxSize,
+                    keep=options.outFileKeep,
+                )
             elif outVar is not None:
-                outputter = VariableOutputter(outVar, self.shell)
+                outputter = VariableOutputter(
+                    outVar, self.shell, as_bytes=options.outVarBytes, max_size=options.outVarMaxSize
+                )
             else:
-                outputter = BasicInteractiveOutputter()
+                outputter = CoalescingOutputter(
+                    BasicInteractiveOutputter(), self.flush_interval, self.max_buffer_size
+                )
         return outputter
 
 
 class DockerFileSystemOutputterFactory(AbstractOutputterFactory):
-    def __init__(self, shell: InteractiveShell):
+    def __init__(self, shell: InteractiveShell, flush_interval: float = 0.1, max_buffer_size: int = 64 * 1024):
         self.shell = shell
+        self.flush_interval = flush_interval
+        self.max_buffer_size = max_buffer_size
 
     def create_outputter(
         self,
         interactive: bool,
         outFile: Optional[str] = None,
         outVar: Optional[str] = None,
+        options: Optional[OutputterOptions] = None,
     ) -> AbstractOutputter:
+        options = options or OutputterOptions()
         outputter: AbstractOutputter
         if interactive:
+            # not coalesced, the echo of what the user types must show up right away
             outputter = InteractiveOutputter()
         elif outVar is not None:
-            outputter = VariableOutputter(outVar, self.shell)
+            outputter = VariableOutputter(
+                outVar, self.shell, as_bytes=options.outVarBytes, max_size=options.outVarMaxSize
+            )
         else:
-            outputter = BasicInteractiveOutputter()
+            outputter = CoalescingOutputter(
+                BasicInteractiveOutputter(), self.flush_interval, self.max_buffer_size
+            )
         return outputter
\ No newline at end of file
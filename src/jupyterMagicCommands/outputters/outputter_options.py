@@ -0,0 +1,28 @@
+from dataclasses import dataclass
+from typing import List, Optional
+
+
+@dataclass
+class OutputterOptions:
+    """Per command options of the outputters created by the factories"""
+    # store the output saved into a variable as bytes instead of str
+    outVarBytes: bool = False
+    # keep only the last outVarMaxSize characters (bytes with outVarBytes) of the output
+    outVarMaxSize: Optional[int] = None
+    # bytes buffered before they are written to the output file
+    outFileBufferSize: int = 64 * 1024
+    # gzip the output file, it's also enabled by a .gz suffix
+    outFileCompress: bool = False
+    # rotate the output file once it reaches outFileMaxSize bytes
+    outFileMaxSize: Optional[int] = None
+    # number of rotated output files to keep
+    outFileKeep: int = 1
+
+    def file_outputter_args(self) -> List[str]:
+        """The options of the output file as arguments of the %%_script magic"""
+        args = ["--outfile-buffer-size", str(self.outFileBufferSize)]
+        if self.outFileCompress:
+            args.append("--outfile-gzip")
+        if self.outFileMaxSize is not None:
+            args += ["--outfile-max-size", str(self.outFileMaxSize), "--outfile-keep", str(self.outFileKeep)]
+        return args
@@ -0,0 +1,43 @@
+from typing import Callable, Optional
+
+from overrides import override
+
+from jupyterMagicCommands.outputters.variable_outputter import VariableOutputter
+
+
+class PrefixOutputter(VariableOutputter):
+    """Captures the output of one of many targets and forwards it tagged
+
+    Complete lines are passed to sink with prefix in front of them as they
+    arrive, the last unfinished line when the outputter is closed. The output
+    is also kept, the last max_size characters with max_size, and can be read
+    from value. Without sink the output is only kept.
+    """
+
+    def __init__(
+        self,
+        prefix: str,
+        sink: Optional[Callable[[str], None]] = None,
+        max_size: Optional[int] = None,
+    ) -> None:
+        super().__init__(prefix, shell=None, max_size=max_size)
+        self.prefix = prefix
+        self.sink = sink
+        self._partial = ""
+
+    @override
+    def write(self, s: str):
+        super().write(s)
+        if self.sink is None:
+            return
+        text = self._partial + s
+        end = text.rfind("\n") + 1
+        self._partial = text[end:]
+        if end:
+            self.sink("".join(f"{self.prefix}{line}" for line in text[:end].splitlines(keepends=True)))
+
+    @override
+    def close(self) -> None:
+        if self.sink is not None and self._partial:
+            self.sink(f"{self.prefix}{self._partial}\n")
+            self._partial = ""
@@ -1,4 +1,5 @@
-from typing import Optional
+from collections import deque
+from typing import Deque, Optional, Union
 
 from IPython import get_ipython
 from IPython.core.interactiveshell import InteractiveShell
@@ -7,22 +8,63 @@ from overrides import override
 from jupyterMagicCommands.outputters.abstract_outputter import \
     AbstractOutputter
 
+Chunk = Union[str, bytes]
+
 
 class VariableOutputter(AbstractOutputter):
+    """Saves the output into a variable of the user namespace
+
+    Chunks are collected in a list and joined once when the outputter is
+    closed, so capturing large outputs stays linear. With max_size only the
+    last max_size characters (bytes with as_bytes) are kept.
+    """
 
     _default_shell = get_ipython()
 
-    def __init__(self, var_name: str, shell: Optional[InteractiveShell] = None) -> None:
+    def __init__(
+        self,
+        var_name: str,
+        shell: Optional[InteractiveShell] = None,
+        as_bytes: bool = False,
+        max_size: Optional[int] = None,
+        encoding: str = "utf8",
+    ) -> None:
         self.var_name = var_name
         self.shell = shell or self._default_shell
-        self._first_write = True
+        self.as_bytes = as_bytes
+        self.max_size = max_size
+        self.encoding = encoding
+        self._chunks: Deque[Chunk] = deque()
+        self._size = 0
+        self._written = False
+
+    @property
+    def value(self) -> Chunk:
+        if self.as_bytes:
+            return b"".join(self._chunks)  # type: ignore
+        return "".join(self._chunks)  # type: ignore
 
     @override
     def write(self, s: str):
-        if self._first_write:
-            self.shell.user_ns[self.var_name] = ""
-            self._first_write = False
-        self.shell.user_ns[self.var_name] += s
+        chunk: Chunk = s.encode(self.encoding) if self.as_bytes else s
+        self._written = True
+        self._chunks.append(chunk)
+        self._size += len(chunk)
+        if self.max_size is not None:
+            self._trim(self.max_size)
+
+    def _trim(self, max_size: int) -> None:
+        while self._chunks and self._size - len(self._chunks[0]) >= max_size:
+            self._size -= len(self._chunks.popleft())
+        if self._size > max_size:
+            head = self._chunks.popleft()
+            self._chunks.appendleft(head[self._size - max_size:])
+            self._size = max_size
+
+    @override
+    def close(self) -> None:
+        if self._written:
+            self.shell.user_ns[self.var_name] = self.value
 
     @override
     def handle_read(self):
@@ -30,4 +72,4 @@ class VariableOutputter(AbstractOutputter):
 
     @override
     def register_read_callback(self, cb):
-        pass
\ No newline at end of file
+        pass
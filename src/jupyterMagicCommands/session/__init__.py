@@ -1,2 +1,4 @@
 from .session import *
-from .manager import *
\ No newline at end of file
+from .manager import *
+from .bash_session import *
+from .docker_session import *
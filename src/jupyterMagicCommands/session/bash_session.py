@@ -0,0 +1,107 @@
+import os
+import shlex
+import signal
+import subprocess
+import uuid
+from typing import Optional
+
+from jupyterMagicCommands.outputters import AbstractOutputter
+from jupyterMagicCommands.utils.action_detector import ActionDetector
+from jupyterMagicCommands.utils.stream import SentinelScanner, StreamReader
+from jupyterMagicCommands.utils.types import nn
+
+
+class BashSessionClosed(Exception):
+    pass
+
+
+class BashSession:
+    """A long-lived bash which runs cells one after another
+
+    Every cell is sourced by the same shell, so exported variables, functions
+    and the working directory are kept between cells. The end of a cell is
+    detected by a sentinel printed to stdout, followed by the exit code, and to
+    stderr.
+    """
+
+    process: subprocess.Popen
+
+    def __init__(self, program: str = "bash"):
+        self.last_exit_code: Optional[int] = None
+        # the sentinel is printed from two halves so that it never shows up
+        # literally in the commands we send, e.g. when the user enables `set -x`
+        self._sentinel_head = "__jmc_session_"
+        self._sentinel_tail = uuid.uuid4().hex + "__"
+        self.sentinel = self._sentinel_head + self._sentinel_tail
+        self.start_process(program)
+
+    def start_process(self, program: str):
+        self.process = subprocess.Popen(
+            [program],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+        )
+        # ^C should stop the running command but not the session itself
+        self._send("trap : INT\n")
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def _send(self, s: str):
+        stdin = nn(self.process.stdin)
+        stdin.write(s.encode("utf8"))
+        stdin.flush()
+
+    def invoke_command(
+        self,
+        script_path: str,
+        outputter: AbstractOutputter,
+        actionDetector: Optional[ActionDetector] = None,
+    ) -> int:
+        """Sources script_path in the session and returns its exit code"""
+        if not self.alive:
+            raise BashSessionClosed("The bash session has exited")
+
+        def on_output(message: str) -> None:
+            if actionDetector is not None:
+                actionDetector.feed(message)
+            outputter.write(message)
+
+        stdout = SentinelScanner(self.sentinel, on_output)
+        stderr = SentinelScanner(self.sentinel, outputter.write_err)
+        head, tail = self._sentinel_head, self._sentinel_tail
+        self._send(
+            f". {shlex.quote(script_path)} </dev/null\n"
+            f"__jmc_rc=$?\n"
+            f"printf '%s%s %d\\n' {head} {tail} $__jmc_rc\n"
+            f"printf '%s%s\\n' {head} {tail} >&2\n"
+        )
+
+        reader = StreamReader()
+        reader.register(nn(self.process.stdout).fileno(), stdout.feed)
+        reader.register(nn(self.process.stderr).fileno(), stderr.feed)
+        try:
+            while not (stdout.found and "\n" in stdout.trailer and stderr.found):
+                if reader.finished:
+                    stdout.flush()
+                    stderr.flush()
+                    raise BashSessionClosed(
+                        f"The bash session exited with code {self.process.wait()}"
+                    )
+                try:
+                    reader.poll(timeout=0.01)
+                    outputter.handle_read()
+                except KeyboardInterrupt:
+                    os.killpg(self.process.pid, signal.SIGINT)
+        finally:
+            reader.close()
+        self.last_exit_code = int(stdout.trailer.split()[0])
+        return self.last_exit_code
+
+    def close(self):
+        if self.alive:
+            os.killpg(self.process.pid, signal.SIGKILL)
+            self.process.wait()
@@ -0,0 +1,200 @@
+import select
+import selectors
+import shlex
+import socket
+import time
+import uuid
+from typing import Callable, Optional
+
+from docker.models.containers import Container
+
+from jupyterMagicCommands.jobs.registry import CONTAINER_KILL_SCRIPT
+from jupyterMagicCommands.outputters import AbstractOutputter
+from jupyterMagicCommands.utils.action_detector import ActionDetector
+from jupyterMagicCommands.utils.stream import SentinelScanner, StreamDemuxer
+
+# seconds a container session may stay unused before it's closed
+DOCKER_SESSION_IDLE_TIMEOUT = 30 * 60
+# interrupts of one cell after which the session is killed, the shell ignores
+# SIGINT itself so e.g. a loop may keep running after its command was stopped
+DOCKER_SESSION_MAX_INTERRUPTS = 3
+
+
+class DockerSessionClosed(Exception):
+    pass
+
+
+def _started_at(container: Container) -> str:
+    return container.attrs.get("State", {}).get("StartedAt", "")
+
+
+class DockerSession:
+    """A long-lived shell in a container which runs cells one after another
+
+    The shell is started once by an exec attached to a socket and reads the
+    cells from its stdin, so a cell costs no exec create, exec start or shell
+    startup. Every cell is evaluated by the same shell with stdin from
+    /dev/null, so exported variables, functions and the working directory are
+    kept between cells. The end of a cell is detected by a sentinel printed to
+    stdout, followed by the exit code, and to stderr, like in BashSession.
+    """
+
+    def __init__(
+        self,
+        container: Container,
+        shell: str = "bash",
+        idle_timeout: float = DOCKER_SESSION_IDLE_TIMEOUT,
+        clock: Callable[[], float] = time.monotonic,
+        max_interrupts: int = DOCKER_SESSION_MAX_INTERRUPTS,
+    ):
+        self.container = container
+        self.shell = shell
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+        self.max_interrupts = max_interrupts
+        self.last_exit_code: Optional[int] = None
+        self.started_at = _started_at(container)
+        self.last_used = clock()
+        self.pid: Optional[int] = None
+        # the sentinel is printed from two halves so that it never shows up
+        # literally in the commands we send, e.g. when the user enables `set -x`
+        self._sentinel_head = "__jmc_session_"
+        self._sentinel_tail = uuid.uuid4().hex + "__"
+        self.sentinel = self._sentinel_head + self._sentinel_tail
+        self._closed = False
+        # frames may be split between cells, e.g. by a background command
+        self._stdout = SentinelScanner(self.sentinel, lambda s: None)
+        self._stderr = SentinelScanner(self.sentinel, lambda s: None)
+        self._demuxer = StreamDemuxer(self._feed_stdout, self._feed_stderr)
+        self.start_process()
+
+    def start_process(self) -> None:
+        api = self.container.client.api
+        self.exec_id = api.exec_create(
+            self.container.id, [self.shell, "-s"], stdin=True, tty=False, user="root"
+        )["Id"]
+        self._sock: socket.socket = api.exec_start(self.exec_id, tty=False, socket=True)._sock  # pylint: disable=protected-access
+        self._sock.setblocking(True)
+        # ^C should stop the running command but not the session itself
+        self.pid = self._roundtrip("trap : INT", None, "$$")
+
+    @property
+    def alive(self) -> bool:
+        if self._closed:
+            return False
+        # a closed session shows up as a readable socket at EOF
+        readable, _, _ = select.select([self._sock], [], [], 0)
+        if readable and not self._sock.recv(1, socket.MSG_PEEK):
+            self.close()
+            return False
+        return True
+
+    @property
+    def expired(self) -> bool:
+        return self.clock() - self.last_used > self.idle_timeout
+
+    def is_for(self, container: Container) -> bool:
+        """Whether the session still runs in this start of the container"""
+        return container.id == self.container.id and _started_at(container) == self.started_at
+
+    def _feed_stdout(self, s: str) -> None:
+        self._stdout.feed(s)
+
+    def _feed_stderr(self, s: str) -> None:
+        self._stderr.feed(s)
+
+    def _send(self, s: str) -> None:
+        try:
+            self._sock.sendall(s.encode("utf8"))
+        except OSError as e:
+            self.close()
+            raise DockerSessionClosed(f"The session in {self.container.id} is gone: {e}")
+
+    def _roundtrip(
+        self,
+        script: str,
+        outputter: Optional[AbstractOutputter],
+        status: str = "$__jmc_rc",
+        actionDetector: Optional[ActionDetector] = None,
+    ) -> int:
+        """Sends script, forwards its output and returns the number printed after the sentinel"""
+        def on_output(message: str) -> None:
+            if actionDetector is not None:
+                actionDetector.feed(message)
+            if outputter is not None:
+                outputter.write(message)
+
+        def on_error(message: str) -> None:
+            if outputter is not None:
+                outputter.write_err(message)
+
+        self._stdout = stdout = SentinelScanner(self.sentinel, on_output)
+        self._stderr = stderr = SentinelScanner(self.sentinel, on_error)
+        head, tail = self._sentinel_head, self._sentinel_tail
+        self._send(
+            f"{script}\n"
+            f"__jmc_rc=$?\n"
+            f"printf '%s%s %d\\n' {head} {tail} {status}\n"
+            f"printf '%s%s\\n' {head} {tail} >&2\n"
+        )
+        selector = selectors.DefaultSelector()
+        selector.register(self._sock, selectors.EVENT_READ)
+        interrupts = 0
+        try:
+            while not (stdout.found and "\n" in stdout.trailer and stderr.found):
+                try:
+                    if selector.select(timeout=0.01) and not self._demuxer.recv(self._sock):
+                        stdout.flush()
+                        stderr.flush()
+                        self.close()
+                        raise DockerSessionClosed(f"The session in {self.container.id} has exited")
+                    if outputter is not None:
+                        outputter.handle_read()
+                except KeyboardInterrupt:
+                    interrupts += 1
+                    if interrupts >= self.max_interrupts:
+                        self.kill()
+                        raise DockerSessionClosed(
+                            f"The session in {self.container.id} didn't stop after {interrupts} interrupts and was killed"
+                        )
+                    self.interrupt()
+        finally:
+            selector.close()
+            self.last_used = self.clock()
+        return int(stdout.trailer.split()[0])
+
+    def invoke_command(
+        self,
+        cmd: str,
+        outputter: AbstractOutputter,
+        actionDetector: Optional[ActionDetector] = None,
+    ) -> int:
+        """Evaluates cmd in the session and returns its exit code"""
+        if not self.alive:
+            raise DockerSessionClosed(f"The session in {self.container.id} has exited")
+        # `command` keeps a syntax error in the cell from ending a POSIX sh
+        self.last_exit_code = self._roundtrip(
+            f"command eval {shlex.quote(cmd)} </dev/null", outputter, actionDetector=actionDetector
+        )
+        return self.last_exit_code
+
+    def _signal(self, name: str) -> None:
+        """Sends a signal to the shell of the session and all its descendants"""
+        if self.pid is None:
+            return
+        self.container.exec_run(["sh", "-c", CONTAINER_KILL_SCRIPT, "sh", name, str(self.pid)], user="root")
+
+    def interrupt(self) -> None:
+        """Sends SIGINT to the commands the session runs, the shell itself ignores it"""
+        self._signal("INT")
+
+    def kill(self) -> None:
+        """Kills the shell with the commands it runs and closes the session"""
+        self._signal("KILL")
+        self.close()
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            # the shell reads EOF and exits
+            self._sock.close()
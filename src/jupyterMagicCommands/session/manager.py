@@ -16,6 +16,9 @@ class SessionManager:
         session = self.sessions.get(id)
         return session
 
+    def removeSession(self, id: SessionID) -> Optional[Session]:
+        return self.sessions.pop(id, None)
+
     def getOrCreateSession(self, id: SessionID, retrieveSession: SessionRetriever) -> Session:
         session = self.getSession(id)
         if session is None:
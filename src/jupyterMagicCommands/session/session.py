@@ -64,6 +64,7 @@ class Session:
                 self.close()
             except Exception:
                 break
+        self.outputter.flush()
 
     def close(self):
         self.process.kill(9)
\ No newline at end of file
@@ -1,3 +1,4 @@
+import copy
 from enum import Enum
 import logging
 from typing import Optional
@@ -76,12 +77,30 @@ class LoggingCommandParser:
         )
 
 
+LOGGING_COMMAND_PREFIX = "##jmc["
+
+
 class ActionDetector:
 
+    # lines longer than this can't be logging commands, so they are not buffered
+    MAX_PENDING_LINE = 64 * 1024
+
     def __init__(self, logger: Optional[logging.Logger]=None, shell: Optional[InteractiveShell] = None):
         self.logger = logger or NULL_LOGGER
         self.shell = shell or get_ipython()
         self._logging_command_parser = LoggingCommandParser()
+        self.reset()
+
+    def reset(self) -> None:
+        """Forgets the partial line remembered by feed"""
+        self._pending = ""
+        self._skipping_long_line = False
+
+    def fork(self) -> "ActionDetector":
+        """Returns a detector sharing the parser with its own partial line, e.g. for another stream"""
+        other = copy.copy(self)
+        other.reset()
+        return other
 
     def detect_action_by_line(self, line: str) -> None:
         i = line.find('\n') 
@@ -122,3 +141,27 @@ class ActionDetector:
             j = k + 1
             self.detect_action_by_line(line)
         return j
+
+    def feed(self, chunk: str) -> None:
+        """Detects action from a stream of chunks
+
+        The trailing incomplete line is remembered until the rest of it arrives,
+        so only O(line) text is kept between calls. Chunks without any logging
+        command skip the parser entirely.
+        """
+        if self._skipping_long_line:
+            k = chunk.find('\n')
+            if k == -1:
+                return
+            self._skipping_long_line = False
+            chunk = chunk[k + 1:]
+        data = self._pending + chunk
+        k = data.rfind('\n')
+        if k != -1:
+            if data.find(LOGGING_COMMAND_PREFIX, 0, k + 1) != -1:
+                self.detect_action_by_chunk(data[:k + 1], 0)
+            data = data[k + 1:]
+        if len(data) > self.MAX_PENDING_LINE:
+            data = ""
+            self._skipping_long_line = True
+        self._pending = data
@@ -1,30 +1,139 @@
+import hashlib
+import io
 import os
+import posixpath
+import shutil
+import socket
+import ssl
 import tarfile
 import tempfile
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass, field
 from docker.models.containers import Container
 import logging
+from typing import IO, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from jupyterMagicCommands.utils.stream import StreamDemuxer
 
 logger = logging.getLogger(__name__)
 
-def copy_to_container(container: Container, src: str, dst: str) -> None:
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# the arguments of one `rm` exec are kept below the 128 KiB limit of Linux
+MAX_ARGUMENTS_SIZE = 64 * 1024
+
+# writes stdin into the file $1 with the redirection {redirect}. The first
+# line of stdin is `-` to copy the rest up to EOF, or the number of bytes
+# to copy when the stdin can't be closed
+EXEC_WRITE_SCRIPT = (
+    'IFS= read -r n || exit 1; '
+    'if [ "$n" = - ]; then cat {redirect} "$1"; else head -c "$n" {redirect} "$1"; fi'
+)
+
+# prints `size mtime ./path` for every file below $1, then with $2 = 1 a
+# line `--` followed by a `sha256  ./path` line for every file
+MANIFEST_SCRIPT = """\
+cd "$1" 2>/dev/null || exit 0
+find . -type f -exec stat -c '%s %Y %n' {} +
+if [ "$2" = 1 ]; then
+    echo --
+    find . -type f -exec sha256sum {} +
+fi
+"""
+
+
+class ChunkStream(io.RawIOBase):
+    """A readable file over an iterator of bytes, like the archive from get_archive"""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._chunk = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._chunk:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._chunk = memoryview(chunk)
+        n = min(len(b), len(self._chunk))
+        b[:n] = self._chunk[:n]
+        self._chunk = self._chunk[n:]
+        return n
+
+
+def tar_stream(
+    src: str, arcname: str, chunk_size: int = COPY_CHUNK_SIZE, mode: Optional[int] = None
+) -> Iterator[bytes]:
+    """Yields a tar archive holding src as arcname, built while it's read
+
+    Only one chunk of the file is in memory at a time, so the archive can be
+    handed to put_archive as a generator and is sent with chunked encoding.
+    The member gets the mode of src unless mode is given.
+    """
+    yield from _tar_member(src, arcname, chunk_size, mode)
+    # end of archive
+    yield tarfile.NUL * (2 * tarfile.BLOCKSIZE)
+
+
+def tar_files_stream(files: Iterable[Tuple[str, str]], chunk_size: int = COPY_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yields a tar archive holding every (src, arcname) of files, like tar_stream"""
+    for src, arcname in files:
+        yield from _tar_member(src, arcname, chunk_size)
+    # end of archive
+    yield tarfile.NUL * (2 * tarfile.BLOCKSIZE)
+
+
+def _tar_member(src: str, arcname: str, chunk_size: int, mode: Optional[int] = None) -> Iterator[bytes]:
+    st = os.stat(src)
+    info = tarfile.TarInfo(arcname)
+    info.size = st.st_size
+    info.mode = st.st_mode & 0o7777 if mode is None else mode
+    info.mtime = int(st.st_mtime)
+    yield info.tobuf(format=tarfile.PAX_FORMAT)
+    sent = 0
+    with open(src, 'rb') as f:
+        while sent < info.size:
+            chunk = f.read(min(chunk_size, info.size - sent))
+            if not chunk:
+                break
+            sent += len(chunk)
+            yield chunk
+    if sent != info.size:
+        raise Exception(f"{src} was truncated while it was copied")
+    padding = -info.size % tarfile.BLOCKSIZE
+    if padding:
+        yield tarfile.NUL * padding
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Yields chunks compressed into a gzip stream, put_archive accepts it for a tar"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def copy_to_container(
+    container: Container, src: str, dst: str, chunk_size: int = COPY_CHUNK_SIZE, mode: Optional[int] = None
+) -> None:
+    """Copies the local file src to the absolute path dst in the container
+
+    The daemon creates the missing parent folders of dst while extracting.
+    The file is owned by root and gets the mode of src unless mode is given.
+    """
     if not os.path.exists(src):
         raise FileNotFoundError(f"Source file {src} can't be found")
-    # convert python bytes to hex string
-    with open(src, 'rb') as f:
-        data = f.read()
-    hexString = "".join(map(lambda x: "\\x" + x, data.hex(" ").split(" ")))
-    cmd = ["/bin/sh", "-c", f"/bin/echo -n -e '{hexString}' > {dst}"]
-    targetFolder = os.path.dirname(dst)
-    container.exec_run(f"mkdir -p '{targetFolder}'")
-    container.exec_run(cmd)
-    # if result.exit_code != 0:
-    #     logger.warning(f"Failed to copy {src} to {dst}, error message: {result.output.decode()}")
-    #     logger.warning("Down grading to put_archive")
-    #     with tarfile.open(src + '.tar', mode='w') as f:
-    #         f.add(src, arcname=os.path.basename(dst))
-    #     with  open(src + '.tar', 'rb') as f:
-    #         data = f.read()
-    #     container.put_archive(targetFolder, data)
+    if not dst.startswith('/'):
+        raise ValueError(f"Destination {dst} must be an absolute path")
+    if not container.put_archive('/', tar_stream(src, dst.lstrip('/'), chunk_size, mode)):
+        raise Exception(f"Failed to copy {src} to {dst}")
 
 def _rename_members(members, original, target):
     for member in members:
@@ -33,14 +142,283 @@ def _rename_members(members, original, target):
 
 def copy_from_container(container: Container, src: str, dst: str) -> None:
     # make sure target folder exists
-    targetFolder = os.path.dirname(dst)
+    targetFolder = os.path.dirname(dst) or "."
     if not os.path.exists(targetFolder):
         os.makedirs(targetFolder)
     bits, stat = container.get_archive(src)
-    with tempfile.NamedTemporaryFile('wb+', delete=False) as f:
-        for chunk in bits:
-            f.write(chunk)
-    with tarfile.open(f.name) as tar:
-        _rename_members(tar.getmembers(), os.path.basename(src), os.path.basename(dst))
-        # path参数指定解压到的目录
-        tar.extractall(path=targetFolder)
\ No newline at end of file
+    # the archive is extracted member by member while it's downloaded
+    with tarfile.open(fileobj=ChunkStream(bits), mode='r|') as tar:
+        for member in tar:
+            _rename_members([member], os.path.basename(src), os.path.basename(dst))
+            # path参数指定解压到的目录
+            tar.extract(member, path=targetFolder)
+
+
+def stream_file_from_container(container: Container, src: str, fileobj: IO[bytes]) -> int:
+    """Writes the content of the regular file src in the container into fileobj
+
+    Returns the number of bytes written.
+    """
+    bits, stat = container.get_archive(src)
+    with tarfile.open(fileobj=ChunkStream(bits), mode='r|') as tar:
+        member = tar.next()
+        if member is None or not member.isfile():
+            raise Exception(f"{src} is not a regular file")
+        shutil.copyfileobj(tar.extractfile(member), fileobj, COPY_CHUNK_SIZE)
+        return member.size
+
+
+def read_file_from_container(container: Container, src: str) -> bytes:
+    """Returns the content of the regular file src in the container"""
+    buf = io.BytesIO()
+    stream_file_from_container(container, src, buf)
+    return buf.getvalue()
+
+
+def can_half_close(sock: socket.socket) -> bool:
+    """Whether the stdin of an exec can be closed by shutting down its socket for writing
+
+    SSLSocket.shutdown drops the TLS layer, so the output read afterwards would
+    be raw TLS records. The sockets of a daemon reached over TLS can't be
+    half-closed.
+    """
+    return not isinstance(sock, ssl.SSLSocket)
+
+
+class _ExecFile(io.RawIOBase):
+    """A file over the socket of an exec started with stdin and without tty"""
+
+    def __init__(self, sock: socket.socket, exit_code: Callable[[], Optional[int]], name: str):
+        self._sock = sock
+        self._exit_code = exit_code
+        self.name = name
+        self._stderr: List[bytes] = []
+
+    def _check_exit_code(self) -> None:
+        code = self._exit_code()
+        if code:
+            message = b"".join(self._stderr).decode("utf8", errors="replace").strip()
+            raise Exception(message or f"Accessing {self.name} failed with exit code {code}")
+
+
+class ExecFileReader(_ExecFile):
+    """Reads the stdout of an exec like `cat FILE` sequentially
+
+    Only the output of the last recv is held in memory. Reaching the end of
+    the output raises an exception with the exec's stderr if it failed.
+    """
+
+    def __init__(self, sock: socket.socket, exit_code: Callable[[], Optional[int]], name: str):
+        super().__init__(sock, exit_code, name)
+        self._chunks: Deque[memoryview] = deque()
+        self._demuxer = StreamDemuxer(self._on_stdout, self._stderr.append, encoding=None)
+        self._eof = False
+
+    def _on_stdout(self, data: bytes) -> None:
+        self._chunks.append(memoryview(data))
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._chunks:
+            if self._eof:
+                return 0
+            if not self._demuxer.recv(self._sock):
+                self._eof = True
+                self._check_exit_code()
+        chunk = self._chunks[0]
+        n = min(len(b), len(chunk))
+        b[:n] = chunk[:n]
+        if n == len(chunk):
+            self._chunks.popleft()
+        else:
+            self._chunks[0] = chunk[n:]
+        return n
+
+    def close(self) -> None:
+        if not self.closed:
+            self._sock.close()
+        super().close()
+
+
+class ExecFileWriter(_ExecFile):
+    """Writes into the stdin of an exec running EXEC_WRITE_SCRIPT sequentially
+
+    Closing the file closes the stdin of the exec, waits for it to exit and
+    raises an exception with its stderr if it failed. The stdin of a TLS
+    socket can't be closed, then the data is spooled and sent after its size
+    on close.
+    """
+
+    def __init__(self, sock: socket.socket, exit_code: Callable[[], Optional[int]], name: str):
+        super().__init__(sock, exit_code, name)
+        self._spool: Optional[IO[bytes]] = None
+        if can_half_close(sock):
+            sock.sendall(b"-\n")
+        else:
+            self._spool = tempfile.SpooledTemporaryFile(max_size=COPY_CHUNK_SIZE)
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        if self._spool is not None:
+            self._spool.write(b)
+        else:
+            self._sock.sendall(b)
+        return len(b)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            if self._spool is None:
+                self._sock.shutdown(socket.SHUT_WR)
+            else:
+                spool = self._spool
+                self._sock.sendall(f"{spool.tell()}\n".encode())
+                spool.seek(0)
+                for chunk in iter(lambda: spool.read(COPY_CHUNK_SIZE), b""):
+                    self._sock.sendall(chunk)
+                spool.close()
+            demuxer = StreamDemuxer(self._stderr.append, self._stderr.append, encoding=None)
+            while demuxer.recv(self._sock):
+                pass
+            self._check_exit_code()
+        finally:
+            self._sock.close()
+            super().close()
+
+
+@dataclass
+class FileState:
+    size: int
+    mtime: int
+    sha256: Optional[str] = None
+
+
+@dataclass
+class SyncResult:
+    uploaded: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    unchanged: int = 0
+    bytes_sent: int = 0
+    elapsed: float = 0.0
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def local_manifest(src: str) -> Dict[str, FileState]:
+    """Returns the regular files below src by their relative posix path"""
+    files: Dict[str, FileState] = {}
+    for root, _, names in os.walk(src):
+        for name in names:
+            path = os.path.join(root, name)
+            if os.path.islink(path) or not os.path.isfile(path):
+                continue
+            st = os.stat(path)
+            rel = os.path.relpath(path, src).replace(os.sep, "/")
+            files[rel] = FileState(st.st_size, int(st.st_mtime))
+    return files
+
+
+def container_manifest(container: Container, dst: str, checksum: bool = False) -> Dict[str, FileState]:
+    """Returns the regular files below dst in the container with one exec
+
+    A missing dst has no files. With checksum the files are hashed as well.
+    """
+    result = container.exec_run(["sh", "-c", MANIFEST_SCRIPT, "sh", dst, "1" if checksum else "0"], user="root")
+    output = result.output.decode("utf8", errors="surrogateescape")
+    if result.exit_code != 0:
+        raise Exception(f"Can't list {dst} in the container: {output}")
+    files: Dict[str, FileState] = {}
+    lines = iter(output.splitlines())
+    for line in lines:
+        if line == "--":
+            break
+        size, mtime, path = line.split(" ", 2)
+        files[path[2:]] = FileState(int(size), int(mtime))
+    for line in lines:
+        digest, path = line.split("  ", 1)
+        if path[2:] in files:
+            files[path[2:]].sha256 = digest
+    return files
+
+
+def _rm_batches(paths: List[str]) -> Iterator[List[str]]:
+    batch: List[str] = []
+    size = 0
+    for path in paths:
+        if batch and size + len(path) + 1 > MAX_ARGUMENTS_SIZE:
+            yield batch
+            batch, size = [], 0
+        batch.append(path)
+        size += len(path) + 1
+    if batch:
+        yield batch
+
+
+def sync_to_container(
+    container: Container,
+    src: str,
+    dst: str,
+    checksum: bool = False,
+    delete: bool = False,
+    level: int = 6,
+    chunk_size: int = COPY_CHUNK_SIZE,
+) -> SyncResult:
+    """Makes the files below dst in the container match the local directory src
+
+    The files of both sides are listed, the container side with one exec, and
+    a file is sent when it's missing or its size differs. Otherwise it's sent
+    when its mtime differs, or with checksum when its sha256 differs. The
+    files are sent in one gzip compressed tar, which is built while it's
+    uploaded. With delete the files below dst which aren't in src are removed.
+    """
+    if not dst.startswith("/"):
+        raise ValueError(f"Destination {dst} must be an absolute path")
+    if not os.path.isdir(src):
+        raise FileNotFoundError(f"Source directory {src} can't be found")
+    start = time.monotonic()
+    result = SyncResult()
+    local = local_manifest(src)
+    remote = container_manifest(container, dst, checksum)
+    for rel, state in sorted(local.items()):
+        other = remote.get(rel)
+        if other is not None and other.size == state.size:
+            if checksum:
+                same = other.sha256 == _sha256(os.path.join(src, rel))
+            else:
+                same = other.mtime == state.mtime
+            if same:
+                result.unchanged += 1
+                continue
+        result.uploaded.append(rel)
+
+    if result.uploaded:
+        root = dst.strip("/")
+        files = [(os.path.join(src, rel), posixpath.join(root, rel)) for rel in result.uploaded]
+
+        def counted(chunks: Iterable[bytes]) -> Iterator[bytes]:
+            for chunk in chunks:
+                result.bytes_sent += len(chunk)
+                yield chunk
+
+        if not container.put_archive("/", counted(gzip_stream(tar_files_stream(files, chunk_size), level))):
+            raise Exception(f"Failed to copy {src} to {dst}")
+
+    if delete:
+        result.deleted = sorted(rel for rel in remote if rel not in local)
+        for batch in _rm_batches([posixpath.join(dst, rel) for rel in result.deleted]):
+            rm = container.exec_run(["rm", "-f", "--", *batch], user="root")
+            if rm.exit_code != 0:
+                raise Exception(rm.output.decode("utf8", errors="replace"))
+    result.elapsed = time.monotonic() - start
+    return result
@@ -1,2 +1,34 @@
+import os
+import stat
+import tempfile
+
+
 def removeprefix (s: str, prefix: str) -> str:
     return s[len(prefix):] if s.startswith(prefix) else s
+
+
+def user_temp_dir() -> str:
+    """Returns the temporary directory of the current user, see private_dir"""
+    name = "jupyterMagicCommands"
+    if hasattr(os, "getuid"):
+        name += f"-{os.getuid()}"
+    return os.path.join(tempfile.gettempdir(), name)
+
+
+def private_dir(path: str) -> str:
+    """Creates the directory path with mode 0700 if needed and returns it
+
+    Raises when path is a symlink, is owned by another user or is accessible
+    by others, because anyone who can write into it can change what's read
+    from it.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        raise Exception(f"{path} is not a directory")
+    if hasattr(os, "getuid"):
+        if st.st_uid != os.getuid():
+            raise Exception(f"{path} is owned by another user")
+        if st.st_mode & 0o077:
+            raise Exception(f"{path} is accessible by other users")
+    return path
@@ -5,4 +5,21 @@ def parse_logLevel(loglevel):
     numeric_level = getattr(logging, loglevel.upper(), None)
     if not isinstance(numeric_level, int):
         raise ValueError('Invalid log level: %s' % loglevel)
-    return numeric_level
\ No newline at end of file
+    return numeric_level
+
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+def parse_size(size):
+    """Parses sizes like 512, 64K, 10M or 1G (powers of 1024) into a number of bytes"""
+    s = str(size).strip().upper()
+    if s.endswith('B'):
+        s = s[:-1]
+    unit = s[-1:] if s[-1:] in _SIZE_UNITS else ''
+    number = s[:len(s) - len(unit)]
+    try:
+        value = float(number)
+    except ValueError:
+        raise ValueError('Invalid size: %s' % size)
+    if value < 0:
+        raise ValueError('Invalid size: %s' % size)
+    return int(value * _SIZE_UNITS[unit])
@@ -0,0 +1,134 @@
+import atexit
+import hashlib
+import os
+import stat
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+from jupyterMagicCommands.utils.general import private_dir, user_temp_dir
+from jupyterMagicCommands.utils.log import NULL_LOGGER
+
+
+class ScriptStore:
+    """Content addressed store for the scripts generated from cells
+
+    A script is saved under the sha256 of its content, so re-running a cell
+    reuses the existing file. Entries are garbage collected in least recently
+    used order once the store holds more than max_entries files or max_bytes
+    bytes. Entries used within the last min_age seconds are never collected
+    because a background job may not have opened its script yet.
+
+    The scripts are run, so the store is a directory only the current user
+    can access. It's checked on every lookup, and an existing file is only
+    reused when it's owned by the current user, isn't writable by others and
+    holds content.
+    """
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        suffix: str = ".sh",
+        max_entries: int = 512,
+        max_bytes: int = 64 * 1024 * 1024,
+        min_age: float = 60,
+        gc_interval: float = 300,
+        logger=NULL_LOGGER,
+    ):
+        # the directories which have to be private, from the outermost one
+        self._private_dirs = [root] if root else [user_temp_dir(), os.path.join(user_temp_dir(), "scripts")]
+        self.root = self._private_dirs[-1]
+        self.suffix = suffix
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.min_age = min_age
+        self.gc_interval = gc_interval
+        self.logger = logger
+        self.hits = 0
+        self.misses = 0
+        self.collected = 0
+        self._last_gc = time.time()
+        self._lock = threading.Lock()
+
+    def path_for(self, content: str, encoding: str = "utf8") -> str:
+        """Returns the path of a file holding content, writing it if needed"""
+        data = content.encode(encoding)
+        path = os.path.join(self.root, hashlib.sha256(data).hexdigest() + self.suffix)
+        with self._lock:
+            for directory in self._private_dirs:
+                private_dir(directory)
+            if self._holds(path, data):
+                self.hits += 1
+                # the modification time tracks the last use for the LRU order
+                os.utime(path)
+            else:
+                self.misses += 1
+                fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+        if time.time() - self._last_gc >= self.gc_interval:
+            self.gc()
+        return path
+
+    @staticmethod
+    def _holds(path: str, data: bytes) -> bool:
+        try:
+            fd = os.open(path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+        except OSError:
+            # missing, or a symlink
+            return False
+        with os.fdopen(fd, "rb") as f:
+            st = os.fstat(fd)
+            if not stat.S_ISREG(st.st_mode) or st.st_mode & 0o022:
+                return False
+            if hasattr(os, "getuid") and st.st_uid != os.getuid():
+                return False
+            return f.read(len(data) + 1) == data
+
+    def gc(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None) -> int:
+        """Removes the least recently used entries beyond the limits, returns how many were removed"""
+        max_entries = self.max_entries if max_entries is None else max_entries
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        with self._lock:
+            self._last_gc = time.time()
+            try:
+                names = os.listdir(self.root)
+            except FileNotFoundError:
+                return 0
+            entries = []
+            for name in names:
+                path = os.path.join(self.root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+            entries.sort(reverse=True)
+            now = time.time()
+            removed = 0
+            count = total = 0
+            for mtime, size, path in entries:
+                count += 1
+                total += size
+                if (count <= max_entries and total <= max_bytes) or now - mtime < self.min_age:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                removed += 1
+                count -= 1
+                total -= size
+            self.collected += removed
+        if removed:
+            self.logger.info(f"Removed {removed} scripts from {self.root}")
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "collected": self.collected}
+
+
+SCRIPT_STORE = ScriptStore()
+atexit.register(SCRIPT_STORE.gc)
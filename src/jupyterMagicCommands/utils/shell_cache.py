@@ -0,0 +1,92 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from jupyterMagicCommands.utils.general import private_dir, user_temp_dir
+from jupyterMagicCommands.utils.log import NULL_LOGGER
+
+CACHE_VERSION = 1
+
+
+class ShellCache:
+    """On-disk cache of the shells available in containers
+
+    Entries are keyed by container id and image id, so a container recreated
+    from a new image is detected again, and survive kernel restarts. The file
+    is read once per process and rewritten atomically on every change. Only
+    the max_entries most recently detected containers are kept. By default
+    the file is in the private directory of the current user, like the
+    scripts of the script store.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_entries: int = 256,
+        logger=NULL_LOGGER,
+    ):
+        self.path = path or os.path.join(user_temp_dir(), "shells.json")
+        self.max_entries = max_entries
+        self.logger = logger
+        self._entries: Optional[Dict[str, dict]] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(containerId: str, imageId: str) -> str:
+        return f"{containerId}@{imageId}"
+
+    def _load(self) -> Dict[str, dict]:
+        if self._entries is None:
+            self._entries = {}
+            try:
+                # a file others could have written isn't trusted
+                private_dir(os.path.dirname(self.path))
+                with open(self.path, encoding="utf8") as f:
+                    data = json.load(f)
+                if data.get("version") == CACHE_VERSION:
+                    self._entries = data["entries"]
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                self.logger.info(f"Ignoring invalid shell cache {self.path}: {e}")
+        return self._entries
+
+    def _save(self) -> None:
+        entries = self._load()
+        if len(entries) > self.max_entries:
+            newest = sorted(entries.items(), key=lambda item: item[1]["time"], reverse=True)
+            self._entries = entries = dict(newest[: self.max_entries])
+        try:
+            private_dir(os.path.dirname(self.path))
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf8") as f:
+                json.dump({"version": CACHE_VERSION, "entries": entries}, f)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            self.logger.info(f"Can't save the shell cache {self.path}: {e}")
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """Returns the shells of the container, or None when it wasn't detected yet"""
+        with self._lock:
+            entry = self._load().get(key)
+            return None if entry is None else list(entry["shells"])
+
+    def set(self, key: str, shells: List[str]) -> None:
+        with self._lock:
+            self._load()[key] = {"shells": list(shells), "time": time.time()}
+            self._save()
+
+    def invalidate(self, containerId: Optional[str] = None) -> None:
+        """Forgets the shells of a container, or of every container"""
+        with self._lock:
+            entries = self._load()
+            for key in list(entries):
+                if containerId is None or key.startswith(f"{containerId}@"):
+                    del entries[key]
+            self._save()
+
+
+SHELL_CACHE = ShellCache()
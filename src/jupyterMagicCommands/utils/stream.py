@@ -0,0 +1,217 @@
+import codecs
+import os
+import selectors
+import socket
+import struct
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# stream ids in the frame headers of docker's multiplexed streams
+STDOUT_STREAM = 1
+STDERR_STREAM = 2
+_FRAME_HEADER = struct.Struct(">BxxxL")
+
+StreamCallback = Callable[[str], None]
+
+
+class StreamReader:
+    """Reads file descriptors incrementally with a selector
+
+    Only the bytes that became available since the last poll are read, and they
+    are decoded with an incremental decoder per descriptor, so memory stays
+    bounded by the chunk size regardless of how much the child prints and
+    multi-byte characters split across reads are decoded correctly.
+    """
+
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE, encoding: str = "utf8"):
+        self.chunk_size = chunk_size
+        self.encoding = encoding
+        self.bytes_read = 0
+        self._selector = selectors.DefaultSelector()
+
+    def register(self, fd: int, callback: StreamCallback) -> None:
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
+        self._selector.register(fd, selectors.EVENT_READ, (callback, decoder))
+
+    @property
+    def finished(self) -> bool:
+        return not self._selector.get_map()
+
+    def poll(self, timeout: Optional[float] = None) -> int:
+        """Reads the descriptors which become ready within timeout seconds
+
+        Returns the number of bytes read. A descriptor is unregistered once it
+        reaches EOF.
+        """
+        n = 0
+        for key, _ in self._selector.select(timeout):
+            callback, decoder = key.data
+            try:
+                data = os.read(key.fd, self.chunk_size)
+            except OSError:
+                # the master side of a PTY raises EIO once the child is gone
+                data = b""
+            if not data:
+                self._selector.unregister(key.fd)
+                tail = decoder.decode(b"", final=True)
+                if tail:
+                    callback(tail)
+                continue
+            n += len(data)
+            text = decoder.decode(data)
+            if text:
+                callback(text)
+        self.bytes_read += n
+        return n
+
+    def close(self) -> None:
+        self._selector.close()
+
+
+class SentinelScanner:
+    """Forwards a stream to callback until a sentinel shows up
+
+    Text which could be the beginning of the sentinel is held back until it's
+    clear whether the sentinel follows, so the sentinel itself never reaches
+    the callback. Whatever comes after the sentinel is kept in trailer.
+    """
+
+    def __init__(self, sentinel: str, callback: StreamCallback):
+        self.sentinel = sentinel
+        self.callback = callback
+        self.found = False
+        self.trailer = ""
+        self._held = ""
+
+    def feed(self, s: str) -> None:
+        if self.found:
+            self.trailer += s
+            return
+        buf = self._held + s
+        i = buf.find(self.sentinel)
+        if i != -1:
+            if i:
+                self.callback(buf[:i])
+            self.found = True
+            self.trailer = buf[i + len(self.sentinel):]
+            self._held = ""
+            return
+        keep = 0
+        for k in range(min(len(self.sentinel) - 1, len(buf)), 0, -1):
+            if self.sentinel.startswith(buf[-k:]):
+                keep = k
+                break
+        if len(buf) > keep:
+            self.callback(buf[:len(buf) - keep])
+        self._held = buf[len(buf) - keep:]
+
+    def flush(self) -> None:
+        """Forwards the held back text, e.g. when the stream ended without sentinel"""
+        if self._held:
+            self.callback(self._held)
+            self._held = ""
+
+
+class StreamDemuxer:
+    """Splits the output socket of a docker exec into stdout and stderr
+
+    Without a TTY docker multiplexes both streams into frames of an 8 byte
+    header (stream, 3 reserved bytes, big endian payload length) and a
+    payload, see https://docs.docker.com/engine/api/v1.24/#attach-to-a-container.
+    With a TTY the socket carries the raw output.
+
+    Every recv reads up to buffer_size bytes into the same buffer and parses
+    all the frames it holds. Payloads are passed on as they arrive instead of
+    being assembled first, and consecutive payloads of a stream are decoded
+    together, so a frame costs no copy and no callback of its own. Each stream
+    has an incremental decoder, so characters split across frames or reads
+    are decoded correctly. With encoding=None the callbacks get the bytes.
+    """
+
+    def __init__(
+        self,
+        stdout: Callable,
+        stderr: Callable,
+        multiplexed: bool = True,
+        buffer_size: int = DEFAULT_CHUNK_SIZE,
+        encoding: Optional[str] = "utf8",
+    ):
+        self.callbacks: Dict[int, Callable] = {STDOUT_STREAM: stdout, STDERR_STREAM: stderr}
+        self.multiplexed = multiplexed
+        self.bytes_read = 0
+        self.frames = 0
+        self._decoders = {
+            stream: codecs.getincrementaldecoder(encoding)(errors="replace")
+            for stream in self.callbacks
+        } if encoding is not None else {}
+        self._buffer = memoryview(bytearray(buffer_size))
+        self._header = bytearray()
+        self._stream = STDOUT_STREAM
+        self._remaining = 0
+
+    def recv(self, sock: socket.socket) -> bool:
+        """Reads what the socket holds, returns False once it reached EOF"""
+        try:
+            n = sock.recv_into(self._buffer)
+        except (BlockingIOError, InterruptedError):
+            return True
+        if not n:
+            self.close()
+            return False
+        self.feed(self._buffer[:n])
+        return True
+
+    def feed(self, data: memoryview) -> None:
+        self.bytes_read += len(data)
+        if not self.multiplexed:
+            self._emit(STDOUT_STREAM, [data])
+            return
+        stream = self._stream
+        pending: List[memoryview] = []
+        pos, end = 0, len(data)
+        while pos < end:
+            if self._remaining == 0:
+                # a header, possibly split across reads
+                need = _FRAME_HEADER.size - len(self._header)
+                if not self._header and end - pos >= need:
+                    frame_stream, self._remaining = _FRAME_HEADER.unpack_from(data, pos)
+                    pos += need
+                else:
+                    self._header += data[pos:pos + need]
+                    pos += min(need, end - pos)
+                    if len(self._header) < _FRAME_HEADER.size:
+                        break
+                    frame_stream, self._remaining = _FRAME_HEADER.unpack(self._header)
+                    self._header.clear()
+                self.frames += 1
+                frame_stream = STDERR_STREAM if frame_stream == STDERR_STREAM else STDOUT_STREAM
+                if frame_stream != stream and pending:
+                    self._emit(stream, pending)
+                    pending = []
+                stream = frame_stream
+                continue
+            n = min(self._remaining, end - pos)
+            pending.append(data[pos:pos + n])
+            pos += n
+            self._remaining -= n
+        self._stream = stream
+        if pending:
+            self._emit(stream, pending)
+
+    def _emit(self, stream: int, chunks: List[memoryview]) -> None:
+        if not self._decoders:
+            # the buffer is reused by the next recv
+            self.callbacks[stream](b"".join(chunks))
+            return
+        data = chunks[0] if len(chunks) == 1 else b"".join(chunks)
+        text = self._decoders[stream].decode(data)
+        if text:
+            self.callbacks[stream](text)
+
+    def close(self) -> None:
+        """Passes on the bytes held back by the decoders"""
+        for stream, decoder in self._decoders.items():
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                self.callbacks[stream](tail)
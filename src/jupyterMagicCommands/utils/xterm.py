@@ -0,0 +1,126 @@
+import base64
+import time
+from typing import Callable, List
+
+from IPython.display import display
+
+template = """
+    <link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/xterm@4.5.0/css/xterm.css" />
+    <script src="https://cdn.jsdelivr.net/npm/xterm@4.5.0/lib/xterm.js"></script>
+    <div>
+    <div id="%(termName)s"></div>
+    <script>
+        // create an instance of terminal and attach it to window.
+        (function() {
+            var term = new Terminal(
+                {
+                    rows: %(rows)s
+                }
+            );
+            term.open(document.getElementById('%(termName)s'));
+            var last = 0;
+            window.%(termName)s = {
+                // data is a base64 encoded chunk of utf8, which xterm decodes
+                // itself, seq drops updates which are rendered twice
+                write: function(seq, data) {
+                    if (seq <= last) {
+                        return;
+                    }
+                    last = seq;
+                    var bin = atob(data);
+                    var bytes = new Uint8Array(bin.length);
+                    for (var i = 0; i < bin.length; i++) {
+                        bytes[i] = bin.charCodeAt(i);
+                    }
+                    term.write(bytes);
+                }
+            };
+        })();
+    </script>
+    </div>
+"""
+
+update_template = """<script>window.%(termName)s && window.%(termName)s.write(%(seq)d, "%(data)s");</script>"""
+
+
+class XtermTerminal:
+    """An xterm.js terminal in the output of a cell
+
+    Output is sent as base64 encoded deltas through a single display which is
+    updated in place, so the notebook only keeps the latest delta instead of a
+    script per tick, and the display is cleared when the terminal is closed.
+    Deltas are sent every interval seconds. The interval doubles up to
+    max_interval while the command prints a lot and halves back to
+    min_interval when it's quiet, so bursts are sent in a few large updates and
+    interactive output shows up quickly.
+    """
+
+    def __init__(
+        self,
+        rows: int = 10,
+        min_interval: float = 0.05,
+        max_interval: float = 0.5,
+        busy_size: int = 16 * 1024,
+        encoding: str = "utf8",
+        display: Callable = display,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rows = rows
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.busy_size = busy_size
+        self.encoding = encoding
+        self.display = display
+        self.clock = clock
+        self.termName = f"term_{time.strftime('%Y_%m_%d_%H_%M_%S')}_{id(self):x}"
+        self.seq = 0
+        self.bytes_sent = 0
+        self._pending: List[bytes] = []
+        self._last_flush = clock()
+        self._handle = None
+
+    def open(self) -> None:
+        self.display(
+            {"text/html": template % {"termName": self.termName, "rows": self.rows}},
+            raw=True,
+        )
+        self._handle = self.display({"text/html": "<div></div>"}, raw=True, display_id=True)
+
+    def write(self, s: str) -> None:
+        data = s.encode(self.encoding)
+        self._pending.append(data)
+
+    def handle_tick(self) -> None:
+        """Sends the pending output if the current interval has passed"""
+        if self._pending and self.clock() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self) -> None:
+        self._last_flush = self.clock()
+        if not self._pending:
+            self.interval = max(self.min_interval, self.interval / 2)
+            return
+        data = b"".join(self._pending)
+        self._pending.clear()
+        if len(data) >= self.busy_size:
+            self.interval = min(self.max_interval, self.interval * 2)
+        else:
+            self.interval = max(self.min_interval, self.interval / 2)
+        self.seq += 1
+        self.bytes_sent += len(data)
+        self._update(update_template % {
+            "termName": self.termName,
+            "seq": self.seq,
+            "data": base64.b64encode(data).decode("ascii"),
+        })
+
+    def _update(self, html: str) -> None:
+        if self._handle is not None:
+            self._handle.update({"text/html": html}, raw=True)
+
+    def close(self) -> None:
+        """Sends the rest of the output, then clears the update display"""
+        self.flush()
+        self._update("")
+        self._handle = None
@@ -0,0 +1,61 @@
+import asyncio
+import io
+from types import SimpleNamespace
+
+import pytest
+
+from jupyterMagicCommands.extensions._script_ext import READ_CHUNK_SIZE, MyScriptMagics
+
+
+@pytest.fixture
+def magics():
+    magics = MyScriptMagics(shell=None)
+    magics.shell = magics.actionDetector.shell = SimpleNamespace(user_ns={})
+    yield magics
+    magics.bg_processes = []
+
+
+class _CountingWriter(io.StringIO):
+
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, s):
+        self.writes += 1
+        return super().write(s)
+
+
+def _handle(magics, chunks, stream_arg=None, file_object=None):
+    async def run():
+        stream = asyncio.StreamReader()
+        for chunk in chunks:
+            stream.feed_data(chunk)
+        stream.feed_eof()
+        await magics._handle_stream(stream, stream_arg, file_object)
+    asyncio.run(run())
+
+
+class TestHandleStream:
+
+    def test_short_lines_are_written_in_blocks(self, magics):
+        out = _CountingWriter()
+        _handle(magics, [b"line\n" * 100000], file_object=out)
+        assert out.getvalue() == "line\n" * 100000
+        assert out.writes <= len("line\n" * 100000) // READ_CHUNK_SIZE + 1
+
+    def test_long_line_and_split_character(self, magics):
+        out = io.StringIO()
+        data = b"x" * (3 * READ_CHUNK_SIZE) + "é".encode("utf8") + b"\n"
+        _handle(magics, [data[:READ_CHUNK_SIZE + 1], data[READ_CHUNK_SIZE + 1:-2], data[-2:]], file_object=out)
+        assert out.getvalue() == "x" * (3 * READ_CHUNK_SIZE) + "é\n"
+
+    def test_actions_are_detected_across_chunks(self, magics):
+        out = io.StringIO()
+        _handle(magics, [b"a\n##jmc[action.setvar", b"iable variable=foo]bar\nb\n"], file_object=out)
+        assert magics.shell.user_ns["foo"] == "bar"
+        assert out.getvalue() == "a\n##jmc[action.setvariable variable=foo]bar\nb\n"
+
+    def test_out_variable_holds_the_whole_output(self, magics):
+        _handle(magics, [b"first\n", b"second\n"], stream_arg="out")
+        assert magics.shell.user_ns["out"] == "first\nsecond\n"
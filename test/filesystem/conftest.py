@@ -1,13 +1,22 @@
 import docker
 import pytest
 from IPython.core.interactiveshell import InteractiveShell
-from IPython.testing.globalipapp import get_ipython
+from IPython.testing import globalipapp
 
 from jupyterMagicCommands.filesystem.docker import DockerFileSystem
 from jupyterMagicCommands.filesystem.filesystem import FileSystem
 from jupyterMagicCommands.filesystem.Ifilesystem import IFileSystem
 from jupyterMagicCommands.outputters import (BasicFileSystemOutputterFactory,
                                              DockerFileSystemOutputterFactory)
+from jupyterMagicCommands.utils.shell_cache import SHELL_CACHE
+
+
+@pytest.fixture(autouse=True)
+def shell_cache(tmp_path, monkeypatch):
+    """Keeps the shells detected by the tests out of the user's cache"""
+    monkeypatch.setattr(SHELL_CACHE, "path", str(tmp_path / "shells.json"))
+    monkeypatch.setattr(SHELL_CACHE, "_entries", None)
+    return SHELL_CACHE
 
 @pytest.fixture(scope="module")
 def client():
@@ -41,7 +50,9 @@ def container(client, request):
 
 @pytest.fixture(scope="module")
 def ipython_shell() -> InteractiveShell:
-    return get_ipython()
+    # globalipapp.get_ipython is rebound to the real getter after the first call,
+    # the original function returns None on subsequent calls
+    return globalipapp.get_ipython()
 
 @pytest.fixture(scope="module")
 def dockerfs(container, ipython_shell) -> IFileSystem:
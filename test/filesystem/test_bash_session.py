@@ -0,0 +1,41 @@
+import pytest
+
+from jupyterMagicCommands.filesystem.filesystem import session_manager
+from jupyterMagicCommands.filesystem.Ifilesystem import IFileSystem
+from jupyterMagicCommands.session import BashSessionClosed
+
+
+@pytest.fixture
+def session_name():
+    name = "test-session"
+    yield name
+    session = session_manager.removeSession(name)
+    if session is not None:
+        session.close()
+
+
+class TestBashSession:
+    def test_variables_and_cwd_are_kept(self, basicfs: IFileSystem, session_name, tmp_path, capsys):
+        basicfs.system(f"export FOO=bar; cd '{tmp_path}'", session=session_name)
+        basicfs.system("echo $FOO; pwd", session=session_name)
+        captured = capsys.readouterr()
+        assert captured.out == f"bar\n{tmp_path}\n"
+
+    def test_stderr_and_exit_code(self, basicfs: IFileSystem, session_name, capsys):
+        basicfs.system("echo err >&2; false", session=session_name)
+        captured = capsys.readouterr()
+        assert captured.out == ""
+        assert captured.err == f"err\nSession '{session_name}': exit code 1\n"
+        assert session_manager.getSession(session_name).last_exit_code == 1
+
+    def test_output_without_trailing_newline(self, basicfs: IFileSystem, session_name, capsys):
+        basicfs.system("printf abc", session=session_name)
+        captured = capsys.readouterr()
+        assert captured.out == "abc"
+
+    def test_exit_closes_the_session(self, basicfs: IFileSystem, session_name, capsys):
+        with pytest.raises(BashSessionClosed):
+            basicfs.system("exit 3", session=session_name)
+        assert session_manager.getSession(session_name) is None
+        basicfs.system("echo again", session=session_name)
+        assert capsys.readouterr().out == "again\n"
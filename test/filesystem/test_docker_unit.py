@@ -1,6 +1,30 @@
+import io
+import itertools
+import os
+import shlex
+import socket
+import ssl
+import struct
+import subprocess
+import threading
+import time
+from socket import SHUT_RDWR, socketpair
+import tarfile
 from unittest.mock import MagicMock, patch
 import pytest
-from jupyterMagicCommands.filesystem.docker import DockerFileSystem
+from docker.models.containers import ExecResult
+from jupyterMagicCommands.filesystem import docker as docker_module
+from jupyterMagicCommands.filesystem.docker import (MAX_INLINE_SCRIPT_SIZE, DockerFileSystem,
+                                                   close_idle_docker_sessions,
+                                                   docker_session_manager)
+from jupyterMagicCommands.jobs import JobRegistry
+from jupyterMagicCommands.session import DockerSessionClosed
+from jupyterMagicCommands.filesystem.workdir_preparation import (
+    WORKDIR_ERROR_EXIT_CODE, WorkdirErrorFilter, WorkdirPreparation)
+from jupyterMagicCommands.utils.shell_cache import ShellCache
+from jupyterMagicCommands.utils.docker import (ChunkStream, copy_from_container, copy_to_container,
+                                               read_file_from_container, sync_to_container,
+                                               tar_stream)
 
 
 def _make_dockerfs():
@@ -24,13 +48,815 @@ class TestDockerIsDir:
         container.exec_run.return_value = MagicMock(exit_code=0, output=b"f\n")
         assert fs.is_dir("/some/file") is False
 
-    def test_is_dir_strips_whitespace(self):
+    def test_is_dir_raises_for_missing_path(self):
         fs, container = _make_dockerfs()
-        container.exec_run.return_value = MagicMock(exit_code=0, output=b"  d  \n")
-        assert fs.is_dir("/some/dir") is True
+        container.exec_run.return_value = MagicMock(exit_code=0, output=b"-\n")
+        with pytest.raises(Exception, match="doesn't exist"):
+            fs.is_dir("/missing")
 
     def test_is_dir_raises_on_nonzero_exit_code(self):
         fs, container = _make_dockerfs()
         container.exec_run.return_value = MagicMock(exit_code=1, output=b"error msg\n")
         with pytest.raises(Exception, match="error msg"):
             fs.is_dir("/bad/path")
+
+
+class _LocalContainer:
+    """Runs the execs on the host, so the probes see a real file system"""
+
+    def __init__(self):
+        self.commands = []
+        self.users = []
+
+    def exec_run(self, cmd, workdir="/", user="", **kwargs):
+        self.commands.append(cmd)
+        self.users.append(user)
+        if isinstance(cmd, str):
+            cmd = ["sh", "-c", cmd]
+        p = subprocess.run(cmd, cwd=workdir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        return MagicMock(exit_code=p.returncode, output=p.stdout)
+
+
+class TestDockerStatCache:
+
+    def _fs(self, tmp_path):
+        container = _LocalContainer()
+        return DockerFileSystem(container, MagicMock(), workdir=str(tmp_path)), container  # type: ignore
+
+    def test_prefetch_answers_metadata_with_one_exec(self, tmp_path):
+        (tmp_path / "dir").mkdir()
+        (tmp_path / "file").write_text("")
+        fs, _ = self._fs(tmp_path)
+        fs.prefetch(["dir", "file", "missing"])
+        assert fs.getcwd() == str(tmp_path)
+        assert fs.exists("dir") and fs.is_dir("dir")
+        assert fs.exists("file") and not fs.is_dir("file")
+        assert not fs.exists(str(tmp_path / "missing"))
+        fs.chdir("dir")
+        assert fs.getcwd() == str(tmp_path / "dir")
+        assert fs.exec_count == 1
+
+    def test_makedirs_and_remove_update_the_cache(self, tmp_path):
+        fs, _ = self._fs(tmp_path)
+        fs.makedirs("a/b")
+        assert fs.is_dir("a") and fs.is_dir("a/b")
+        fs.remove("a")
+        assert not fs.exists("a/b")
+        assert not (tmp_path / "a").exists()
+        assert fs.exec_count == 2
+
+    def test_metadata_execs_run_as_root(self, tmp_path):
+        fs, container = self._fs(tmp_path)
+        fs.makedirs("a")
+        fs.invalidate_cache()
+        assert fs.exists("a")
+        fs.remove("a")
+        assert container.users == ["root"] * 3
+
+    def test_invalidate_cache(self, tmp_path):
+        fs, _ = self._fs(tmp_path)
+        assert not fs.exists("later")
+        (tmp_path / "later").mkdir()
+        assert not fs.exists("later")
+        fs.invalidate_cache()
+        assert fs.exists("later")
+        assert fs.exec_count == 2
+
+    def test_paths_are_passed_as_arguments(self, tmp_path):
+        (tmp_path / "it's a dir").mkdir()
+        fs, _ = self._fs(tmp_path)
+        assert fs.is_dir("it's a dir")
+
+
+class TestDockerScriptCopy:
+
+    def test_same_script_is_copied_once(self):
+        fs, container = _make_dockerfs()
+        fs.copy_to_container = MagicMock()
+        fs._render_command("echo same")
+        fs._render_command("echo same")
+        fs._render_command("echo other")
+        assert fs.copy_to_container.call_count == 2
+
+    def test_small_detached_scripts_are_inlined(self):
+        fs, container = _make_dockerfs()
+        fs._default_shell, fs._default_shell_checked = "bash", True
+        fs.copy_to_container = MagicMock()
+        script = "echo \"it's\""
+        fs._execute_cmd(script, outFile="out.log", detach=True)
+        cmd = container.exec_run.call_args[0][0]
+        assert cmd[:2] == ["bash", "-c"] and f"bash -c {shlex.quote(script)} 1>out.log" in cmd[2]
+        fs._execute_cmd("#" * (MAX_INLINE_SCRIPT_SIZE + 1), outFile="out.log", detach=True)
+        assert fs.copy_to_container.call_count == 1
+
+
+def _archive(files, chunk_size=100):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    data = buf.getvalue()
+    return (data[i:i + chunk_size] for i in range(0, len(data), chunk_size))
+
+
+class TestDockerShellDetection:
+
+    def _container(self, image="sha256:1", exit_code=0, output=b"sh\n"):
+        container = MagicMock()
+        container.id = "abc"
+        container.attrs = {"Image": image}
+        container.exec_run.return_value = MagicMock(exit_code=exit_code, output=output)
+        return container
+
+    def test_single_probe_reports_all_shells(self, shell_cache):
+        container = self._container(output=b"bash\nsh\n")
+        fs = DockerFileSystem(container, MagicMock())
+        assert fs.default_shell == "bash"
+        assert fs.exec_count == 1
+        assert container.exec_run.call_args[0][0][:2] == ["sh", "-c"]
+        assert shell_cache.get(ShellCache.key("abc", "sha256:1")) == ["bash", "sh"]
+
+    def test_detection_is_cached_per_container_and_image(self, shell_cache):
+        DockerFileSystem(self._container(), MagicMock()).default_shell
+        shell_cache._entries = None  # as in a restarted kernel
+        fs = DockerFileSystem(self._container(), MagicMock())
+        assert fs.default_shell == "sh"
+        assert fs.exec_count == 0
+        fs = DockerFileSystem(self._container(image="sha256:2"), MagicMock())
+        assert fs.default_shell == "sh"
+        assert fs.exec_count == 1
+
+    def test_falls_back_to_running_the_shells_without_sh(self):
+        container = self._container(exit_code=127, output=b"")
+        container.exec_run.side_effect = lambda cmd, **kwargs: MagicMock(
+            exit_code=0 if cmd == "bash" else 127, output=b"")
+        fs = DockerFileSystem(container, MagicMock())
+        assert fs.default_shell == "bash"
+
+    def test_no_shell(self, shell_cache):
+        fs = DockerFileSystem(self._container(exit_code=127, output=b""), MagicMock())
+        assert fs.default_shell is None
+        # the container may get a shell later
+        assert shell_cache.get(ShellCache.key("abc", "sha256:1")) is None
+
+    def test_cached_shell_which_fails_is_detected_again(self, shell_cache):
+        key = ShellCache.key("abc", "sha256:1")
+        shell_cache.set(key, ["bash", "sh"])
+        fs = DockerFileSystem(self._container(output=b"sh\n"), MagicMock())
+        fs._start_command = MagicMock(return_value=("id", None))
+        fs._handle_socket = MagicMock(return_value=False)
+        fs._exit_code = MagicMock(return_value=127)
+        assert fs.default_shell == "bash"
+        assert fs.execute("true", MagicMock()) == 127
+        assert shell_cache.get(key) is None
+        assert fs.default_shell == "sh"
+        assert shell_cache.get(key) == ["sh"]
+        # a probed shell is trusted, the exit code is the command's
+        assert fs.execute("missing-command", MagicMock()) == 127
+        assert shell_cache.get(key) == ["sh"]
+
+
+class _ArchiveContainer:
+    """Stands in for a container and extracts what put_archive receives"""
+
+    def __init__(self, files=None):
+        self.archives = []
+        self.files = files or {}
+
+    def get_archive(self, path):
+        name = os.path.basename(path)
+        files = {k: v for k, v in self.files.items() if k == name or k.startswith(name + "/")}
+        return _archive(files), {}
+
+    def put_archive(self, path, data):
+        stream = b"".join(data)
+        with tarfile.open(fileobj=io.BytesIO(stream)) as tar:
+            members = {m.name: (m.mode, tar.extractfile(m).read()) for m in tar.getmembers()}
+        self.archives.append((path, members))
+        return True
+
+
+class TestCopyToContainer:
+
+    def test_streams_a_tar_archive(self, tmp_path):
+        src = tmp_path / "script.sh"
+        src.write_bytes(b"echo hello\n" * 1000)
+        os.chmod(src, 0o750)
+        container = _ArchiveContainer()
+        copy_to_container(container, str(src), "/opt/scripts/run.sh", chunk_size=100)  # type: ignore
+        assert container.archives == [("/", {"opt/scripts/run.sh": (0o750, b"echo hello\n" * 1000)})]
+
+    def test_archive_is_block_aligned(self, tmp_path):
+        src = tmp_path / "a.txt"
+        src.write_bytes(b"x" * 700)
+        chunks = list(tar_stream(str(src), "a.txt", chunk_size=256))
+        assert max(len(c) for c in chunks) <= 1024
+        assert sum(len(c) for c in chunks) % tarfile.BLOCKSIZE == 0
+
+    def test_missing_source(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            copy_to_container(_ArchiveContainer(), str(tmp_path / "missing"), "/x")  # type: ignore
+
+    def test_failed_put_archive_raises(self, tmp_path):
+        src = tmp_path / "a.txt"
+        src.write_text("a")
+        container = MagicMock()
+        container.put_archive.return_value = False
+        with pytest.raises(Exception, match="Failed to copy"):
+            copy_to_container(container, str(src), "/a.txt")
+
+    def test_relative_destination_is_under_workdir(self, tmp_path):
+        src = tmp_path / "a.txt"
+        src.write_text("a")
+        container = _ArchiveContainer()
+        fs = DockerFileSystem(container, MagicMock(), workdir="/work")  # type: ignore
+        fs.copy_to_container(str(src), "data/a.txt")
+        assert list(container.archives[0][1]) == ["work/data/a.txt"]
+
+
+class TestCopyFromContainer:
+
+    def test_chunk_stream_reads_across_chunks(self):
+        stream = io.BufferedReader(ChunkStream([b"ab", b"", b"cde", b"f"]))
+        assert stream.read(4) == b"abcd"
+        assert stream.read() == b"ef"
+        assert stream.read(1) == b""
+
+    def test_extracts_and_renames(self, tmp_path):
+        container = _ArchiveContainer({"out/a.txt": b"a" * 1000, "out/b.txt": b"b"})
+        copy_from_container(container, "/work/out", str(tmp_path / "local"))  # type: ignore
+        assert (tmp_path / "local" / "a.txt").read_bytes() == b"a" * 1000
+        assert (tmp_path / "local" / "b.txt").read_bytes() == b"b"
+
+    def test_read_file(self):
+        container = _ArchiveContainer({"a.txt": b"hello" * 100})
+        assert read_file_from_container(container, "/a.txt") == b"hello" * 100  # type: ignore
+
+    def test_read_directory_raises(self):
+        container = _ArchiveContainer()
+        container.get_archive = lambda path: (_directory_archive(), {})
+        with pytest.raises(Exception, match="not a regular file"):
+            read_file_from_container(container, "/dir")  # type: ignore
+
+
+def _directory_archive():
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        info = tarfile.TarInfo("dir")
+        info.type = tarfile.DIRTYPE
+        tar.addfile(info)
+    yield buf.getvalue()
+
+
+class _LocalExecApi:
+    """Runs the execs of exec_create/exec_start(socket=True) on the host
+
+    The output is sent through a socketpair in docker's multiplexed frames,
+    and stdin is closed when the client shuts down its write side. With tls
+    the client's end looks like an SSLSocket, like for a daemon over TLS.
+    """
+
+    def __init__(self, tls=False):
+        self.commands = []
+        self.sockets = []
+        self.tls = tls
+        self._execs = {}
+
+    def exec_create(self, container, cmd, workdir="/", **kwargs):
+        exec_id = str(len(self.commands))
+        self.commands.append(cmd)
+        self._execs[exec_id] = (cmd, workdir)
+        return {"Id": exec_id}
+
+    def exec_start(self, exec_id, tty=False, socket=False, detach=False):
+        cmd, workdir = self._execs[exec_id]
+        ours, theirs = socketpair()
+        p = subprocess.Popen(cmd, cwd=workdir, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._execs[exec_id] = p
+        lock = threading.Lock()
+
+        def pump_stdin():
+            try:
+                for data in iter(lambda: ours.recv(65536), b""):
+                    p.stdin.write(data)
+                    p.stdin.flush()
+                p.stdin.close()
+            except (BrokenPipeError, OSError):
+                pass
+
+        def pump(pipe, stream):
+            for data in iter(lambda: pipe.read1(65536), b""):
+                with lock:
+                    ours.sendall(struct.pack(">BxxxL", stream, len(data)) + data)
+
+        def run():
+            threads = [threading.Thread(target=pump, args=(p.stdout, 1)), threading.Thread(target=pump, args=(p.stderr, 2))]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            p.wait()
+            # wakes up the stdin pump and sends the EOF
+            ours.shutdown(SHUT_RDWR)
+            ours.close()
+
+        threading.Thread(target=pump_stdin, daemon=True).start()
+        threading.Thread(target=run, daemon=True).start()
+        if self.tls:
+            theirs = MagicMock(spec=ssl.SSLSocket, wraps=theirs)
+        self.sockets.append(theirs)
+        return MagicMock(_sock=theirs)
+
+    def exec_inspect(self, exec_id):
+        p = self._execs[exec_id]
+        return {"Running": p.poll() is None, "ExitCode": p.returncode}
+
+
+def _make_streaming_dockerfs(tmp_path, tls=False):
+    container = MagicMock()
+    container.client.api = _LocalExecApi(tls)
+    container.exec_run.side_effect = lambda cmd, **kwargs: ExecResult(
+        *(lambda p: (p.returncode, p.stdout))(subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT))
+    )
+    return DockerFileSystem(container, MagicMock(), workdir=str(tmp_path)), container.client.api
+
+
+class TestDockerOpen:
+
+    def test_read_mode_streams_from_cat(self, tmp_path):
+        (tmp_path / "a.txt").write_bytes("héllo".encode("utf8"))
+        fs, api = _make_streaming_dockerfs(tmp_path)
+        with fs.open("a.txt", "r") as f:
+            assert f.read() == "héllo"
+        with fs.open("a.txt", "rb") as f:
+            assert f.read(2) == "h".encode("utf8") + "é".encode("utf8")[:1]
+            assert f.read() == "é".encode("utf8")[1:] + b"llo"
+        assert api.commands[0] == ["cat", "--", str(tmp_path / "a.txt")]
+
+    def test_read_missing_file_raises(self, tmp_path):
+        fs, _ = _make_streaming_dockerfs(tmp_path)
+        with pytest.raises(Exception, match="No such file"):
+            with fs.open("missing.txt", "r") as f:
+                f.read()
+
+    def test_write_modes_stream_into_cat(self, tmp_path):
+        fs, api = _make_streaming_dockerfs(tmp_path)
+        data = os.urandom(3 * 1024 * 1024)
+        with fs.open("a.bin", "wb") as f:
+            for i in range(0, len(data), 100000):
+                f.write(data[i:i + 100000])
+        assert (tmp_path / "a.bin").read_bytes() == data
+        with fs.open("a.txt", "w") as f:
+            f.write("hello")
+        with fs.open("a.txt", "a") as f:
+            f.write(" wörld")
+        assert (tmp_path / "a.txt").read_text() == "hello wörld"
+        assert fs.exists("a.txt")
+        assert len(api.commands) == 3
+
+    def test_tls_writes_are_sent_after_their_size(self, tmp_path):
+        (tmp_path / "a.txt").write_text("old")
+        fs, api = _make_streaming_dockerfs(tmp_path, tls=True)
+        data = os.urandom(3 * 1024 * 1024)
+        with fs.open("a.bin", "wb") as f:
+            f.write(data)
+        with fs.open("a.txt", "a") as f:
+            f.write(" and new")
+        with fs.open("empty.txt", "w"):
+            pass
+        assert (tmp_path / "a.bin").read_bytes() == data
+        assert (tmp_path / "a.txt").read_text() == "old and new"
+        assert (tmp_path / "empty.txt").read_text() == ""
+        for sock in api.sockets:
+            sock.shutdown.assert_not_called()
+
+    def test_exclusive_mode_fails_for_existing_file(self, tmp_path):
+        (tmp_path / "a.txt").write_text("old")
+        fs, _ = _make_streaming_dockerfs(tmp_path)
+        with pytest.raises(Exception, match="exist"):
+            with fs.open("a.txt", "x") as f:
+                f.write("new")
+        assert (tmp_path / "a.txt").read_text() == "old"
+
+    def test_write_into_missing_directory_raises(self, tmp_path):
+        fs, _ = _make_streaming_dockerfs(tmp_path)
+        with pytest.raises(Exception, match="No such file or directory|nonexistent"):
+            with fs.open("missing/a.txt", "w") as f:
+                f.write("hello")
+
+    def test_update_mode_writes_the_whole_file_through_cat(self, tmp_path):
+        (tmp_path / "a.txt").write_text("old content")
+        os.chmod(tmp_path / "a.txt", 0o640)
+        fs, api = _make_streaming_dockerfs(tmp_path)
+        with fs.open("a.txt", "w+") as f:
+            f.write("hello")
+            f.seek(0)
+            assert f.read() == "hello"
+        with fs.open("b.txt", "w+") as f:
+            f.write("new")
+        assert (tmp_path / "a.txt").read_text() == "hello"
+        # an existing file keeps its mode, a new one gets it from the umask
+        assert os.stat(tmp_path / "a.txt").st_mode & 0o777 == 0o640
+        umask = os.umask(0)
+        os.umask(umask)
+        assert os.stat(tmp_path / "b.txt").st_mode & 0o777 == 0o666 & ~umask
+        assert api.commands[0][:2] == ["sh", "-c"] and fs.exists("b.txt")
+
+    def test_scripts_are_readable_in_the_container(self):
+        container = _ArchiveContainer()
+        fs = DockerFileSystem(container, MagicMock())  # type: ignore
+        fs._default_shell, fs._default_shell_checked = "bash", True
+        fs._render_command("#" * (MAX_INLINE_SCRIPT_SIZE + 1))
+        [(_, members)] = container.archives
+        assert [mode for mode, _ in members.values()] == [0o644]
+
+
+class TestBashExtensionExecs:
+
+    def test_workdir_preparation_is_deferred(self, tmp_path):
+        from jupyterMagicCommands.extensions.bash_ext import BashExtension, get_args
+        container = _LocalContainer()
+        fs = DockerFileSystem(container, MagicMock(), workdir=str(tmp_path))  # type: ignore
+        args = get_args("-d new/dir --create")
+        deferred = []
+        with patch("jupyterMagicCommands.extensions.bash_ext.executeCmd") as executeCmd:
+            executeCmd.side_effect = lambda *a, **kw: deferred.append(fs._deferred_preparation)
+            BashExtension(args, fs, "true", MagicMock(), shell=MagicMock()).run()
+        assert deferred == [WorkdirPreparation("new/dir", create=True)]
+        assert fs._deferred_preparation is None
+        assert fs.getcwd() == str(tmp_path)
+        assert fs.exec_count == 0
+
+
+class TestFusedWorkdirPreparation:
+
+    def _run(self, tmp_path, preparation):
+        p = subprocess.run(["sh", "-c", preparation.render() + "\npwd"], cwd=tmp_path,
+                           stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return p.returncode, p.stdout.decode().strip(), p.stderr.decode()
+
+    def test_create(self, tmp_path):
+        assert self._run(tmp_path, WorkdirPreparation("a b/c", create=True))[:2] == (0, str(tmp_path / "a b" / "c"))
+
+    def test_init_empties_the_directory(self, tmp_path):
+        (tmp_path / "d").mkdir()
+        (tmp_path / "d" / "old").write_text("")
+        assert self._run(tmp_path, WorkdirPreparation("d", create=True, init=True))[0] == 0
+        assert list((tmp_path / "d").iterdir()) == []
+
+    def test_missing_directory(self, tmp_path):
+        preparation = WorkdirPreparation("missing")
+        returncode, _, err = self._run(tmp_path, preparation)
+        assert returncode == WORKDIR_ERROR_EXIT_CODE
+        assert err == preparation.marker + "\n"
+
+    def test_markers_are_unique(self):
+        assert WorkdirPreparation("a").marker != WorkdirPreparation("a").marker
+
+    def test_system_raises_the_error_of_the_preparation(self):
+        fs, container = _make_dockerfs()
+        fs._default_shell, fs._default_shell_checked = "bash", True
+        fs.copy_to_container = MagicMock()
+        fs._handle_socket = MagicMock(return_value=True)
+        container.client.api.exec_create.return_value = {"Id": "abc"}
+        fs.defer_workdir_preparation(WorkdirPreparation("missing"))
+        with pytest.raises(Exception, match="Accessing non existing working directory: missing"):
+            fs.system("echo hello")
+        cmd = container.client.api.exec_create.call_args[0][1]
+        assert cmd == ["bash", "-s"]
+        sock = container.client.api.exec_start.return_value._sock
+        assert sock.sendall.call_args[0][0].startswith(b"cd -- missing")
+        assert fs.exec_count == 1
+        fs.copy_to_container.assert_not_called()
+        assert fs._deferred_preparation is None
+
+    def test_execute_reports_the_missing_directory_out_of_band(self, tmp_path):
+        fs, _ = _make_streaming_dockerfs(tmp_path)
+        fs._default_shell, fs._default_shell_checked = "sh", True
+        outputter = MagicMock()
+        with pytest.raises(Exception, match="Accessing non existing working directory: missing"):
+            fs.execute("echo hello", outputter, preparation=WorkdirPreparation("missing"))
+        outputter.write.assert_not_called()
+        outputter.write_err.assert_not_called()
+
+    def test_a_script_exiting_with_the_same_code_is_not_an_error(self, tmp_path):
+        fs, _ = _make_streaming_dockerfs(tmp_path)
+        fs._default_shell, fs._default_shell_checked = "sh", True
+        (tmp_path / "d").mkdir()
+        outputter = MagicMock()
+        cmd = f"echo oops >&2; exit {WORKDIR_ERROR_EXIT_CODE}"
+        assert fs.execute(cmd, outputter, preparation=WorkdirPreparation("d")) == WORKDIR_ERROR_EXIT_CODE
+        assert "".join(c.args[0] for c in outputter.write_err.call_args_list) == "oops\n"
+
+
+class TestWorkdirErrorFilter:
+
+    def _feed(self, chunks):
+        written = []
+        errorFilter = WorkdirErrorFilter("__marker__", written.append)
+        for chunk in chunks:
+            errorFilter(chunk)
+        errorFilter.flush()
+        return errorFilter.failed, "".join(written)
+
+    def test_marker_split_across_chunks(self):
+        assert self._feed(["__ma", "rker", "__", "\nrest"]) == (True, "rest")
+
+    def test_tty_line_ending(self):
+        assert self._feed(["__marker__\r", "\n"]) == (True, "")
+
+    def test_other_output_is_forwarded(self):
+        assert self._feed(["__ma", "ybe\n", "__marker__\n"]) == (False, "__maybe\n__marker__\n")
+        assert self._feed(["__marker__x\n"]) == (False, "__marker__x\n")
+        assert self._feed(["__mar"]) == (False, "__mar")
+
+
+class TestDockerHandleSocket:
+
+    def _run(self, data, tty):
+        a, b = socket.socketpair()
+        a.sendall(data)
+        a.close()
+        fs, _ = _make_dockerfs()
+        outputter = MagicMock()
+        fs._handle_socket(ExecResult(None, MagicMock(_sock=b)), outputter, tty=tty)
+        out = "".join(c.args[0] for c in outputter.write.call_args_list)
+        err = "".join(c.args[0] for c in outputter.write_err.call_args_list)
+        return out, err
+
+    def test_multiplexed_frames(self):
+        payload = "ünïcode".encode("utf8")
+        data = b"".join(
+            struct.pack(">BxxxL", 1, 1) + payload[i:i + 1] for i in range(len(payload))
+        ) + struct.pack(">BxxxL", 2, 3) + b"err"
+        assert self._run(data, tty=False) == ("ünïcode", "err")
+
+    def test_tty(self):
+        assert self._run("ünïcode".encode("utf8") * 1000, tty=True) == ("ünïcode" * 1000, "")
+
+
+class TestDockerExecute:
+
+    def test_script_is_fed_over_stdin(self, tmp_path):
+        fs, api = _make_streaming_dockerfs(tmp_path)
+        fs._default_shell, fs._default_shell_checked = "sh", True
+        fs.copy_to_container = MagicMock()
+        outputter = MagicMock()
+        # the script isn't read by the commands, they get EOF
+        assert fs.execute("read x || echo eof\necho \"got $x\"\ncat\necho done", outputter) == 0
+        assert "".join(c.args[0] for c in outputter.write.call_args_list) == "eof\ngot \ndone\n"
+        assert api.commands == [["sh", "-s"]]
+        fs.copy_to_container.assert_not_called()
+
+    def test_tls_socket_runs_a_copied_script(self, tmp_path):
+        fs, api = _make_streaming_dockerfs(tmp_path, tls=True)
+        fs._default_shell, fs._default_shell_checked = "sh", True
+        # the container shares the host's files, the script is already there
+        fs.copy_to_container = MagicMock()
+        outputter = MagicMock()
+        assert fs.execute("read x || echo eof\ncat\necho done; exit 3", outputter) == 3
+        assert "".join(c.args[0] for c in outputter.write.call_args_list) == "eof\ndone\n"
+        assert api.commands == [["sh", "-s"]]
+        fs.copy_to_container.assert_called_once()
+        api.sockets[0].shutdown.assert_not_called()
+
+    def test_interactive_runs_a_copied_script(self):
+        fs, container = _make_dockerfs()
+        fs._default_shell, fs._default_shell_checked = "bash", True
+        fs.copy_to_container = MagicMock()
+        container.client.api.exec_create.return_value = {"Id": "abc"}
+        fs._start_command("echo hi", tty=True)
+        cmd = container.client.api.exec_create.call_args[0][1]
+        assert cmd[:2] == ["bash", "-c"] and cmd[2].endswith(fs.copy_to_container.call_args[0][1])
+
+    def test_returns_the_exit_code(self, tmp_path):
+        fs, _ = _make_streaming_dockerfs(tmp_path)
+        fs._default_shell, fs._default_shell_checked = "sh", True
+        outputter = MagicMock()
+        assert fs.execute("echo hello; echo oops >&2; exit 3", outputter) == 3
+        assert "".join(c.args[0] for c in outputter.write.call_args_list) == "hello\n"
+        assert "".join(c.args[0] for c in outputter.write_err.call_args_list) == "oops\n"
+        outputter.close.assert_called_once()
+
+
+class TestDockerSession:
+
+    @pytest.fixture
+    def session_fs(self, tmp_path):
+        fs, api = _make_streaming_dockerfs(tmp_path)
+        fs.container.id = "abc"
+        fs.container.attrs = {"State": {"StartedAt": "t0"}}
+        fs._default_shell, fs._default_shell_checked = "bash", True
+        yield fs, api
+        for key, session in list(docker_session_manager.sessions.items()):
+            docker_session_manager.removeSession(key)
+            session.close()
+
+    def _run(self, fs, cmd, session="s"):
+        outputter = MagicMock()
+        fs.outputterFactory.create_outputter.return_value = outputter
+        fs.system(cmd, session=session)
+        out = "".join(c.args[0] for c in outputter.write.call_args_list)
+        err = "".join(c.args[0] for c in outputter.write_err.call_args_list)
+        return out, err
+
+    def test_state_is_kept_in_one_exec(self, session_fs, tmp_path):
+        fs, api = session_fs
+        self._run(fs, f"export FOO=bar; cd '{tmp_path}'")
+        assert self._run(fs, "echo $FOO; pwd") == (f"bar\n{tmp_path}\n", "")
+        assert api.commands == [["bash", "-s"]]
+
+    def test_exit_codes_and_errors(self, session_fs, capsys):
+        fs, _ = session_fs
+        assert self._run(fs, "echo err >&2; false") == ("", "err\n")
+        assert docker_session_manager.getSession("abc:s").last_exit_code == 1
+        assert "Session 's': exit code 1" in capsys.readouterr().err
+        out, err = self._run(fs, "if then")
+        assert "syntax error" in err
+        assert self._run(fs, "read x || echo eof") == ("eof\n", "")
+
+    def test_exit_starts_a_new_session_next_time(self, session_fs):
+        fs, api = session_fs
+        self._run(fs, "X=1")
+        with pytest.raises(DockerSessionClosed):
+            self._run(fs, "exit 3")
+        assert self._run(fs, "echo ${X:-unset}") == ("unset\n", "")
+        assert len(api.commands) == 2
+
+    def test_restarted_container_reconnects(self, session_fs, capsys):
+        fs, api = session_fs
+        self._run(fs, "X=1")
+        fs.container.attrs = {"State": {"StartedAt": "t1"}}
+        assert self._run(fs, "echo ${X:-unset}") == ("unset\n", "")
+        assert "Session 's' was lost" in capsys.readouterr().err
+        assert len(api.commands) == 2
+
+    def test_interrupting_a_loop_kills_the_session(self, session_fs):
+        fs, api = session_fs
+        self._run(fs, "X=1")
+        outputter = MagicMock()
+        calls = itertools.count(1)
+
+        def handle_read():
+            # an interrupt every ~0.2 seconds
+            if next(calls) % 20 == 0:
+                raise KeyboardInterrupt
+
+        outputter.handle_read.side_effect = handle_read
+        fs.outputterFactory.create_outputter.return_value = outputter
+        with pytest.raises(DockerSessionClosed, match="didn't stop after 3 interrupts"):
+            fs.system("while true; do sleep 1; done", session="s")
+        assert docker_session_manager.getSession("abc:s") is None
+        shell = api._execs["0"]
+        shell.wait(timeout=5)
+        assert self._run(fs, "echo ${X:-unset}") == ("unset\n", "")
+        assert len(api.commands) == 2
+
+    def test_idle_sessions_are_closed(self, session_fs):
+        fs, api = session_fs
+        self._run(fs, "X=1")
+        session = docker_session_manager.getSession("abc:s")
+        session.last_used -= session.idle_timeout + 1
+        close_idle_docker_sessions()
+        assert docker_session_manager.getSession("abc:s") is None
+        assert not session.alive
+
+
+class TestDockerBackgroundJob:
+
+    @pytest.fixture
+    def bgfs(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(docker_module, "CONTAINER_LOG_DIR", str(tmp_path / "jobs"))
+        fs, api = _make_streaming_dockerfs(tmp_path)
+        fs.job_registry = JobRegistry(log_dir=str(tmp_path))
+        fs._default_shell, fs._default_shell_checked = "bash", True
+        return fs
+
+    def _start(self, fs, tmp_path, cmd, capsys):
+        log = str(tmp_path / "job.log")
+        fs.system(cmd, background=True, outFile=log)
+        job = fs.job_registry.jobs[1]
+        assert f"Run job 1 in the container with pid: {job.pid}. Output to '{log}'" in capsys.readouterr().out
+        return job
+
+    def test_job_is_tracked_by_its_exec(self, bgfs, tmp_path, capsys):
+        job = self._start(bgfs, tmp_path, "echo hi; exit 3", capsys)
+        assert job.pid > 0
+        # the pid file is removed and nothing is written beside the log
+        assert os.listdir(tmp_path / "jobs") == []
+        assert sorted(os.listdir(tmp_path)) == ["job.log", "jobs"]
+        assert job.wait(timeout=5)
+        assert job.exit_code == 3
+        assert job.tail() == "hi\n"
+
+    def test_job_whose_pid_file_is_late_does_not_start(self, bgfs, tmp_path):
+        pidFile = str(tmp_path / "jobs" / "job.pid")
+        wait = subprocess.run(["sh", "-c", docker_module.PID_FILE_WAIT_SCRIPT, "sh", pidFile, "1"],
+                              stdout=subprocess.PIPE)
+        assert wait.returncode == 1
+        program = bgfs._render_command("echo started", inline=True, pidFile=pidFile)
+        job = subprocess.run(program, stdout=subprocess.PIPE)
+        assert job.returncode == 1 and job.stdout == b""
+
+    def test_default_logs_are_unique(self, bgfs, capsys):
+        with patch.object(bgfs, "_start_background_job") as start:
+            bgfs.system("true", background=True)
+            bgfs.system("true", background=True)
+        first, second = (c.args[1] for c in start.call_args_list)
+        assert first != second and first.startswith(docker_module.CONTAINER_LOG_DIR + "/")
+
+    def test_follow_streams_until_exit(self, bgfs, tmp_path, capsys):
+        job = self._start(bgfs, tmp_path, "echo 1; echo 2; sleep 0.5; echo 3; sleep 0.3; echo 4", capsys)
+        time.sleep(0.2)
+        chunks = []
+        job.follow(chunks.append, n=1, interval=0.05)
+        assert "".join(chunks) == "2\n3\n4\n"
+        assert job.exit_code == 0
+
+    def test_kill_stops_the_job(self, bgfs, tmp_path, capsys):
+        job = self._start(bgfs, tmp_path, "sleep 30; echo done", capsys)
+        job.kill()
+        assert job.wait(timeout=5)
+        assert job.exit_code != 0
+        assert (tmp_path / "job.log").read_text() == ""
+
+
+class _HostDirContainer:
+    """Runs exec_run on the host and extracts put_archive into the host's /"""
+
+    def __init__(self):
+        self.archives = []
+        self.execs = []
+
+    def exec_run(self, cmd, **kwargs):
+        self.execs.append(cmd)
+        p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        return ExecResult(p.returncode, p.stdout)
+
+    def put_archive(self, path, data):
+        stream = b"".join(data)
+        with tarfile.open(fileobj=io.BytesIO(stream), mode="r:gz") as tar:
+            self.archives.append(tar.getnames())
+            tar.extractall(path)
+        return True
+
+
+class TestSyncToContainer:
+
+    @pytest.fixture
+    def dirs(self, tmp_path):
+        src, dst = tmp_path / "src", tmp_path / "dst"
+        (src / "pkg").mkdir(parents=True)
+        (src / "a.txt").write_text("a")
+        (src / "pkg" / "b file.py").write_text("b" * 1000)
+        return src, dst
+
+    def _sync(self, container, src, dst, **kwargs):
+        return sync_to_container(container, str(src), str(dst), **kwargs)  # type: ignore
+
+    def test_only_changed_files_are_sent(self, dirs):
+        src, dst = dirs
+        container = _HostDirContainer()
+        result = self._sync(container, src, dst)
+        assert result.uploaded == ["a.txt", "pkg/b file.py"] and result.bytes_sent > 0
+        assert (dst / "pkg" / "b file.py").read_text() == "b" * 1000
+
+        result = self._sync(container, src, dst)
+        assert result.uploaded == [] and result.unchanged == 2
+        assert len(container.archives) == 1
+
+        (src / "a.txt").write_text("changed")
+        result = self._sync(container, src, dst)
+        assert result.uploaded == ["a.txt"]
+        assert container.archives[-1] == [str(dst / "a.txt").lstrip("/")]
+        assert (dst / "a.txt").read_text() == "changed"
+
+    def test_same_size_is_compared_by_mtime_or_checksum(self, dirs):
+        src, dst = dirs
+        container = _HostDirContainer()
+        self._sync(container, src, dst)
+        os.utime(dst / "a.txt", (0, 0))
+        assert self._sync(container, src, dst, checksum=True).uploaded == []
+        (dst / "a.txt").write_text("z")
+        os.utime(dst / "a.txt", (0, 0))
+        assert self._sync(container, src, dst, checksum=True).uploaded == ["a.txt"]
+        os.utime(dst / "a.txt", (0, 0))
+        assert self._sync(container, src, dst).uploaded == ["a.txt"]
+
+    def test_delete_removes_extra_files(self, dirs):
+        src, dst = dirs
+        container = _HostDirContainer()
+        self._sync(container, src, dst)
+        (src / "a.txt").unlink()
+        assert self._sync(container, src, dst).deleted == []
+        assert (dst / "a.txt").exists()
+        result = self._sync(container, src, dst, delete=True)
+        assert result.deleted == ["a.txt"] and not (dst / "a.txt").exists()
+
+    def test_manifest_is_listed_in_one_exec(self, dirs):
+        src, dst = dirs
+        container = _HostDirContainer()
+        self._sync(container, src, dst, checksum=True)
+        assert len(container.execs) == 1
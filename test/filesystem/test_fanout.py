@@ -0,0 +1,106 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from jupyterMagicCommands.extensions.bash_ext import fanoutExecuteCommand, get_args
+from jupyterMagicCommands.filesystem.fanout import (FANOUT_GROUPED, FANOUT_QUIET,
+                                                    run_fanout)
+from jupyterMagicCommands.filesystem.workdir_preparation import WorkdirPreparation
+
+
+def _echo(target, outputter, preparation):
+    outputter.write(f"hello from {target}\n")
+    return 0 if target != "bad" else 3
+
+
+class TestRunFanout:
+
+    def test_prefixed_output_and_results_in_target_order(self):
+        written = []
+        results = run_fanout(["a", "bad", "c"], _echo, write=written.append)
+        assert [(r.target, r.exit_code, r.output) for r in results] == [
+            ("a", 0, "hello from a\n"),
+            ("bad", 3, "hello from bad\n"),
+            ("c", 0, "hello from c\n"),
+        ]
+        assert sorted(written) == ["[a] hello from a\n", "[bad] hello from bad\n", "[c] hello from c\n"]
+
+    def test_targets_run_concurrently_with_bounded_workers(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def slow(target, outputter, preparation):
+            with lock:
+                running.append(target)
+                peak.append(len(running))
+            time.sleep(0.1)
+            with lock:
+                running.remove(target)
+            return 0
+
+        start = time.monotonic()
+        run_fanout([str(i) for i in range(8)], slow, workers=4, write=lambda s: None)
+        assert time.monotonic() - start < 0.6
+        assert max(peak) <= 4
+
+    def test_errors_and_missing_workdir(self):
+        def execute(target, outputter, preparation):
+            if target == "gone":
+                raise Exception("No such container: gone")
+            raise Exception(preparation.error_message)
+
+        written = []
+        results = run_fanout(["gone", "a"], execute, preparation=WorkdirPreparation("/missing"), write=written.append)
+        assert results[0].exit_code is None and results[0].error == "No such container: gone"
+        assert results[1].exit_code is None and "non existing working directory" in results[1].error
+        assert "[gone] No such container: gone\n" in written
+
+    def test_grouped_and_quiet_output(self):
+        written = []
+        run_fanout(["a"], _echo, mode=FANOUT_GROUPED, write=written.append)
+        assert written[0].startswith("==> a (exit code 0, ") and written[0].endswith("<==\nhello from a\n")
+        written = []
+        results = run_fanout(["a"], _echo, mode=FANOUT_QUIET, write=written.append)
+        assert written == [] and results[0].output == "hello from a\n"
+
+
+class _Pool:
+
+    def __init__(self):
+        self.fs = {}
+
+    def select(self, selector):
+        return selector.split(",")
+
+    def get(self, target, outputterFactory, logger):
+        fs = self.fs.setdefault(target, MagicMock())
+        fs.execute.side_effect = lambda cmd, outputter, preparation: _echo(target, outputter, preparation)
+        return fs
+
+
+class TestFanoutExecuteCommand:
+
+    def test_table_is_saved_into_the_variable(self):
+        shell = MagicMock(user_ns={})
+        pool = _Pool()
+        table = fanoutExecuteCommand("echo hi", get_args("-c a,b --outvar res"), shell, pool=pool)  # type: ignore
+        assert shell.user_ns["res"] is table
+        assert list(table["target"]) == ["a", "b"]
+        assert list(table["exit_code"]) == [0, 0]
+        assert list(table["output"]) == ["hello from a\n", "hello from b\n"]
+        assert pool.fs["a"].execute.call_args[0][0] == "echo hi"
+
+    def test_table_is_displayed_without_a_variable(self):
+        shell = MagicMock(user_ns={})
+        with patch("jupyterMagicCommands.extensions.bash_ext.display") as display:
+            table = fanoutExecuteCommand("echo hi", get_args("-c a,b --fanout-output grouped"), shell, pool=_Pool())  # type: ignore
+        display.assert_called_once_with(table)
+        assert shell.user_ns == {}
+
+    @pytest.mark.parametrize("flags", ["--bg", "-i", "--session s", "--outfile out.log"])
+    def test_unsupported_flags(self, flags):
+        with pytest.raises(Exception, match="more than one container"):
+            fanoutExecuteCommand("echo hi", get_args(f"-c a,b {flags}"), MagicMock(), pool=_Pool())  # type: ignore
@@ -0,0 +1,59 @@
+import gzip
+import os
+import time
+
+import psutil
+import pytest
+
+from jupyterMagicCommands.extensions import _script_ext
+from jupyterMagicCommands.filesystem.Ifilesystem import IFileSystem
+from jupyterMagicCommands.jobs import JOB_REGISTRY
+from jupyterMagicCommands.outputters import OutputterOptions
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.fixture(scope="module")
+def script_magics(ipython_shell):
+    _script_ext.load_ipython_extension(ipython_shell)
+
+
+class TestFileSystemBackground:
+    def test_pid_is_the_script_process(self, basicfs: IFileSystem, script_magics, ipython_shell, tmp_path, capsys):
+        outFile = tmp_path / "out.log"
+        basicfs.system("sleep 1; echo done", background=True, outFile=str(outFile), proc="bgproc")
+        pid = ipython_shell.user_ns["bgproc"]
+        assert isinstance(pid, int)
+        assert f"Run subprocess with pid: {pid}." in capsys.readouterr().out
+        # the bash started by %%_script execs into `bash <script>` under the same pid
+        assert _wait_for(lambda: len(psutil.Process(pid).cmdline()) == 2)
+        assert os.getpgid(pid) == pid
+        assert _wait_for(lambda: outFile.exists() and outFile.read_text() == "done\n")
+
+    def test_job_is_registered_with_unique_log(self, basicfs: IFileSystem, script_magics, ipython_shell, capsys):
+        basicfs.system("echo first", background=True, proc="job1")
+        basicfs.system("echo second", background=True, proc="job2")
+        job1 = JOB_REGISTRY.get_by_pid(ipython_shell.user_ns["job1"])
+        job2 = JOB_REGISTRY.get_by_pid(ipython_shell.user_ns["job2"])
+        assert job1.log_file != job2.log_file
+        assert job1.command == "echo first"
+        assert job1.wait(timeout=5) and job2.wait(timeout=5)
+        assert job1.exit_code == 0
+        assert _wait_for(lambda: open(job2.log_file).read() == "second\n")
+
+    def test_compressed_and_rotated_log(self, basicfs: IFileSystem, script_magics, ipython_shell, tmp_path, capsys):
+        outFile = tmp_path / "out.log.gz"
+        options = OutputterOptions(outFileMaxSize=7, outFileKeep=1)
+        basicfs.system("echo first; echo second", background=True, outFile=str(outFile), proc="gzjob",
+                       outputterOptions=options)
+        job = JOB_REGISTRY.get_by_pid(ipython_shell.user_ns["gzjob"])
+        assert job.wait(timeout=5)
+        assert _wait_for(lambda: (tmp_path / "out.log.1.gz").exists() and job.tail(1) == "second\n")
+        assert gzip.open(tmp_path / "out.log.1.gz").read() == b"first\n"
@@ -0,0 +1,40 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from jupyterMagicCommands.filesystem.filesystem import FileSystem
+from jupyterMagicCommands.filesystem.Ifilesystem import IFileSystem
+
+
+class TestFileSystemPipes:
+    def test_stdout_and_stderr_are_separated(self, basicfs: IFileSystem, capsys):
+        basicfs.system("echo out; echo err >&2")
+        captured = capsys.readouterr()
+        assert captured.out == "out\n"
+        assert captured.err == "err\n"
+
+    def test_no_terminal_is_allocated(self, basicfs: IFileSystem, capsys):
+        basicfs.system("[ -t 0 ] || echo no-tty")
+        captured = capsys.readouterr()
+        assert captured.out == "no-tty\n"
+
+    def test_outvar_collects_both_streams(self, basicfs: IFileSystem, ipython_shell, capsys):
+        basicfs.system("echo out; echo err >&2", outVar="out")
+        captured = capsys.readouterr()
+        assert captured.out == ""
+        assert sorted(ipython_shell.user_ns["out"].splitlines()) == ["err", "out"]
+
+    def test_logging_commands_on_both_streams(self, basicfs: IFileSystem, ipython_shell, capsys):
+        basicfs.system(
+            "printf '##jmc[action.setvariable variable=a]' >&2; echo '##jmc[action.setvariable variable=b]out'; echo err >&2"
+        )
+        capsys.readouterr()
+        assert ipython_shell.user_ns["a"] == "err"
+        assert ipython_shell.user_ns["b"] == "out"
+
+    def test_outputter_is_closed_when_the_command_fails(self):
+        fs = FileSystem(MagicMock())
+        fs._run_piped_command = MagicMock(side_effect=KeyboardInterrupt)
+        with pytest.raises(KeyboardInterrupt):
+            fs.system("echo hello")
+        fs.outputterFactory.create_outputter.return_value.close.assert_called_once()
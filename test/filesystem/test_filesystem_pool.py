@@ -0,0 +1,181 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import pytest
+from docker.errors import NotFound
+
+from jupyterMagicCommands.extensions.constants import JUPYTER_MAGIC_COMMAND_BASH_CURRENT_CONTAINER
+from jupyterMagicCommands.filesystem.filesystem_factory import FileSystemFactory
+from jupyterMagicCommands.filesystem.filesystem_pool import FileSystemPool, is_multi_selector
+
+
+class _Container:
+    def __init__(self, id, started_at="t0"):
+        self.id = id
+        self.attrs = {"State": {"Running": True, "StartedAt": started_at}}
+        self.status = "running"
+        self.reloads = 0
+        self.removed = False
+
+    def reload(self):
+        self.reloads += 1
+        if self.removed:
+            raise NotFound("gone")
+
+
+class _Client:
+    def __init__(self, containers):
+        self.names = dict(containers)
+        self.gets = 0
+        self.containers = self
+
+    def get(self, name):
+        self.gets += 1
+        if name not in self.names:
+            raise NotFound(name)
+        container = self.names[name]
+        # a fresh object each time, like docker-py
+        fresh = _Container(container.id, container.attrs["State"]["StartedAt"])
+        fresh.removed = container.removed
+        return fresh
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _pool(client, interval=10.0):
+    clock = _Clock()
+    factories = []
+
+    def client_factory():
+        factories.append(client)
+        return client
+
+    pool = FileSystemPool(client_factory, health_check_interval=interval, clock=clock)
+    return pool, clock, factories
+
+
+class TestFileSystemPool:
+
+    def test_reuses_client_and_file_system(self):
+        client = _Client({"web": _Container("abc")})
+        pool, clock, factories = _pool(client)
+        fs = pool.get("web", MagicMock())
+        for _ in range(10):
+            assert pool.get("web", MagicMock()) is fs
+        assert len(factories) == 1
+        assert client.gets == 1
+        assert fs.container.reloads == 0
+
+    def test_containers_are_inspected_concurrently(self):
+        client = _Client({name: _Container(name) for name in "abcd"})
+        barrier = threading.Barrier(4, timeout=5)
+        get = client.get
+
+        def slow_get(name):
+            # every inspect waits until all of them are running
+            barrier.wait()
+            return get(name)
+
+        client.get = slow_get
+        pool, _, _ = _pool(client)
+        with ThreadPoolExecutor(4) as executor:
+            filesystems = list(executor.map(lambda name: pool.get(name, MagicMock()), "abcd"))
+        assert [fs.container.id for fs in filesystems] == list("abcd")
+
+    def test_name_and_id_share_the_file_system(self):
+        container = _Container("abc")
+        client = _Client({"web": container, "abc": container})
+        pool, _, _ = _pool(client)
+        assert pool.get("web", MagicMock()) is pool.get("abc", MagicMock())
+        assert len(pool) == 1
+
+    def test_reuse_resets_per_cell_state(self):
+        client = _Client({"web": _Container("abc")})
+        pool, _, _ = _pool(client)
+        fs = pool.get("web", MagicMock())
+        fs._workdir = "/tmp"
+        fs._stat_cache["/tmp"] = "d"
+        fs._scripts_in_container.add("/tmp/script")
+        factory = MagicMock()
+        assert pool.get("web", factory) is fs
+        assert fs._workdir == "/"
+        assert fs._stat_cache == {}
+        assert fs.outputterFactory is factory
+        assert fs._scripts_in_container == {"/tmp/script"}
+
+    def test_health_check_after_interval(self):
+        client = _Client({"web": _Container("abc")})
+        pool, clock, _ = _pool(client)
+        fs = pool.get("web", MagicMock())
+        clock.now = 11
+        assert pool.get("web", MagicMock()) is fs
+        assert fs.container.reloads == 1
+        clock.now = 15
+        pool.get("web", MagicMock())
+        assert fs.container.reloads == 1
+
+    def test_restarted_container_gets_new_file_system(self):
+        container = _Container("abc")
+        client = _Client({"web": container})
+        pool, clock, _ = _pool(client)
+        fs = pool.get("web", MagicMock())
+        fs.container.attrs["State"]["StartedAt"] = "t1"
+        container.attrs["State"]["StartedAt"] = "t1"
+        clock.now = 11
+        restarted = pool.get("web", MagicMock())
+        assert restarted is not fs
+        assert client.gets == 2
+
+    def test_removed_container_is_resolved_again(self):
+        container = _Container("abc")
+        client = _Client({"web": container})
+        pool, clock, _ = _pool(client)
+        fs = pool.get("web", MagicMock())
+        fs.container.removed = True
+        client.names["web"] = _Container("def")
+        clock.now = 11
+        recreated = pool.get("web", MagicMock())
+        assert recreated.container.id == "def"
+        assert len(pool) == 1
+
+    def test_missing_container_raises(self):
+        pool, _, _ = _pool(_Client({}))
+        with pytest.raises(NotFound):
+            pool.get("web", MagicMock())
+
+    def test_invalidate(self):
+        client = _Client({"web": _Container("abc")})
+        pool, _, _ = _pool(client)
+        fs = pool.get("web", MagicMock())
+        FileSystemFactory.invalidate("web", pool)
+        assert pool.get("web", MagicMock()) is not fs
+        pool.invalidate()
+        assert len(pool) == 0
+
+    def test_factory_uses_the_pool(self, monkeypatch):
+        monkeypatch.setenv(JUPYTER_MAGIC_COMMAND_BASH_CURRENT_CONTAINER, "")
+        client = _Client({"web": _Container("abc")})
+        pool, _, _ = _pool(client)
+        shell = MagicMock()
+        fs = FileSystemFactory.get_filesystem("web", shell, pool=pool)
+        assert FileSystemFactory.get_filesystem("web", shell, pool=pool) is fs
+        assert client.gets == 1
+
+    def test_select(self):
+        client = _Client({})
+        web1, web2, db = MagicMock(), MagicMock(), MagicMock()
+        web1.name, web2.name, db.name = "web-1", "web-2", "db"
+        client.list = MagicMock(side_effect=lambda filters=None: [web2, web1] if filters else [web1, web2, db])
+        pool, _, _ = _pool(client)
+        assert pool.select("a, b,a,") == ["a", "b"]
+        assert pool.select("label:app=web") == ["web-1", "web-2"]
+        assert client.list.call_args.kwargs == {"filters": {"label": "app=web"}}
+        assert pool.select("re:^web") == ["web-1", "web-2"]
+        assert is_multi_selector("a,b") and is_multi_selector("re:x") and not is_multi_selector("web")
@@ -8,7 +8,7 @@ class TestDockerFileSystemSysemCommand:
     def test_filesystem(self, fs: IFileSystem, capsys):
         fs.system("echo hello")
         captured = capsys.readouterr()
-        assert captured.out == "hello\r\n"
+        assert captured.out == "hello\n"
 
     def test_filesystem_with_filename_save_output_into_file(
         self, fs: IFileSystem, tmp_path, capsys
@@ -22,14 +22,11 @@ class TestDockerFileSystemSysemCommand:
             assert f.read() == "hello\n"
 
     def test_filesystem_background(self, fs: IFileSystem, capsys):
-        filePath = "/tmp/out.log"
-        fs.remove(filePath)
         fs.system("echo hello", background=True)
         captured = capsys.readouterr()
-        expectedPattern = f"""\
-        WARNING: outFile is not set, the default output file is {filePath}
-        """
-        assert re.search(textwrap.dedent(expectedPattern), captured.out) is not None
+        m = re.search("WARNING: outFile is not set, the default output file is (\\S+)\n", captured.out)
+        assert m is not None
+        filePath = m.group(1)
         assert fs.exists(filePath) == True
         with fs.open(filePath, "r", "utf8") as f:
             assert f.read() == "hello\n"
@@ -39,7 +36,8 @@ class TestDockerFileSystemSysemCommand:
         fs.system("echo hello", background=True, outFile=filePath)
         captured = capsys.readouterr()
         if isinstance(fs, DockerFileSystem):
-            assert captured.out == ""
+            pattern = f"Run job [0-9]+ in the container with pid: [0-9]+. Output to '{filePath}'\n"
+            assert re.search(pattern, captured.out) is not None
         else:
             pattern = f"""\
             Run subprocess with pid: [0-9]+. Output to '{filePath}'
@@ -53,7 +51,7 @@ class TestDockerFileSystemSysemCommand:
         fs.system("echo hello", outVar="out")
         captured = capsys.readouterr()
         assert captured.out == ""
-        assert ipython_shell.user_ns["out"] == "hello\r\n"
+        assert ipython_shell.user_ns["out"] == "hello\n"
 
 
     def test_sequence_calls_clear_previous_results(self, fs: IFileSystem, ipython_shell, capsys):
@@ -61,4 +59,4 @@ class TestDockerFileSystemSysemCommand:
         fs.system("echo world", outVar="out")
         captured = capsys.readouterr()
         assert captured.out == ""
-        assert ipython_shell.user_ns["out"] == "world\r\n"
\ No newline at end of file
+        assert ipython_shell.user_ns["out"] == "world\n"
\ No newline at end of file
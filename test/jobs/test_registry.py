@@ -0,0 +1,149 @@
+import gzip
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+from docker.errors import NotFound
+
+from jupyterMagicCommands.jobs import JobRegistry, JobState
+from jupyterMagicCommands.utils.general import user_temp_dir
+
+
+def _spawn(code: str) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-c", code], start_new_session=True)
+
+
+class TestJobRegistry:
+
+    def test_log_files_are_unique(self, tmp_path):
+        registry = JobRegistry(log_dir=str(tmp_path))
+        assert registry.new_log_file() != registry.new_log_file()
+
+    def test_default_log_dir_is_private(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+        registry = JobRegistry()
+        assert os.path.dirname(registry.new_log_file()) == os.path.join(user_temp_dir(), "jobs")
+        assert os.stat(registry.log_dir).st_mode & 0o777 == 0o700
+        assert os.stat(user_temp_dir()).st_mode & 0o777 == 0o700
+
+    def test_shared_log_dir_is_refused(self, tmp_path):
+        os.chmod(tmp_path, 0o777)
+        with pytest.raises(Exception, match="accessible by other users"):
+            JobRegistry(log_dir=str(tmp_path)).new_log_file()
+
+    def test_mark_exited_by_pid(self, tmp_path):
+        registry = JobRegistry(log_dir=str(tmp_path))
+        job = registry.register(12345, "echo hello")
+        assert job.state == JobState.RUNNING
+        registry.mark_exited(12345, 3)
+        assert job.state == JobState.EXITED
+        assert job.exit_code == 3
+        assert job.end_time is not None
+
+    def test_ids_are_sequential(self, tmp_path):
+        registry = JobRegistry(log_dir=str(tmp_path))
+        assert registry.register(1, "a").id == 1
+        assert registry.register(2, "b").id == 2
+        assert registry.get(2).command == "b"
+
+    def test_usage_and_kill(self, tmp_path):
+        registry = JobRegistry(log_dir=str(tmp_path))
+        p = _spawn("import time; time.sleep(30)")
+        job = registry.register(p.pid, "sleep")
+        cpu, rss = job.usage()
+        assert rss > 0
+        job.kill()
+        job.mark_exited(p.wait(timeout=5))
+        assert job.exit_code != 0
+        assert job.usage() == (0.0, 0)
+
+    def test_tail(self, tmp_path):
+        log = tmp_path / "job.log"
+        log.write_text("".join(f"line {i}\n" for i in range(1000)))
+        registry = JobRegistry(log_dir=str(tmp_path))
+        job = registry.register(1, "cmd", str(log))
+        assert job.tail(2, block_size=16) == "line 998\nline 999\n"
+
+    def test_wait_times_out(self, tmp_path):
+        registry = JobRegistry(log_dir=str(tmp_path))
+        p = _spawn("import time; time.sleep(30)")
+        job = registry.register(p.pid, "sleep")
+        assert job.wait(timeout=0.2) is False
+        job.kill()
+        p.wait(timeout=5)
+
+    def test_tail_of_compressed_log(self, tmp_path):
+        log_file = str(tmp_path / "out.log.gz")
+        with gzip.open(log_file, "wt") as f:
+            f.write("".join(f"line {i}\n" for i in range(100)))
+        registry = JobRegistry(log_dir=str(tmp_path))
+        job = registry.register(1, "a", log_file)
+        assert job.tail(2) == "line 98\nline 99\n"
+
+    def test_follow_writes_appended_bytes_until_exit(self, tmp_path):
+        log = tmp_path / "job.log"
+        log.write_text("old 1\nold 2\n")
+        registry = JobRegistry(log_dir=str(tmp_path))
+        p = _spawn(
+            "import sys, time\n"
+            f"f = open({str(log)!r}, 'a')\n"
+            "for i in range(3):\n"
+            "    f.write(f'new {i}\\n'); f.flush(); time.sleep(0.1)\n"
+        )
+        job = registry.register(p.pid, "writer", str(log))
+        # like the script magic, which reports the exit once it reaped the process
+        threading.Thread(target=lambda: registry.mark_exited(p.pid, p.wait())).start()
+        chunks = []
+        job.follow(chunks.append, n=1, interval=0.05)
+        assert "".join(chunks) == "old 2\nnew 0\nnew 1\nnew 2\n"
+        assert job.exit_code == 0
+
+
+    def test_compressed_log_without_suffix(self, tmp_path):
+        log_file = str(tmp_path / "out.log")
+        with gzip.open(log_file, "wt") as f:
+            f.write("".join(f"line {i}\n" for i in range(100)))
+        registry = JobRegistry(log_dir=str(tmp_path))
+        flagged = registry.register(1, "a", log_file, compressed=True)
+        sniffed = registry.register(2, "b", log_file)
+        assert flagged.tail(2) == sniffed.tail(2) == "line 98\nline 99\n"
+        with pytest.raises(Exception, match="compressed"):
+            sniffed.follow(lambda s: None)
+
+class TestContainerJob:
+
+    def _job(self, tmp_path, inspect):
+        container = MagicMock()
+        container.client.api.exec_inspect.side_effect = inspect
+        registry = JobRegistry(log_dir=str(tmp_path))
+        return registry, registry.register_container_job(container, "exec1", 42, "sleep 1", "/tmp/job.log")
+
+    def test_refresh_inspects_running_jobs_only(self, tmp_path):
+        registry, job = self._job(tmp_path, [{"Running": True}, {"Running": False, "ExitCode": 3}])
+        registry.refresh()
+        assert job.state == JobState.RUNNING
+        registry.refresh()
+        registry.refresh()
+        assert job.state == JobState.EXITED and job.exit_code == 3
+        assert job.container.client.api.exec_inspect.call_count == 2
+
+    def test_removed_container_ends_the_job(self, tmp_path):
+        registry, job = self._job(tmp_path, NotFound("gone"))
+        registry.refresh()
+        assert job.state == JobState.EXITED and job.exit_code is None
+
+    def test_container_pids_are_not_matched(self, tmp_path):
+        registry, job = self._job(tmp_path, [])
+        assert registry.get_by_pid(42) is None
+
+    def test_kill_signals_the_process_tree(self, tmp_path):
+        registry, job = self._job(tmp_path, [])
+        job.kill(signal.SIGINT)
+        cmd = job.container.exec_run.call_args.args[0]
+        assert cmd[:2] == ["sh", "-c"] and cmd[-2:] == ["INT", "42"]
+
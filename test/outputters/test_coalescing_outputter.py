@@ -0,0 +1,72 @@
+from jupyterMagicCommands.outputters import CoalescingOutputter, DummyOutputter
+
+
+class RecordingOutputter(DummyOutputter):
+
+    def __init__(self):
+        self.messages = []
+        self.closed = False
+
+    def write(self, s):
+        self.messages.append(("out", s))
+
+    def write_err(self, s):
+        self.messages.append(("err", s))
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCoalescingOutputter:
+
+    def _make(self, **kwargs):
+        inner = RecordingOutputter()
+        clock = FakeClock()
+        return CoalescingOutputter(inner, clock=clock, **kwargs), inner, clock
+
+    def test_small_writes_are_coalesced_until_close(self):
+        outputter, inner, clock = self._make(flush_interval=1)
+        for c in "hello":
+            outputter.write(c)
+        assert inner.messages == []
+        outputter.close()
+        assert inner.messages == [("out", "hello")]
+        assert inner.closed
+        assert outputter.saved_messages == 4
+
+    def test_flush_on_interval(self):
+        outputter, inner, clock = self._make(flush_interval=1)
+        outputter.write("a")
+        outputter.write("b")
+        clock.now = 1.5
+        outputter.handle_read()
+        assert inner.messages == [("out", "ab")]
+
+    def test_flush_on_size(self):
+        outputter, inner, clock = self._make(flush_interval=1, max_buffer_size=4)
+        outputter.write("ab")
+        outputter.write("cd")
+        assert inner.messages == [("out", "abcd")]
+
+    def test_first_write_after_quiet_period_is_not_delayed(self):
+        outputter, inner, clock = self._make(flush_interval=1)
+        clock.now = 10
+        outputter.write("prompt> ")
+        assert inner.messages == [("out", "prompt> ")]
+
+    def test_stream_order_is_preserved(self):
+        outputter, inner, clock = self._make(flush_interval=1)
+        outputter.write("1")
+        outputter.write_err("2")
+        outputter.write("3")
+        outputter.close()
+        assert inner.messages == [("out", "1"), ("err", "2"), ("out", "3")]
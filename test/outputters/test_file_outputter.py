@@ -1,3 +1,5 @@
+import gzip
+
 import pytest
 from jupyterMagicCommands.outputters.file_outputter import FileOutputter
 
@@ -27,7 +29,7 @@ class TestFileOutputter:
 
     def test_write_flushes_immediately(self, tmp_path):
         path = str(tmp_path / "out.txt")
-        outputter = FileOutputter(path)
+        outputter = FileOutputter(path, flush_interval=0)
         outputter.write("flushed")
         # Read before close — flush() should have written it
         assert open(path).read() == "flushed"
@@ -40,3 +42,70 @@ class TestFileOutputter:
         outputter.write("world")
         outputter.close()
         assert open(path).read() == "hello world"
+
+    def test_writes_are_buffered(self, tmp_path):
+        path = str(tmp_path / "out.txt")
+        outputter = FileOutputter(path, buffer_size=10, clock=lambda: 0)
+        outputter.write("hello")
+        assert open(path).read() == ""
+        outputter.write("world")
+        assert open(path).read() == "helloworld"
+        outputter.close()
+
+    def test_flush_after_interval(self, tmp_path):
+        now = [0.0]
+        path = str(tmp_path / "out.txt")
+        outputter = FileOutputter(path, flush_interval=1, clock=lambda: now[0])
+        outputter.write("hello")
+        outputter.handle_read()
+        assert open(path).read() == ""
+        now[0] = 1.5
+        outputter.handle_read()
+        assert open(path).read() == "hello"
+        outputter.close()
+
+    @pytest.mark.parametrize("name, compress", [("out.txt.gz", None), ("out.txt", True)])
+    def test_gzip(self, tmp_path, name, compress):
+        path = str(tmp_path / name)
+        outputter = FileOutputter(path, compress=compress)
+        outputter.write("hello\n" * 100)
+        outputter.close()
+        with gzip.open(path, "rt") as f:
+            assert f.read() == "hello\n" * 100
+
+    def test_rotation(self, tmp_path):
+        path = tmp_path / "out.txt"
+        outputter = FileOutputter(str(path), flush_interval=0, max_size=4, keep=2)
+        outputter.write("aaaabbbbcc")
+        outputter.write("cc")
+        outputter.write("dd")
+        outputter.close()
+        assert path.read_text() == "dd"
+        assert (tmp_path / "out.txt.1").read_text() == "cccc"
+        assert (tmp_path / "out.txt.2").read_text() == "bbbb"
+        assert not (tmp_path / "out.txt.3").exists()
+        assert outputter.rotations == 3
+
+    def test_rotation_keeps_lines_together(self, tmp_path):
+        path = tmp_path / "out.txt"
+        outputter = FileOutputter(str(path), max_size=8)
+        outputter.write("first\nsecond\nthird\n")
+        outputter.close()
+        assert (tmp_path / "out.txt.1").read_text() == "second\n"
+        assert path.read_text() == "third\n"
+
+    def test_rotation_of_compressed_file(self, tmp_path):
+        path = tmp_path / "out.gz"
+        outputter = FileOutputter(str(path), max_size=4)
+        outputter.write("aaaabb")
+        outputter.close()
+        assert gzip.open(path).read() == b"bb"
+        assert gzip.open(tmp_path / "out.1.gz").read() == b"aaaa"
+
+    def test_rotation_without_backups(self, tmp_path):
+        path = tmp_path / "out.txt"
+        outputter = FileOutputter(str(path), max_size=4, keep=0)
+        outputter.write("aaaabb")
+        outputter.close()
+        assert path.read_text() == "bb"
+        assert list(tmp_path.iterdir()) == [path]
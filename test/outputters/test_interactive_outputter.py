@@ -0,0 +1,49 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from jupyterMagicCommands.outputters import (BasicFileSystemOutputterFactory,
+                                             DockerFileSystemOutputterFactory)
+from jupyterMagicCommands.outputters.interactive_outputter import InteractiveOutputter
+
+
+class _FakeUIEvents:
+
+    def __init__(self):
+        self.polls = []
+        self.exits = 0
+
+    def __enter__(self):
+        return self.polls.append
+
+    def __exit__(self, *args):
+        self.exits += 1
+
+
+class TestInteractiveOutputter:
+
+    def test_handle_read_polls_a_bounded_batch(self):
+        ui = _FakeUIEvents()
+        outputter = InteractiveOutputter(poll_batch=4, ui_events=lambda: ui)
+        outputter.handle_read()
+        outputter.handle_read()
+        assert ui.polls == [4, 4]
+
+    def test_close_leaves_ui_events_once(self):
+        ui = _FakeUIEvents()
+        outputter = InteractiveOutputter(ui_events=lambda: ui)
+        outputter.close()
+        outputter.close()
+        assert ui.exits == 1
+
+    def test_write_and_write_err(self):
+        outputter = InteractiveOutputter(ui_events=_FakeUIEvents)
+        outputter.write("out")
+        outputter.write_err("err")
+        assert [(o["name"], o["text"]) for o in outputter.out.outputs] == [("stdout", "out"), ("stderr", "err")]
+
+
+@pytest.mark.parametrize("factory", [BasicFileSystemOutputterFactory, DockerFileSystemOutputterFactory])
+def test_interactive_output_is_not_coalesced(factory):
+    with patch("jupyterMagicCommands.outputters.outputter_factory.InteractiveOutputter") as cls:
+        assert factory(MagicMock()).create_outputter(True) is cls.return_value
@@ -0,0 +1,26 @@
+from jupyterMagicCommands.outputters import PrefixOutputter
+
+
+class TestPrefixOutputter:
+
+    def test_complete_lines_are_prefixed(self):
+        lines = []
+        outputter = PrefixOutputter("[a] ", lines.append)
+        outputter.write("one\ntw")
+        outputter.write("o\nthree")
+        assert lines == ["[a] one\n", "[a] two\n"]
+        outputter.close()
+        assert lines[-1] == "[a] three\n"
+        assert outputter.value == "one\ntwo\nthree"
+
+    def test_stderr_is_prefixed_too(self):
+        lines = []
+        outputter = PrefixOutputter("[a] ", lines.append)
+        outputter.write_err("oops\n")
+        assert lines == ["[a] oops\n"]
+
+    def test_without_sink_output_is_only_kept(self):
+        outputter = PrefixOutputter("[a] ", max_size=4)
+        outputter.write("hello\n")
+        outputter.close()
+        assert outputter.value == "llo\n"
@@ -0,0 +1,68 @@
+import pytest
+from jupyterMagicCommands.outputters.variable_outputter import VariableOutputter
+from jupyterMagicCommands.utils.parser import parse_size
+
+
+class _FakeShell:
+
+    def __init__(self):
+        self.user_ns = {}
+
+
+class TestVariableOutputter:
+
+    def test_value_is_set_on_close(self):
+        shell = _FakeShell()
+        outputter = VariableOutputter("out", shell=shell)  # type: ignore
+        outputter.write("hello ")
+        outputter.write("world")
+        assert "out" not in shell.user_ns
+        outputter.close()
+        assert shell.user_ns["out"] == "hello world"
+
+    def test_no_write_keeps_variable(self):
+        shell = _FakeShell()
+        shell.user_ns["out"] = "previous"
+        outputter = VariableOutputter("out", shell=shell)  # type: ignore
+        outputter.close()
+        assert shell.user_ns["out"] == "previous"
+
+    def test_as_bytes(self):
+        shell = _FakeShell()
+        outputter = VariableOutputter("out", shell=shell, as_bytes=True)  # type: ignore
+        outputter.write("héllo")
+        outputter.close()
+        assert shell.user_ns["out"] == "héllo".encode("utf8")
+
+    @pytest.mark.parametrize("chunks", [["abc", "def", "ghi"], ["abcdefghi"], list("abcdefghi")])
+    def test_max_size_keeps_tail(self, chunks):
+        shell = _FakeShell()
+        outputter = VariableOutputter("out", shell=shell, max_size=4)  # type: ignore
+        for chunk in chunks:
+            outputter.write(chunk)
+        outputter.close()
+        assert shell.user_ns["out"] == "fghi"
+
+    def test_max_size_larger_than_output(self):
+        shell = _FakeShell()
+        outputter = VariableOutputter("out", shell=shell, max_size=100)  # type: ignore
+        outputter.write("abc")
+        outputter.close()
+        assert shell.user_ns["out"] == "abc"
+
+
+@pytest.mark.parametrize("size, expected", [
+    ("512", 512),
+    ("64K", 64 * 1024),
+    ("10M", 10 * 1024 ** 2),
+    ("1gb", 1024 ** 3),
+    ("1.5K", 1536),
+])
+def test_parse_size(size, expected):
+    assert parse_size(size) == expected
+
+
+@pytest.mark.parametrize("size", ["", "M", "abc", "-1K"])
+def test_parse_size_invalid(size):
+    with pytest.raises(ValueError):
+        parse_size(size)
@@ -41,4 +41,28 @@ def test_detect_by_chunk(ipython_shell, actionDetector, file_params):
     expected_j = expected['j']
     assert j == expected_j
     result = {k: ipython_shell.user_ns.get(k, 'None') for k in expected_ns}
-    assert result == expected_ns
\ No newline at end of file
+    assert result == expected_ns
+
+
+def test_feed_detects_action_split_across_chunks(ipython_shell, actionDetector):
+    actionDetector.feed("noise\n##jmc[action.setvari")
+    assert 'foo' not in ipython_shell.user_ns
+    actionDetector.feed("able variable=foo]bar\nmore")
+    assert ipython_shell.user_ns['foo'] == 'bar'
+
+
+def test_feed_drops_overlong_lines(ipython_shell, actionDetector):
+    actionDetector.MAX_PENDING_LINE = 8
+    actionDetector.feed("##jmc[action.setvariable variable=foo]bar")
+    actionDetector.feed(" still the same line\n##jmc[action.setvariable variable=baz]qux\n")
+    assert 'foo' not in ipython_shell.user_ns
+    assert ipython_shell.user_ns['baz'] == 'qux'
+
+
+def test_fork_keeps_its_own_partial_line(ipython_shell, actionDetector):
+    other = actionDetector.fork()
+    actionDetector.feed("##jmc[action.setvariable variable=foo]")
+    other.feed("noise")
+    actionDetector.feed("bar\n")
+    other.feed(" more\n")
+    assert ipython_shell.user_ns['foo'] == 'bar'
@@ -0,0 +1,89 @@
+import os
+import tempfile
+
+import pytest
+
+from jupyterMagicCommands.utils.general import user_temp_dir
+from jupyterMagicCommands.utils.script_store import ScriptStore
+
+
+class TestScriptStore:
+
+    def test_same_content_reuses_file(self, tmp_path):
+        store = ScriptStore(root=str(tmp_path))
+        path1 = store.path_for("echo hello")
+        path2 = store.path_for("echo hello")
+        assert path1 == path2
+        assert open(path1).read() == "echo hello"
+        assert store.stats() == {"hits": 1, "misses": 1, "collected": 0}
+
+    def test_different_content_gets_different_files(self, tmp_path):
+        store = ScriptStore(root=str(tmp_path))
+        assert store.path_for("echo a") != store.path_for("echo b")
+        assert store.misses == 2
+
+    def test_gc_removes_least_recently_used(self, tmp_path):
+        store = ScriptStore(root=str(tmp_path), max_entries=2, min_age=0)
+        old = store.path_for("echo old")
+        os.utime(old, (1, 1))
+        used = store.path_for("echo used")
+        os.utime(used, (2, 2))
+        new = store.path_for("echo new")
+        store.path_for("echo used")  # a hit makes it the most recently used
+        assert store.gc() == 1
+        assert not os.path.exists(old)
+        assert os.path.exists(used)
+        assert os.path.exists(new)
+
+    def test_gc_keeps_recent_entries(self, tmp_path):
+        store = ScriptStore(root=str(tmp_path), max_entries=0, min_age=3600)
+        path = store.path_for("echo recent")
+        assert store.gc() == 0
+        assert os.path.exists(path)
+
+    def test_gc_by_size(self, tmp_path):
+        store = ScriptStore(root=str(tmp_path), max_bytes=10, min_age=0)
+        big = store.path_for("x" * 8)
+        os.utime(big, (1, 1))
+        store.path_for("y" * 8)
+        assert store.gc() == 1
+        assert not os.path.exists(big)
+
+    def test_planted_file_is_rewritten(self, tmp_path):
+        store = ScriptStore(root=str(tmp_path))
+        path = store.path_for("echo hello")
+        with open(path, "w") as f:
+            f.write("echo planted")
+        assert store.path_for("echo hello") == path
+        assert open(path).read() == "echo hello"
+        assert store.misses == 2
+
+    def test_writable_file_is_rewritten(self, tmp_path):
+        store = ScriptStore(root=str(tmp_path))
+        path = store.path_for("echo hello")
+        os.chmod(path, 0o666)
+        assert store.path_for("echo hello") == path
+        assert os.stat(path).st_mode & 0o022 == 0
+        assert store.misses == 2
+
+    def test_shared_directory_is_refused(self, tmp_path):
+        os.chmod(tmp_path, 0o777)
+        with pytest.raises(Exception, match="accessible by other users"):
+            ScriptStore(root=str(tmp_path)).path_for("echo hello")
+
+    def test_planted_file_in_shared_directory_is_refused(self, tmp_path):
+        store = ScriptStore(root=str(tmp_path))
+        store.path_for("echo hello")
+        os.chmod(tmp_path, 0o777)
+        with pytest.raises(Exception, match="accessible by other users"):
+            store.path_for("echo hello")
+        assert store.hits == 0
+
+    def test_default_root_is_private(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+        store = ScriptStore()
+        assert store.root.startswith(str(tmp_path))
+        assert store.root == os.path.join(user_temp_dir(), "scripts")
+        store.path_for("echo hello")
+        assert os.stat(store.root).st_mode & 0o777 == 0o700
+        assert os.stat(os.path.dirname(store.root)).st_mode & 0o777 == 0o700
@@ -0,0 +1,51 @@
+import os
+
+from jupyterMagicCommands.utils.general import user_temp_dir
+from jupyterMagicCommands.utils.shell_cache import ShellCache
+
+
+class TestShellCache:
+
+    def test_persists_across_instances(self, tmp_path):
+        path = str(tmp_path / "shells.json")
+        key = ShellCache.key("abc", "sha256:1")
+        ShellCache(path).set(key, ["bash", "sh"])
+        assert ShellCache(path).get(key) == ["bash", "sh"]
+        assert ShellCache(path).get(ShellCache.key("abc", "sha256:2")) is None
+
+    def test_invalid_file_is_ignored(self, tmp_path):
+        path = tmp_path / "shells.json"
+        path.write_text("{not json")
+        cache = ShellCache(str(path))
+        assert cache.get("abc@sha256:1") is None
+        cache.set("abc@sha256:1", ["sh"])
+        assert ShellCache(str(path)).get("abc@sha256:1") == ["sh"]
+
+    def test_keeps_most_recent_entries(self, tmp_path):
+        path = str(tmp_path / "shells.json")
+        cache = ShellCache(path, max_entries=2)
+        for i in range(3):
+            cache.set(f"c{i}@img", ["sh"])
+        cache = ShellCache(path)
+        assert cache.get("c0@img") is None
+        assert cache.get("c2@img") == ["sh"]
+
+    def test_invalidate(self, tmp_path):
+        path = str(tmp_path / "shells.json")
+        cache = ShellCache(path)
+        cache.set("abc@img1", ["sh"])
+        cache.set("def@img1", ["sh"])
+        cache.invalidate("abc")
+        assert ShellCache(path).get("abc@img1") is None
+        assert ShellCache(path).get("def@img1") == ["sh"]
+        cache.invalidate()
+        assert ShellCache(path).get("def@img1") is None
+
+    def test_shared_directory_is_not_trusted(self, tmp_path):
+        path = tmp_path / "shells.json"
+        ShellCache(str(path)).set("abc@img", ["bash"])
+        os.chmod(tmp_path, 0o777)
+        assert ShellCache(str(path)).get("abc@img") is None
+
+    def test_default_path_is_private(self):
+        assert ShellCache().path == os.path.join(user_temp_dir(), "shells.json")
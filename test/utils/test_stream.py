@@ -0,0 +1,137 @@
+import os
+import socket
+import struct
+
+from jupyterMagicCommands.utils.stream import SentinelScanner, StreamDemuxer, StreamReader
+
+
+def _frame(stream, payload):
+    return struct.pack(">BxxxL", stream, len(payload)) + payload
+
+
+class TestStreamReader:
+
+    def _read_all(self, reader):
+        while not reader.finished:
+            reader.poll(timeout=1)
+
+    def test_reads_until_eof(self):
+        r, w = os.pipe()
+        os.write(w, b"hello world")
+        os.close(w)
+        chunks = []
+        reader = StreamReader()
+        reader.register(r, chunks.append)
+        self._read_all(reader)
+        reader.close()
+        os.close(r)
+        assert "".join(chunks) == "hello world"
+        assert reader.bytes_read == len(b"hello world")
+
+    def test_multibyte_character_split_across_reads(self):
+        r, w = os.pipe()
+        data = "héllo".encode("utf8")
+        chunks = []
+        reader = StreamReader(chunk_size=2)
+        reader.register(r, chunks.append)
+        os.write(w, data)
+        os.close(w)
+        self._read_all(reader)
+        reader.close()
+        os.close(r)
+        assert "".join(chunks) == "héllo"
+        assert "�" not in "".join(chunks)
+
+    def test_multiple_descriptors_are_dispatched_separately(self):
+        r1, w1 = os.pipe()
+        r2, w2 = os.pipe()
+        out, err = [], []
+        reader = StreamReader()
+        reader.register(r1, out.append)
+        reader.register(r2, err.append)
+        os.write(w1, b"out")
+        os.write(w2, b"err")
+        os.close(w1)
+        os.close(w2)
+        self._read_all(reader)
+        reader.close()
+        os.close(r1)
+        os.close(r2)
+        assert "".join(out) == "out"
+        assert "".join(err) == "err"
+
+
+class TestSentinelScanner:
+
+    def test_sentinel_split_across_chunks_is_not_forwarded(self):
+        chunks = []
+        scanner = SentinelScanner("<END>", chunks.append)
+        for s in ["hello <", "EN", "D> 0\n"]:
+            scanner.feed(s)
+        assert "".join(chunks) == "hello "
+        assert scanner.found
+        assert scanner.trailer == " 0\n"
+
+    def test_partial_match_is_released(self):
+        chunks = []
+        scanner = SentinelScanner("<END>", chunks.append)
+        scanner.feed("a <E")
+        scanner.feed("X")
+        assert "".join(chunks) == "a <EX"
+        assert not scanner.found
+
+
+class TestStreamDemuxer:
+
+    def _demuxer(self, **kwargs):
+        out, err = [], []
+        return StreamDemuxer(out.append, err.append, **kwargs), out, err
+
+    def test_many_frames_in_one_read(self):
+        demuxer, out, err = self._demuxer()
+        demuxer.feed(memoryview(_frame(1, b"a") + _frame(1, b"b") + _frame(2, b"oops") + _frame(1, b"c")))
+        assert out == ["ab", "c"]
+        assert err == ["oops"]
+        assert demuxer.frames == 4
+
+    def test_frames_split_at_every_byte(self):
+        demuxer, out, err = self._demuxer()
+        data = _frame(1, "héllo ".encode("utf8")) + _frame(2, b"err") + _frame(1, "wörld".encode("utf8"))
+        for i in range(len(data)):
+            demuxer.feed(memoryview(data[i:i + 1]))
+        demuxer.close()
+        assert "".join(out) == "héllo wörld"
+        assert "".join(err) == "err"
+
+    def test_character_split_across_frames(self):
+        demuxer, out, _ = self._demuxer()
+        data = "é".encode("utf8")
+        demuxer.feed(memoryview(_frame(1, data[:1])))
+        demuxer.feed(memoryview(_frame(1, data[1:])))
+        assert "".join(out) == "é"
+
+    def test_raw_stream(self):
+        demuxer, out, err = self._demuxer(multiplexed=False)
+        demuxer.feed(memoryview(b"\x01\x00\x00\x00raw"))
+        assert out == ["\x01\x00\x00\x00raw"]
+        assert err == []
+
+    def test_recv_until_eof(self):
+        a, b = socket.socketpair()
+        demuxer, out, err = self._demuxer(buffer_size=5)
+        a.sendall(_frame(1, b"hello world") + _frame(2, b"!"))
+        a.close()
+        while demuxer.recv(b):
+            pass
+        b.close()
+        assert "".join(out) == "hello world"
+        assert err == ["!"]
+        assert demuxer.bytes_read == 8 + 11 + 8 + 1
+
+    def test_bytes_without_encoding(self):
+        demuxer, out, err = self._demuxer(encoding=None)
+        buf = bytearray(_frame(1, b"\xff\xfe") + _frame(2, b"e"))
+        demuxer.feed(memoryview(buf))
+        buf[:] = bytes(len(buf))  # the buffer is reused by the next recv
+        assert out == [b"\xff\xfe"]
+        assert err == [b"e"]
@@ -0,0 +1,80 @@
+import base64
+import re
+
+from jupyterMagicCommands.utils.xterm import XtermTerminal
+
+
+class _FakeHandle:
+
+    def __init__(self):
+        self.updates = []
+
+    def update(self, data, raw=False):
+        self.updates.append(data["text/html"])
+
+
+class _FakeDisplay:
+
+    def __init__(self):
+        self.displayed = []
+        self.handle = _FakeHandle()
+
+    def __call__(self, data, raw=False, display_id=None):
+        self.displayed.append(data["text/html"])
+        if display_id:
+            return self.handle
+
+
+def _deltas(updates):
+    result = []
+    for html in updates:
+        m = re.search(r'write\((\d+), "([^"]*)"\)', html)
+        if m:
+            result.append((int(m.group(1)), base64.b64decode(m.group(2)).decode("utf8")))
+    return result
+
+
+class TestXtermTerminal:
+
+    def _terminal(self, now, **kwargs):
+        display = _FakeDisplay()
+        terminal = XtermTerminal(display=display, clock=lambda: now[0], **kwargs)
+        terminal.open()
+        return terminal, display
+
+    def test_sends_only_deltas(self):
+        now = [0.0]
+        terminal, display = self._terminal(now)
+        terminal.write("héllo ")
+        terminal.handle_tick()
+        assert display.handle.updates == []
+        now[0] = 1
+        terminal.handle_tick()
+        terminal.write("world")
+        now[0] = 2
+        terminal.handle_tick()
+        assert _deltas(display.handle.updates) == [(1, "héllo "), (2, "world")]
+        # the terminal and the updatable display
+        assert len(display.displayed) == 2
+
+    def test_close_flushes_and_clears(self):
+        now = [0.0]
+        terminal, display = self._terminal(now)
+        terminal.write("bye")
+        terminal.close()
+        assert _deltas(display.handle.updates) == [(1, "bye")]
+        assert display.handle.updates[-1] == ""
+
+    def test_interval_adapts_to_output(self):
+        now = [0.0]
+        terminal, display = self._terminal(now, min_interval=0.05, max_interval=0.4, busy_size=10)
+        for _ in range(5):
+            now[0] += 1
+            terminal.write("x" * 100)
+            terminal.handle_tick()
+        assert terminal.interval == 0.4
+        for _ in range(5):
+            now[0] += 1
+            terminal.write("x")
+            terminal.handle_tick()
+        assert terminal.interval == 0.05